@@ -557,61 +557,95 @@ class model_error(object):
         :returns: ``er_est``, the numerical error estimate for the region
 
         """
-        # Set up marker
+        return self.calculate_for_sample_set_regions_mc(s_set, [region])[0]
+
+    def calculate_for_sample_set_regions_mc(self, s_set, regions):
+        """
+        Calculate the numerical error estimates for several regions of the
+        input space defined by a sample set object, using the MC assumption.
+
+        All regions are evaluated together from the region labels of the
+        cells of ``s_set`` containing the input samples. The counts of the
+        samples of each contour event that lie in each region are computed
+        with bincounts and summed over the processors with a single vector
+        reduction. The error identifiers of the input samples are set for the
+        last region, as by
+        :meth:`~bet.calculateError.model_error.calculate_for_sample_set_region_mc`.
+
+        :param s_set: sample set for which to calculate error
+        :type s_set: :class:`bet.sample.sample_set_base`
+        :param regions: regions of s_set for which to calculate error
+        :type regions: list
+
+        :rtype: list
+        :returns: ``er_est``, the numerical error estimates for the regions
+
+        """
+        # Set up region labels
         if s_set._region is None:
             msg = "regions must be defined for the sample set."
             raise wrong_argument_type(msg)
-        marker = np.equal(s_set._region, region)
-        if not np.any(marker):
+        (unique_regions, inverse) = np.unique(np.asarray(regions).ravel(),
+                return_inverse=True)
+        if not np.all(np.in1d(unique_regions, s_set._region)):
             msg = "The given region does not exist."
             raise wrong_argument_type(msg)
-
-        disc_new_set = samp.discretization(input_sample_set=s_set,
-                                           output_sample_set=s_set,
-                                           emulated_input_sample_set=\
-                                                   self.disc._input_sample_set)
-        disc_new_set.set_emulated_ii_ptr(globalize=False)
-        # Check if in the region
-        in_A = marker[disc_new_set._emulated_ii_ptr_local]
-
-        # Loop over contour events and add error contribution
-        er_est = 0.0
+        if self.disc._input_sample_set._values_local is None:
+            self.disc._input_sample_set.global_to_local()
+        (_, ptr) = s_set.query(self.disc._input_sample_set._values_local)
+        labels = np.asarray(s_set._region)[ptr.flat[:]]
+
+        # Index of the region containing each input sample
+        num_regions = unique_regions.shape[0]
+        region_ind = np.searchsorted(unique_regions, labels)
+        region_ind[region_ind == num_regions] = 0
+        in_A = np.equal(unique_regions[region_ind], labels)
+
+        # JiA, Ji, JiAe, and Jie are defined as in
+        # `Butler et al. 2015. <http://arxiv.org/pdf/1407.3851>`, the number
+        # of error cells of each contour event is also counted
         ops_num = self.disc._output_probability_set.check_num()
-        num_local = self.disc._input_sample_set.check_num_local()
-        self.disc._input_sample_set._error_id_local = np.zeros((num_local,))
-
-        for i in range(ops_num):
-            if self.disc._output_probability_set._probabilities[i] > 0.0:
-                # JiA, Ji, Jie, and JiAe are defined ast in 
-                # `Butler et al. 2015. <http://arxiv.org/pdf/1407.3851>`
-                in_Ai1 = np.equal(self.disc._io_ptr_local, i)
-                in_Ai2 = np.equal(self.disc_new._io_ptr_local, i)
-                JiA_local = float(np.sum(np.logical_and(in_A, in_Ai1)))
-                JiA = comm.allreduce(JiA_local, op=MPI.SUM)
-                Ji_local = float(np.sum(in_Ai1))
-                Ji = comm.allreduce(Ji_local, op=MPI.SUM)
-                JiAe_local = float(np.sum(np.logical_and(in_A, in_Ai2)))
-                JiAe = comm.allreduce(JiAe_local, op=MPI.SUM)
-                Jie_local = float(np.sum(in_Ai2))
-                Jie = comm.allreduce(Jie_local, op=MPI.SUM)
-                if Ji*Jie == 0:
-                    er_cont = np.inf
-                else:
-                    er_cont = self.disc._output_probability_set._probabilities[i]\
-                        *((JiA*Jie - JiAe*Ji)/(Ji*Jie))
-                er_est += er_cont
-                error_cells1 = np.logical_and(np.logical_and(in_Ai1, 
-                    np.logical_not(in_A)), np.logical_and(in_Ai2, in_A))
-                error_cells2 = np.logical_and(np.logical_and(in_Ai2, 
-                    np.logical_not(in_A)), np.logical_and(in_Ai1, in_A))
-                error_cells3 = np.not_equal(in_Ai1, in_Ai2)
-                error_cells = np.logical_or(error_cells1, error_cells2)
-                error_cells = np.logical_or(error_cells, error_cells3)
-
-                error_cells_num_local = float(np.sum(error_cells))
-                error_cells_num = comm.allreduce(error_cells_num_local,
-                        op=MPI.SUM)
-                if error_cells_num != 0:
-                    self.disc._input_sample_set._error_id_local[error_cells] \
-                            += er_cont/error_cells_num
-        return er_est
+        io_ptr1 = self.disc._io_ptr_local
+        io_ptr2 = self.disc_new._io_ptr_local
+        differ = np.not_equal(io_ptr1, io_ptr2)
+        counts = np.concatenate([
+            np.bincount(region_ind[in_A]*ops_num + io_ptr1[in_A],
+                minlength=num_regions*ops_num),
+            np.bincount(io_ptr1, minlength=ops_num),
+            np.bincount(region_ind[in_A]*ops_num + io_ptr2[in_A],
+                minlength=num_regions*ops_num),
+            np.bincount(io_ptr2, minlength=ops_num),
+            np.bincount(io_ptr1[differ], minlength=ops_num) + \
+                    np.bincount(io_ptr2[differ], minlength=ops_num)])
+        counts = counts.astype(np.float64)
+        ccounts = np.copy(counts)
+        comm.Allreduce([counts, MPI.DOUBLE], [ccounts, MPI.DOUBLE],
+                op=MPI.SUM)
+        (JiA, Ji, JiAe, Jie, error_cells_num) = np.split(ccounts,
+                np.cumsum([num_regions*ops_num, ops_num,
+                    num_regions*ops_num, ops_num]))
+        JiA = JiA.reshape((num_regions, ops_num))
+        JiAe = JiAe.reshape((num_regions, ops_num))
+
+        # Error contributions of the contour events with positive probability
+        probabilities = self.disc._output_probability_set._probabilities
+        active = probabilities > 0.0
+        er_cont = np.zeros((num_regions, ops_num))
+        empty = Ji*Jie == 0
+        er_cont[:, np.logical_and(active, empty)] = np.inf
+        full = np.logical_and(active, np.logical_not(empty))
+        er_cont[:, full] = probabilities[full]*((JiA[:, full]*Jie[full] - \
+                JiAe[:, full]*Ji[full])/(Ji[full]*Jie[full]))
+        er_est = np.sum(er_cont, axis=1)[inverse]
+
+        # Distribute the error contributions of the last region over the
+        # samples whose contour event changes
+        weights = np.zeros((ops_num,))
+        has_cells = np.logical_and(active, error_cells_num != 0)
+        weights[has_cells] = er_cont[inverse[-1], has_cells]/\
+                error_cells_num[has_cells]
+        error_id = np.zeros(io_ptr1.shape)
+        error_id[differ] = weights[io_ptr1[differ]] + weights[io_ptr2[differ]]
+        self.disc._input_sample_set._error_id_local = error_id
+
+        return list(er_est)
@@ -8,6 +8,9 @@ This module provides methods for calulating the probability measure
     calculates the probability for a set of emulation points.
 * :mod:`~bet.calculateP.calculateP.prob` estimates the 
     probability based on pre-defined volumes.
+* :mod:`~bet.calculateP.calculateP.prob_multiple_data` estimates the
+    probability based on pre-defined volumes for many reference values at
+    once.
 * :mod:`~bet.calculateP.calculateP.prob_with_emulated` estimates the 
     probability using volume emulation.
 * :mod:`~bet.calculateP.calculateP.prob_from_sample_set` estimates the 
@@ -15,8 +18,9 @@ This module provides methods for calulating the probability measure
     space.
 
 """
-import logging
+import os, logging
 import numpy as np
+import scipy.spatial as spatial
 from bet.Comm import comm, MPI 
 import bet.util as util
 import bet.sample as samp
@@ -105,6 +109,120 @@ def prob(discretization, globalize=True):
                                         get_global_values(P_local)
     discretization._input_sample_set._probabilities_local = P_local
 
+def prob_multiple_data(discretization, Q_refs, Q_ref=None, block_size=100,
+        file_name=None, globalize=True):
+    r"""
+    Calculates :math:`P_{\Lambda}(\mathcal{V}_{\lambda_{samples}})` as in
+    :meth:`~bet.calculateP.calculateP.prob` for each of ``num_data``
+    reference values ``Q_refs``, where :math:`\rho_{\mathcal{D},M}` for the
+    reference value ``Q_refs[j]`` is ``discretization._output_probability_set``
+    (created for ``Q_ref``) translated by ``Q_refs[j] - Q_ref``. The
+    simple function approximation is only created once.
+
+    Translating the bins by ``Q_refs[j] - Q_ref`` is the same as translating
+    the output samples by ``Q_ref - Q_refs[j]``, so the pointers from the
+    output samples to the bins of ``block_size`` reference values are found
+    with one query and the probabilities of the input samples are computed
+    from the pointers with weighted bincounts.
+
+    :param discretization: An object containing the discretization information.
+    :type discretization: class:`bet.sample.discretization`
+    :param Q_refs: reference values
+    :type Q_refs: :class:`~numpy.ndarray` of shape (num_data, output_dim)
+    :param Q_ref: the reference value that
+        ``discretization._output_probability_set`` was created for, default
+        is the reference value of the output sample set
+    :type Q_ref: :class:`~numpy.ndarray` of size (output_dim,)
+    :param int block_size: number of reference values to calculate the
+        probabilities of at once
+    :param string file_name: if given the probabilities are written to a
+        ``.npy`` file (one per processor if there is more than one processor)
+        as they are computed instead of being stored in memory
+    :param bool globalize: Makes local variables global. Ignored if
+        ``file_name`` is given.
+
+    :rtype: :class:`~numpy.ndarray` of shape (num_data, num_samples)
+    :returns: the probability of each input sample for each reference value,
+        this is a memory map of the file if ``file_name`` is given and is
+        local if ``globalize`` is False
+
+    """
+    # Check Dimensions
+    discretization.check_nums()
+    output_probability_set = discretization._output_probability_set
+    op_num = output_probability_set.check_num()
+    if Q_ref is None:
+        Q_ref = discretization._output_sample_set._reference_value
+        if Q_ref is None:
+            raise ValueError("Missing reference value.")
+    Q_refs = util.fix_dimensions_data(Q_refs, output_probability_set._dim)
+    if Q_refs.shape[1] != output_probability_set._dim:
+        raise samp.dim_not_matching("Dimensions of Q_refs are not correct.")
+    num_data = Q_refs.shape[0]
+
+    # Check for necessary attributes
+    if discretization._input_sample_set._values_local is None:
+        discretization._input_sample_set.global_to_local()
+    if discretization._output_sample_set._values_local is None:
+        discretization._output_sample_set.global_to_local()
+    outputs = discretization._output_sample_set._values_local
+    volumes = discretization._input_sample_set._volumes_local
+    probabilities = output_probability_set._probabilities
+    num_local = outputs.shape[0]
+
+    if file_name is None:
+        P_local = np.zeros((num_data, num_local))
+    else:
+        # create processor specific file name
+        if comm.size > 1:
+            file_name = os.path.join(os.path.dirname(file_name),
+                    "proc{}_{}".format(comm.rank, os.path.basename(file_name)))
+        P_local = np.lib.format.open_memmap(file_name, mode='w+',
+                dtype=np.float64, shape=(num_data, num_local))
+
+    # Voronoi cells are found with a compiled KD-tree
+    if isinstance(output_probability_set, samp.voronoi_sample_set) and not \
+            isinstance(output_probability_set, samp.regular_grid_sample_set):
+        kdtree = spatial.cKDTree(output_probability_set._values)
+        query = lambda x: kdtree.query(x, p=output_probability_set._p_norm)
+    else:
+        query = output_probability_set.query
+
+    # Calculate Probabilities
+    for start in xrange(0, num_data, block_size):
+        stop = min(num_data, start + block_size)
+        num_block = stop - start
+        shifts = Q_refs[start:stop] - Q_ref
+        (_, ptr) = query(np.reshape(outputs[np.newaxis, :, :] - \
+                shifts[:, np.newaxis, :], (num_block * num_local,
+                    outputs.shape[1])))
+        ptr = np.reshape(ptr, (num_block, num_local))
+
+        # Sum the volumes of the input samples in each bin for each reference
+        # value
+        block_ptr = ptr + op_num * np.arange(num_block)[:, np.newaxis]
+        block_volumes = np.tile(volumes, (num_block, 1))
+        bin_volumes = np.bincount(block_ptr.ravel(),
+                weights=block_volumes.ravel(), minlength=num_block * op_num)
+        cbin_volumes = np.copy(bin_volumes)
+        comm.Allreduce([bin_volumes, MPI.DOUBLE], [cbin_volumes, MPI.DOUBLE],
+                op=MPI.SUM)
+        bin_volumes = cbin_volumes[block_ptr]
+        bin_probabilities = probabilities[ptr]
+
+        P_block = np.zeros((num_block, num_local))
+        nonzero = np.logical_and(bin_probabilities > 0.0, bin_volumes > 0.0)
+        P_block[nonzero] = bin_probabilities[nonzero] * \
+                block_volumes[nonzero] / bin_volumes[nonzero]
+        P_local[start:stop] = P_block
+
+    if file_name is not None:
+        P_local.flush()
+        return P_local
+    if globalize:
+        return util.get_global_values(P_local.transpose()).transpose()
+    return P_local
+
 def prob_with_emulated_volumes(discretization): 
     r"""
     
@@ -228,16 +346,13 @@ def prob_from_sample_set(set_old, set_new):
     (_, ptr) = set_new.query(set_old._values_local)
     ptr = ptr.flat[:]
 
-    # Set up probability vector
-    prob_new = np.zeros((num_new,))
+    # Distribute probability from old cells to new cells
+    prob_new_local = np.bincount(ptr, weights=set_old._probabilities_local,
+            minlength=num_new)
+    prob_new = np.copy(prob_new_local)
+    comm.Allreduce([prob_new_local, MPI.DOUBLE], [prob_new, MPI.DOUBLE],
+            op=MPI.SUM)
 
-    # Loop over new cells and distribute probability from old
-    for i in xrange(num_new):
-        Itemp = np.equal(ptr, i)
-        Itemp_sum = np.sum(set_old._probabilities_local[Itemp])
-        Itemp_sum = comm.allreduce(Itemp_sum, op=MPI.SUM)
-        prob_new[i] = Itemp_sum
-    
     # Set probabilities
     set_new.set_probabilities(prob_new)
     return prob_new
@@ -5,11 +5,17 @@ This module provides methods for creating simple function approximations to be
 used by :mod:`~bet.calculateP.calculateP`. These simple function approximations
 are returned as `bet.sample.sample_set` objects.
 """
-import collections, logging
+import collections, logging, os, hashlib
 import numpy as np
+import scipy.io as sio
+import scipy.spatial as spatial
+import scipy.optimize as optimize
+import scipy.special as special
 from bet.Comm import comm, MPI 
 import bet.util as util
 import bet.sample as samp
+import bet.sampling.quasiMonteCarlo as qmc
+import bet.sampling.randomStreams as rs
 
 class wrong_argument_type(Exception):
     """
@@ -77,12 +83,324 @@ def check_inputs_no_reference(data_set):
 
     return (num, dim, values)
 
+class rho_D_M_cache(object):
+    r"""
+    A cache of simple function approximations :math:`\rho_{\mathcal{D},M}`
+    created by the Voronoi bin constructors in this module. Entries are keyed
+    by the constructor, the size of the support (``rect_size`` or ``std``),
+    ``M``, ``num_d_emulate`` and ``seed`` but not by ``Q_ref``. The
+    construction is translation invariant, so entries are stored relative to
+    ``Q_ref`` and are translated to the ``Q_ref`` of each request.
+
+    Entries are kept in memory and, if ``cache_dir`` is given, also saved to
+    disk as ``.mat`` files so that they can be reused by later runs. The least
+    recently used entries are evicted when there are more than
+    ``max_entries`` entries in memory or ``max_disk_entries`` files on disk.
+    """
+    def __init__(self, max_entries=16, cache_dir=None, max_disk_entries=64):
+        """
+        Initialization
+
+        :param int max_entries: maximum number of entries kept in memory
+        :param string cache_dir: directory to store entries in, if ``None``
+            entries are only kept in memory
+        :param int max_disk_entries: maximum number of entries kept in
+            ``cache_dir``
+
+        """
+        #: maximum number of entries kept in memory
+        self.max_entries = max_entries
+        #: directory to store entries in
+        self.cache_dir = cache_dir
+        #: maximum number of entries kept in ``cache_dir``
+        self.max_disk_entries = max_disk_entries
+        #: entries in order of use, the last entry is the most recently used
+        self._entries = collections.OrderedDict()
+        #: number of requests that were found in the cache
+        self.hits = 0
+        #: number of requests that were not found in the cache
+        self.misses = 0
+        if cache_dir is not None and comm.rank == 0 and not \
+                os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        comm.barrier()
+
+    def key(self, constructor, size, M, num_d_emulate, seed):
+        """
+        Creates the key of an entry.
+
+        :param string constructor: name of the constructor
+        :param size: ``rect_size`` or ``std``
+        :type size: :class:`~numpy.ndarray` of size (mdim,)
+        :param int M: number of bins
+        :param int num_d_emulate: number of emulated samples
+        :param int seed: seed
+
+        :rtype: tuple
+        :returns: key
+
+        """
+        return (constructor, tuple(np.ravel(size).astype(np.float64)),
+                int(M), int(num_d_emulate), seed)
+
+    def file_name(self, key):
+        """
+        :param tuple key: key of the entry
+
+        :rtype: string
+        :returns: the name of the file that stores the entry with ``key``
+
+        """
+        return os.path.join(self.cache_dir,
+                "rho_D_M_{}.mat".format(hashlib.sha1(repr(key)).hexdigest()))
+
+    def get(self, key, Q_ref):
+        r"""
+        Finds an entry and translates it to ``Q_ref``.
+
+        :param tuple key: key of the entry
+        :param Q_ref: :math:`Q(\lambda_{reference})`
+        :type Q_ref: :class:`~numpy.ndarray` of size (mdim,)
+
+        :rtype: :class:`~bet.sample.voronoi_sample_set`
+        :returns: the simple function approximation or ``None`` if there is
+            no entry for ``key``
+
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None and self.cache_dir is not None and \
+                os.path.exists(self.file_name(key)):
+            mdat = sio.loadmat(self.file_name(key))
+            entry = {'values': mdat['values'],
+                    'probabilities': np.ravel(mdat['probabilities']),
+                    'volumes': None}
+            if mdat.has_key('volumes'):
+                entry['volumes'] = np.ravel(mdat['volumes'])
+            if comm.rank == 0:
+                # mark the file as recently used
+                os.utime(self.file_name(key), None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._store(key, entry)
+
+        s_set = samp.voronoi_sample_set(entry['values'].shape[1])
+        s_set.set_values(entry['values'] + Q_ref)
+        s_set.set_kdtree()
+        s_set.set_probabilities(np.copy(entry['probabilities']))
+        if entry['volumes'] is not None:
+            s_set.set_volumes(np.copy(entry['volumes']))
+        return s_set
+
+    def put(self, key, Q_ref, s_set):
+        r"""
+        Adds the simple function approximation ``s_set`` centered at
+        ``Q_ref`` to the cache.
+
+        :param tuple key: key of the entry
+        :param Q_ref: :math:`Q(\lambda_{reference})`
+        :type Q_ref: :class:`~numpy.ndarray` of size (mdim,)
+        :param s_set: simple function approximation
+        :type s_set: :class:`~bet.sample.voronoi_sample_set`
+
+        """
+        entry = {'values': s_set.get_values() - Q_ref,
+                'probabilities': np.copy(s_set.get_probabilities()),
+                'volumes': None}
+        if s_set.get_volumes() is not None:
+            entry['volumes'] = np.copy(s_set.get_volumes())
+        self._store(key, entry)
+        if self.cache_dir is not None:
+            if comm.rank == 0:
+                mdat = dict()
+                for name, value in entry.iteritems():
+                    if value is not None:
+                        mdat[name] = value
+                sio.savemat(self.file_name(key), mdat)
+                # evict the least recently used files
+                file_names = [os.path.join(self.cache_dir, f) for f in \
+                        os.listdir(self.cache_dir) if \
+                        f.startswith('rho_D_M_')]
+                file_names.sort(key=os.path.getmtime)
+                for old_file in file_names[:-self.max_disk_entries]:
+                    os.remove(old_file)
+            comm.barrier()
+
+    def _store(self, key, entry):
+        """
+        Stores ``entry`` in memory as the most recently used entry and evicts
+        the least recently used entries.
+        """
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all of the entries from memory and from ``cache_dir``.
+        """
+        self._entries.clear()
+        if self.cache_dir is not None:
+            if comm.rank == 0:
+                for f in os.listdir(self.cache_dir):
+                    if f.startswith('rho_D_M_'):
+                        os.remove(os.path.join(self.cache_dir, f))
+            comm.barrier()
+
+def stream_seeds(seed):
+    """
+    Derives the seeds of the independent streams (see
+    :mod:`~bet.sampling.randomStreams`) used to create the bins and to
+    emulate samples from ``seed``. The bins are regenerated on each
+    processor and the emulated samples do not depend on the number of
+    processors. If ``seed`` is ``None`` the global :mod:`numpy.random`
+    generator is used for both.
+
+    :param int seed: seed
+
+    :rtype: tuple
+    :returns: (bin_seed, emulate_seed)
+
+    """
+    if seed is None:
+        return (None, None)
+    return (rs.stream_key(seed, 0), rs.stream_key(seed, 1))
+
+def clip_polygon(vertices, normal, offset):
+    """
+    Clips a convex polygon to the half-plane ``{x : x.normal <= offset}``
+    (Sutherland-Hodgman).
+
+    :param vertices: vertices of the polygon in counter-clockwise order
+    :type vertices: :class:`numpy.ndarray` of shape (num_vertices, 2)
+    :param normal: outward normal of the half-plane
+    :type normal: :class:`numpy.ndarray` of shape (2,)
+    :param float offset: offset of the half-plane
+
+    :rtype: :class:`numpy.ndarray` of shape (num_new_vertices, 2)
+    :returns: vertices of the clipped polygon
+
+    """
+    dist = np.dot(vertices, normal) - offset
+    inside = dist <= 0
+    if np.all(inside) or not np.any(inside):
+        return vertices[inside]
+    clipped = []
+    num_vertices = vertices.shape[0]
+    for i in xrange(num_vertices):
+        j = (i+1) % num_vertices
+        if inside[i]:
+            clipped.append(vertices[i])
+        if inside[i] != inside[j]:
+            t = dist[i]/(dist[i]-dist[j])
+            clipped.append(vertices[i] + t*(vertices[j]-vertices[i]))
+    return np.array(clipped)
+
+def exact_rectangle_probabilities(d_distr_samples, rect_min, rect_max):
+    r"""
+    Computes the exact probabilities of the Voronoi cells defined by
+    ``d_distr_samples`` for a uniform density on the generalized rectangle
+    ``[rect_min, rect_max]``, i.e. the volume of the intersection of each
+    cell with the rectangle divided by the volume of the rectangle. Intervals
+    are intersected in 1D, polygons are clipped by the bisecting half-planes
+    in 2D and the half-space intersections are formed with
+    :class:`scipy.spatial.HalfspaceIntersection` in 3D.
+
+    :param d_distr_samples: samples defining the Voronoi cells
+    :type d_distr_samples: :class:`numpy.ndarray` of shape (M, dim)
+    :param rect_min: minimum corner of the rectangle
+    :type rect_min: :class:`numpy.ndarray` of shape (dim,)
+    :param rect_max: maximum corner of the rectangle
+    :type rect_max: :class:`numpy.ndarray` of shape (dim,)
+
+    :rtype: :class:`numpy.ndarray` of shape (M,)
+    :returns: probabilities of the Voronoi cells
+
+    """
+    (M, dim) = d_distr_samples.shape
+    rect_min = np.asarray(rect_min, dtype=np.float64)
+    rect_max = np.asarray(rect_max, dtype=np.float64)
+    rect_volume = np.prod(rect_max - rect_min)
+    volumes = np.zeros((M,))
+
+    if dim == 1:
+        order = np.argsort(d_distr_samples[:, 0])
+        sorted_samples = d_distr_samples[order, 0]
+        edges = np.hstack([rect_min, 0.5*(sorted_samples[1:] + \
+                sorted_samples[:-1]), rect_max])
+        edges = np.clip(edges, rect_min[0], rect_max[0])
+        volumes[order] = edges[1:] - edges[:-1]
+        return volumes/rect_volume
+
+    if dim == 2:
+        rectangle = np.array([rect_min, [rect_max[0], rect_min[1]], rect_max,
+            [rect_min[0], rect_max[1]]])
+        for i in xrange(M):
+            normals = d_distr_samples - d_distr_samples[i]
+            offsets = np.sum(normals*0.5*(d_distr_samples + \
+                    d_distr_samples[i]), axis=1)
+            # clip by the closest neighbors first to shrink the polygon fast
+            polygon = rectangle
+            for j in np.argsort(np.sum(normals**2, axis=1)):
+                if j == i:
+                    continue
+                polygon = clip_polygon(polygon, normals[j], offsets[j])
+                if polygon.shape[0] < 3:
+                    break
+            if polygon.shape[0] >= 3:
+                volumes[i] = 0.5*np.abs(np.dot(polygon[:, 0],
+                    np.roll(polygon[:, 1], -1)) - np.dot(polygon[:, 1],
+                        np.roll(polygon[:, 0], -1)))
+        return volumes/rect_volume
+
+    if dim == 3:
+        # half-spaces A x + b <= 0 bounding the rectangle
+        box = np.vstack([np.hstack([-np.eye(dim), rect_min[:, np.newaxis]]),
+            np.hstack([np.eye(dim), -rect_max[:, np.newaxis]])])
+        # only the Delaunay neighbors of a sample bound its cell
+        if M > dim + 1:
+            (indptr, indices) = spatial.Delaunay(d_distr_samples)\
+                    .vertex_neighbor_vertices
+        else:
+            indptr = np.arange(M+1)*(M-1)
+            indices = np.hstack([np.delete(np.arange(M), i) for i in \
+                    xrange(M)])
+        for i in xrange(M):
+            others = indices[indptr[i]:indptr[i+1]]
+            normals = d_distr_samples[others] - d_distr_samples[i]
+            offsets = np.sum(normals*0.5*(d_distr_samples[others] + \
+                    d_distr_samples[i]), axis=1)
+            halfspaces = np.vstack([box, np.hstack([normals,
+                -offsets[:, np.newaxis]])])
+            # find the Chebyshev center of the cell within the rectangle
+            norms = np.linalg.norm(halfspaces[:, :-1], axis=1)
+            cost = np.zeros((dim+1,))
+            cost[-1] = -1.0
+            result = optimize.linprog(cost, A_ub=np.hstack([halfspaces[:, :-1],
+                norms[:, np.newaxis]]), b_ub=-halfspaces[:, -1],
+                bounds=[(None, None)]*dim + [(0, None)])
+            if not result.success or result.x[-1] <= 1e-12*np.max(rect_max - \
+                    rect_min):
+                continue
+            hs = spatial.HalfspaceIntersection(halfspaces, result.x[:-1])
+            volumes[i] = spatial.ConvexHull(hs.intersections).volume
+        return volumes/rect_volume
+
+    raise wrong_argument_type("Exact probabilities are only available for "+\
+            "1, 2, or 3 dimensional data spaces.")
+
 
 def uniform_partition_uniform_distribution_rectangle_size(data_set, 
                                                           Q_ref=None,
                                                           rect_size=None, 
                                                           M=50,
-                                                          num_d_emulate=1E6):
+                                                          num_d_emulate=1E6,
+                                                          seed=None,
+                                                          cache=None,
+                                                          exact=False,
+                                                          sample_type='random'):
     r"""
     Creates a simple function approximation of :math:`\rho_{\mathcal{D}}`
     where :math:`\rho_{\mathcal{D}}` is a uniform probability density on
@@ -97,7 +415,10 @@ def uniform_partition_uniform_distribution_rectangle_size(data_set,
     sampling from :math:`\rho{\mathcal{D}}` and using nearest neighbor
     searches to bin these samples in the ``M`` implicitly defined bins.
     The result is the simple function approximation denoted by
-    :math:`\rho_{\mathcal{D},M}`.
+    :math:`\rho_{\mathcal{D},M}`. If ``exact`` is ``True`` the probabilities
+    of the bins are instead computed exactly as the volumes of the
+    intersections of the bins with the generalized rectangle (see
+    :meth:`~bet.calculateP.simpleFunP.exact_rectangle_probabilities`).
 
     .. note::
 
@@ -121,12 +442,26 @@ def uniform_partition_uniform_distribution_rectangle_size(data_set,
         or :class:`~bet.sample.sample_set` or :class:`~numpy.ndarray`
     :param Q_ref: :math:`Q(`\lambda_{reference})`
     :type Q_ref: :class:`~numpy.ndarray` of size (mdim,)
+    :param int seed: seed used to create the bins and emulate samples (the
+        results do not depend on the number of processors), if ``None`` the
+        global :mod:`numpy.random` generator is used
+    :param cache: cache of simple function approximations, only used if
+        ``seed`` is given
+    :type cache: :class:`~bet.calculateP.simpleFunP.rho_D_M_cache`
+    :param bool exact: compute the probabilities of the bins exactly instead
+        of emulating, only available if the dimension of the data space is
+        at most 3
+    :param string sample_type: type of emulated samples, see
+        :meth:`~bet.sampling.quasiMonteCarlo.uniform_local`
 
     :rtype: :class:`~bet.sample.voronoi_sample_set`
     :returns: sample_set object defininng simple function approximation
     """
 
     (num, dim, values, Q_ref) = check_inputs(data_set, Q_ref)
+    if exact and dim > 3:
+        raise wrong_argument_type("Exact probabilities are only available "+\
+                "for 1, 2, or 3 dimensional data spaces.")
 
     if rect_size is None:
         raise wrong_argument_type("Rectangle size required.")
@@ -136,6 +471,18 @@ def uniform_partition_uniform_distribution_rectangle_size(data_set,
         msg = 'rect_size must be greater than 0'
         raise wrong_argument_type(msg)
 
+    (bin_seed, emulate_seed) = stream_seeds(seed)
+    if cache is not None and seed is not None:
+        key = cache.key(
+                'uniform_partition_uniform_distribution_rectangle_size'+\
+                        ('_exact' if exact else '_'+sample_type), rect_size,
+                        M, num_d_emulate, seed)
+        s_set = cache.get(key, Q_ref)
+        if s_set is not None:
+            if isinstance(data_set, samp.discretization):
+                data_set._output_probability_set = s_set
+            return s_set
+
     r'''
     Create M samples defining M Voronoi cells (i.e., "bins") in D used to
     define the simple function approximation :math:`\rho_{\mathcal{D},M}`.
@@ -159,18 +506,34 @@ def uniform_partition_uniform_distribution_rectangle_size(data_set,
     :math:`\rho_{\Lambda}` is all of :math:`\Lambda`.
     '''
 
-    if comm.rank == 0:
-        d_distr_samples = 1.5 * rect_size * (np.random.random((M,
+    if bin_seed is not None:
+        # each processor regenerates the same bins
+        d_distr_samples = 1.5 * rect_size * (rs.uniform_block(dim, 0, M,
+            bin_seed) - 0.5) + Q_ref
+    elif comm.rank == 0:
+        d_distr_samples = 1.5 * rect_size * (np.random.random_sample((M,
                                             dim)) - 0.5) + Q_ref
     else:
         d_distr_samples = np.empty((M, dim))
-    comm.Bcast([d_distr_samples, MPI.DOUBLE], root=0)
+    if bin_seed is None:
+        comm.Bcast([d_distr_samples, MPI.DOUBLE], root=0)
 
     # Initialize sample set object
     s_set = samp.voronoi_sample_set(dim)
     s_set.set_values(d_distr_samples)
     s_set.set_kdtree()
 
+    if exact:
+        rect_size = np.asarray(rect_size)
+        rho_D_M = exact_rectangle_probabilities(d_distr_samples,
+                Q_ref - 0.5*rect_size, Q_ref + 0.5*rect_size)
+        s_set.set_probabilities(rho_D_M)
+        if cache is not None and seed is not None:
+            cache.put(key, Q_ref, s_set)
+        if isinstance(data_set, samp.discretization):
+            data_set._output_probability_set = s_set
+        return s_set
+
     r'''
     Compute probabilities in the M bins used to define
     :math:`\rho_{\mathcal{D},M}` by Monte Carlo approximations
@@ -179,10 +542,8 @@ def uniform_partition_uniform_distribution_rectangle_size(data_set,
     :math:`\rho_{\mathcal{D}}`.
     '''
     # Generate the samples from :math:`\rho_{\mathcal{D}}`
-    num_d_emulate_local = int((num_d_emulate/comm.size) + \
-                        (comm.rank < num_d_emulate%comm.size))
-    d_distr_emulate = rect_size * (np.random.random((num_d_emulate_local,
-                                                     dim)) - 0.5) + Q_ref
+    d_distr_emulate = rect_size * (qmc.uniform_local(dim, num_d_emulate,
+        sample_type, emulate_seed) - 0.5) + Q_ref
 
     # Bin these samples using nearest neighbor searches
     (_, k) = s_set.query(d_distr_emulate)
@@ -206,6 +567,8 @@ def uniform_partition_uniform_distribution_rectangle_size(data_set,
     can then be stored and accessed later by the algorithm using a completely
     different set of parameter samples and model solves.
     '''
+    if cache is not None and seed is not None:
+        cache.put(key, Q_ref, s_set)
     if isinstance(data_set, samp.discretization):
         data_set._output_probability_set = s_set
     return s_set
@@ -214,7 +577,8 @@ def uniform_partition_uniform_distribution_rectangle_scaled(data_set,
                                                             Q_ref=None,
                                                             rect_scale=0.2, 
                                                             M=50,
-                                                            num_d_emulate=1E6):
+                                                            num_d_emulate=1E6,
+                                                            exact=False):
     r"""
     Creates a simple function approximation of :math:`\rho_{\mathcal{D}}`
     where :math:`\rho_{\mathcal{D}}` is a uniform probability density on
@@ -250,6 +614,8 @@ def uniform_partition_uniform_distribution_rectangle_scaled(data_set,
         :class:`~bet.sample.sample_set` or :class:`~numpy.ndarray`
     :param Q_ref: :math:`Q(`\lambda_{reference})`
     :type Q_ref: :class:`~numpy.ndarray` of size (mdim,)
+    :param bool exact: compute the probabilities of the bins exactly instead
+        of emulating
     
     :rtype: :class:`~bet.sample.voronoi_sample_set`
     :returns: sample_set object defininng simple function approximation
@@ -258,10 +624,10 @@ def uniform_partition_uniform_distribution_rectangle_scaled(data_set,
     rect_size = (np.max(values, 0) - np.min(values, 0))*rect_scale
 
     return uniform_partition_uniform_distribution_rectangle_size(data_set,
-            Q_ref, rect_size, M, num_d_emulate)
+            Q_ref, rect_size, M, num_d_emulate, exact=exact)
 
 def uniform_partition_uniform_distribution_rectangle_domain(data_set,
-        rect_domain, M=50, num_d_emulate=1E6):
+        rect_domain, M=50, num_d_emulate=1E6, exact=False):
     r"""
     Creates a simple function approximation of :math:`\rho_{\mathcal{D}}`
     where :math:`\rho_{\mathcal{D}}` is a uniform probability density on
@@ -292,6 +658,8 @@ def uniform_partition_uniform_distribution_rectangle_domain(data_set,
         :class:`~bet.sample.sample_set` or :class:`~numpy.ndarray`
     :param Q_ref: :math:`Q(`\lambda_{reference})`
     :type Q_ref: :class:`~numpy.ndarray` of size (mdim,)
+    :param bool exact: compute the probabilities of the bins exactly instead
+        of emulating
 
 
     :rtype: :class:`~bet.sample.voronoi_sample_set`
@@ -306,7 +674,8 @@ def uniform_partition_uniform_distribution_rectangle_domain(data_set,
 
 
     return uniform_partition_uniform_distribution_rectangle_size(data_set,
-                        domain_center, domain_lengths, M, num_d_emulate)
+                        domain_center, domain_lengths, M, num_d_emulate,
+                        exact=exact)
 
 
 def regular_partition_uniform_distribution_rectangle_size(data_set, Q_ref=None,
@@ -502,7 +871,8 @@ def uniform_partition_uniform_distribution_data_samples(data_set):
 
 
 def normal_partition_normal_distribution(data_set, Q_ref, std, M,
-        num_d_emulate=1E6): 
+        num_d_emulate=1E6, block_size=int(1E6), seed=None, cache=None,
+        sample_type='random'): 
     r"""
     Creates a simple function approximation of :math:`\rho_{\mathcal{D},M}`
     where :math:`\rho_{\mathcal{D},M}` is a multivariate normal probability
@@ -518,16 +888,25 @@ def normal_partition_normal_distribution(data_set, Q_ref, std, M,
         relatively small number here like 50.
     :param int num_d_emulate: Number of samples used to emulate using an MC
         assumption
+    :param int block_size: Maximum number of samples emulated at once on each
+        processor
     :param Q_ref: :math:`Q(\lambda_{reference})`
     :type Q_ref: :class:`~numpy.ndarray` of size (mdim,)
     :param std: The standard deviation of each QoI
     :type std: :class:`~numpy.ndarray` of size (mdim,)
+    :param int seed: seed used to create the bins and emulate samples (the
+        results do not depend on the number of processors), if ``None`` the
+        global :mod:`numpy.random` generator is used
+    :param cache: cache of simple function approximations, only used if
+        ``seed`` is given
+    :type cache: :class:`~bet.calculateP.simpleFunP.rho_D_M_cache`
+    :param string sample_type: type of emulated samples, see
+        :meth:`~bet.sampling.quasiMonteCarlo.uniform_local`
 
     :rtype: :class:`~bet.sample.voronoi_sample_set`
     :returns: sample_set object defining simple function approximation
 
     """
-    import scipy.stats as stats
     r'''Create M smaples defining M bins in D used to define
     :math:`\rho_{\mathcal{D},M}` rho_D is assumed to be a multi-variate normal
     distribution with mean Q_ref and standard deviation std.'''
@@ -535,18 +914,35 @@ def normal_partition_normal_distribution(data_set, Q_ref, std, M,
         Q_ref = np.array([Q_ref])
     if not isinstance(std, collections.Iterable):
         std = np.array([std])
+    Q_ref = np.asarray(Q_ref, dtype=np.float64)
+    std = np.asarray(std, dtype=np.float64)
 
     covariance = std ** 2
 
+    (bin_seed, emulate_seed) = stream_seeds(seed)
+    if cache is not None and seed is not None:
+        key = cache.key('normal_partition_normal_distribution_'+sample_type,
+                std, M, num_d_emulate, seed)
+        s_set = cache.get(key, Q_ref)
+        if s_set is not None:
+            if isinstance(data_set, samp.discretization):
+                data_set._output_probability_set = s_set
+            return s_set
+
     d_distr_samples = np.zeros((M, len(Q_ref)))
     logging.info("d_distr_samples.shape "+str(d_distr_samples.shape))
     logging.info("Q_ref.shape "+str(Q_ref.shape))
     logging.info("std.shape "+str(std.shape))
 
-    if comm.rank == 0:
-        for i in xrange(len(Q_ref)):
-            d_distr_samples[:, i] = np.random.normal(Q_ref[i], std[i], M)
-    comm.Bcast([d_distr_samples, MPI.DOUBLE], root=0)
+    if bin_seed is not None:
+        # each processor regenerates the same bins
+        d_distr_samples = Q_ref + std * rs.normal_block(len(Q_ref), 0, M,
+                bin_seed)
+    else:
+        if comm.rank == 0:
+            for i in xrange(len(Q_ref)):
+                d_distr_samples[:, i] = np.random.normal(Q_ref[i], std[i], M)
+        comm.Bcast([d_distr_samples, MPI.DOUBLE], root=0)
 
     # Initialize sample set object
     s_set = samp.voronoi_sample_set(len(Q_ref))
@@ -556,25 +952,38 @@ def normal_partition_normal_distribution(data_set, Q_ref, std, M,
     r'''Now compute probabilities for :math:`\rho_{\mathcal{D},M}` by sampling
     from rho_D First generate samples of rho_D - I sometimes call this
     emulation'''
-    num_d_emulate_local = int((num_d_emulate/comm.size) + \
-                              (comm.rank < num_d_emulate%comm.size))
-    d_distr_emulate = np.zeros((num_d_emulate_local, len(Q_ref)))
-    for i in xrange(len(Q_ref)):
-        d_distr_emulate[:, i] = np.random.normal(Q_ref[i], std[i],
-                                                 num_d_emulate_local)
+    # Since the covariance is diagonal the inverse of the density of rho_D is
+    # exp(0.5*sum(((q - Q_ref)/std)**2))*prod(sqrt(2*pi*covariance))
+    log_norm_const = 0.5 * np.sum(np.log(2.0 * np.pi * covariance))
 
-        # Now bin samples of rho_D in the M bins of D to compute rho_{D, M}
-    if len(d_distr_samples.shape) == 1:
-        d_distr_samples = np.expand_dims(d_distr_samples, axis=1)
-
-    (_, k) = s_set.query(d_distr_emulate)
+    # Emulate in blocks and bin samples of rho_D in the M bins of D to compute
+    # rho_{D, M}
     count_neighbors = np.zeros((M,), dtype=np.int)
     volumes = np.zeros((M,))
-    for i in xrange(M):
-        Itemp = np.equal(k, i)
-        count_neighbors[i] = np.sum(Itemp)
-        volumes[i] = np.sum(1.0 / stats.multivariate_normal.pdf \
-            (d_distr_emulate[Itemp, :], Q_ref, covariance))
+    legacy = sample_type in ['random', 'r'] and emulate_seed is None
+    if legacy:
+        num_d_emulate_local = int((num_d_emulate/comm.size) + \
+                                  (comm.rank < num_d_emulate%comm.size))
+        blocks = [min(block_size, num_d_emulate_local - start) for start in \
+                xrange(0, num_d_emulate_local, block_size)]
+    else:
+        # transform points on the unit hypercube
+        blocks = qmc.uniform_local_blocks(len(Q_ref), num_d_emulate,
+                block_size, sample_type, emulate_seed)
+    for block in blocks:
+        if legacy:
+            d_distr_emulate = np.zeros((block, len(Q_ref)))
+            for i in xrange(len(Q_ref)):
+                d_distr_emulate[:, i] = np.random.normal(Q_ref[i], std[i],
+                        block)
+        else:
+            d_distr_emulate = Q_ref + std*special.ndtri(block)
+        (_, k) = s_set.query(d_distr_emulate)
+        inv_pdf = np.exp(0.5 * np.sum(((d_distr_emulate - Q_ref) / std)**2,
+            axis=1) + log_norm_const)
+        count_neighbors += np.bincount(k, minlength=M)
+        volumes += np.bincount(k, weights=inv_pdf, minlength=M)
+
     # Now define probability of the d_distr_samples
     # This together with d_distr_samples defines :math:`\rho_{\mathcal{D},M}`
     ccount_neighbors = np.copy(count_neighbors)
@@ -592,13 +1001,15 @@ def normal_partition_normal_distribution(data_set, Q_ref, std, M,
     # NOTE: The computation of q_distr_prob, q_distr_emulate, q_distr_samples
     # above, while informed by the sampling of the map Q, do not require
     # solving the model EVER! This can be done "offline" so to speak.
+    if cache is not None and seed is not None:
+        cache.put(key, Q_ref, s_set)
     if isinstance(data_set, samp.discretization):
         data_set._output_probability_set = s_set
     return s_set
 
 
 def uniform_partition_normal_distribution(data_set, Q_ref, std, M,
-        num_d_emulate=1E6): 
+        num_d_emulate=1E6, seed=None, cache=None, sample_type='random'): 
     r"""
     Creates a simple function approximation of :math:`\rho_{\mathcal{D},M}`
     where :math:`\rho_{\mathcal{D},M}` is a multivariate normal probability
@@ -619,6 +1030,14 @@ def uniform_partition_normal_distribution(data_set, Q_ref, std, M,
     :type Q_ref: :class:`~numpy.ndarray` of size (mdim,)
     :param std: The standard deviation of each QoI
     :type std: :class:`~numpy.ndarray` of size (mdim,)
+    :param int seed: seed used to create the bins and emulate samples (the
+        results do not depend on the number of processors), if ``None`` the
+        global :mod:`numpy.random` generator is used
+    :param cache: cache of simple function approximations, only used if
+        ``seed`` is given
+    :type cache: :class:`~bet.calculateP.simpleFunP.rho_D_M_cache`
+    :param string sample_type: type of emulated samples, see
+        :meth:`~bet.sampling.quasiMonteCarlo.uniform_local`
 
     :rtype: :class:`~bet.sample.voronoi_sample_set`
     :returns: sample_set object defininng simple function approximation
@@ -632,12 +1051,27 @@ def uniform_partition_normal_distribution(data_set, Q_ref, std, M,
     if not isinstance(std, collections.Iterable):
         std = np.array([std])
 
+    (bin_seed, emulate_seed) = stream_seeds(seed)
+    if cache is not None and seed is not None:
+        key = cache.key('uniform_partition_normal_distribution_'+sample_type,
+                std, M, num_d_emulate, seed)
+        s_set = cache.get(key, Q_ref)
+        if s_set is not None:
+            if isinstance(data_set, samp.discretization):
+                data_set._output_probability_set = s_set
+            return s_set
+
     bin_size = 4.0 * std
     d_distr_samples = np.zeros((M, len(Q_ref)))
-    if comm.rank == 0:
-        d_distr_samples = bin_size * (np.random.random((M,
-                                            len(Q_ref))) - 0.5) + Q_ref
-    comm.Bcast([d_distr_samples, MPI.DOUBLE], root=0)
+    if bin_seed is not None:
+        # each processor regenerates the same bins
+        d_distr_samples = bin_size * (rs.uniform_block(len(Q_ref), 0, M,
+            bin_seed) - 0.5) + Q_ref
+    else:
+        if comm.rank == 0:
+            d_distr_samples = bin_size * (np.random.random_sample((M,
+                                                len(Q_ref))) - 0.5) + Q_ref
+        comm.Bcast([d_distr_samples, MPI.DOUBLE], root=0)
 
     # Initialize sample set object
     s_set = samp.voronoi_sample_set(len(Q_ref))
@@ -647,12 +1081,18 @@ def uniform_partition_normal_distribution(data_set, Q_ref, std, M,
     r'''Now compute probabilities for :math:`\rho_{\mathcal{D},M}` by sampling
     from rho_D First generate samples of rho_D - I sometimes call this
     emulation'''
-    num_d_emulate_local = int((num_d_emulate/comm.size) + \
-            (comm.rank < num_d_emulate%comm.size))
-    d_distr_emulate = np.zeros((num_d_emulate_local, len(Q_ref)))
-    for i in xrange(len(Q_ref)):
-        d_distr_emulate[:, i] = np.random.normal(Q_ref[i], std[i],
-                                                 num_d_emulate_local)
+    if sample_type in ['random', 'r'] and emulate_seed is None:
+        num_d_emulate_local = int((num_d_emulate/comm.size) + \
+                (comm.rank < num_d_emulate%comm.size))
+        d_distr_emulate = np.zeros((num_d_emulate_local, len(Q_ref)))
+        for i in xrange(len(Q_ref)):
+            d_distr_emulate[:, i] = np.random.normal(Q_ref[i], std[i],
+                                                     num_d_emulate_local)
+    else:
+        # transform points on the unit hypercube
+        d_distr_emulate = np.asarray(Q_ref) + np.asarray(std)*special.ndtri(
+                qmc.uniform_local(len(Q_ref), num_d_emulate, sample_type,
+                    emulate_seed))
 
         # Now bin samples of rho_D in the M bins of D to compute rho_{D, M}
     if len(d_distr_samples.shape) == 1:
@@ -676,6 +1116,8 @@ def uniform_partition_normal_distribution(data_set, Q_ref, std, M,
     # NOTE: The computation of q_distr_prob, q_distr_emulate, q_distr_samples
     # above, while informed by the sampling of the map Q, do not require
     # solving the model EVER! This can be done "offline" so to speak.
+    if cache is not None and seed is not None:
+        cache.put(key, Q_ref, s_set)
     if isinstance(data_set, samp.discretization):
         data_set._output_probability_set = s_set
     return s_set
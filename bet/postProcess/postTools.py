@@ -6,6 +6,8 @@ This module provides methods for postprocessing probabilities and data.
 import logging
 import numpy as np
 import bet.sample as sample
+import bet.util as util
+from bet.Comm import comm, MPI
 
 class dim_not_matching(Exception):
     """
@@ -86,7 +88,8 @@ def sample_prob(percentile, sample_set, sort=True, descending=False):
     A new sample_set with the samples corresponding to these highest/lowest
     probability samples is returned along with the number of samples and
     the indices.
-    This uses :meth:`~bet.postProcess.sort_by_rho`.
+    This uses :meth:`~bet.postProcess.sort_by_rho`, for large sample sets use
+    :meth:`~bet.postProcess.postTools.sample_prob_select`.
     The ``descending`` flag determines whether or not to calcuate the
     highest/lowest.
 
@@ -222,6 +225,199 @@ def sample_lowest_prob(bottom_percentile, sample_set, sort=True):
     return sample_prob(bottom_percentile, sample_set,
             sort, descending=True)
 
+def find_rho_threshold(percentile, rho_local, P_local):
+    """
+    Finds the smallest density such that the probabilities of the samples
+    with at least this density sum to at most ``percentile`` without sorting
+    the samples. This is a parallel quantile search over the local arrays.
+    Each iteration only keeps the samples whose densities lie strictly
+    between the current bounds on the threshold. The pivot is the median of
+    the local medians (found with :meth:`numpy.partition`) weighted by the
+    number of local candidates. Only samples with positive probability are
+    considered.
+
+    :param percentile: ratio of highest density samples to select
+    :type percentile: float
+    :param rho_local: local densities of the samples
+    :type rho_local: :class:`numpy.ndarray` of shape (num_local,)
+    :param P_local: local probabilities of the samples
+    :type P_local: :class:`numpy.ndarray` of shape (num_local,)
+
+    :rtype: tuple
+    :returns: (threshold, boundary, P_above), where ``threshold`` is the
+        density threshold (``None`` if no density qualifies), ``boundary``
+        is the largest density below the threshold (``None`` if there is
+        none) and ``P_above`` is the probability of the samples with at least
+        the threshold density
+
+    """
+    candidates = P_local > 0.0
+    cand_rho = rho_local[candidates]
+    cand_P = P_local[candidates]
+    threshold = None
+    boundary = None
+    P_above = 0.0
+    num = comm.allreduce(cand_rho.shape[0], op=MPI.SUM)
+    while num > 0:
+        # Choose the weighted median of the local medians as pivot
+        num_local = cand_rho.shape[0]
+        if num_local > 0:
+            median = np.partition(cand_rho, num_local/2)[num_local/2]
+        else:
+            median = None
+        medians = sorted([m for m in comm.allgather((median, num_local))\
+                if m[1] > 0])
+        counts = np.cumsum([m[1] for m in medians])
+        pivot = medians[np.searchsorted(counts, 0.5*counts[-1])][0]
+
+        above = cand_rho >= pivot
+        P_pivot = P_above + comm.allreduce(float(np.sum(cand_P[above])),
+                op=MPI.SUM)
+        if P_pivot <= percentile:
+            threshold = pivot
+            P_above = P_pivot
+            keep = np.logical_not(above)
+        else:
+            boundary = pivot
+            keep = cand_rho > pivot
+        cand_rho = cand_rho[keep]
+        cand_P = cand_P[keep]
+        num = comm.allreduce(cand_rho.shape[0], op=MPI.SUM)
+    return (threshold, boundary, P_above)
+
+def sample_prob_select(percentile, sample_set, descending=False,
+        globalize=True):
+    """
+    This calculates the highest/lowest probability samples whose probability
+    sum to a given value without sorting all of the samples.
+    A new sample_set with only the selected samples, sorted by probability
+    density, is returned along with the number of samples and the (global)
+    indices.
+    This uses :meth:`~bet.postProcess.postTools.find_rho_threshold` on the
+    local arrays, so the samples are never globalized. Samples with the
+    density at the boundary of the selection are added in the order that
+    :meth:`~bet.postProcess.postTools.sort_by_rho` gives a stable sort of the
+    densities, i.e. in descending order of their indices (ascending if
+    ``descending``), while their probabilities sum to at most the given
+    value. Tied samples are returned in the same order. Note that for large
+    sample sets :meth:`~bet.postProcess.postTools.sort_by_rho` uses an
+    unstable sort, so its order of tied samples may differ. The
+    sums are compared to the given value with a relative tolerance of
+    ``1e-12`` so that roundoff in the (distributed) sums does not change the
+    selection.
+    The ``descending`` flag determines whether or not to calcuate the
+    highest/lowest.
+
+    :param percentile: ratio of highest probability samples to select
+    :type percentile: float
+    :param sample_set: Object containing samples and probabilities
+    :type sample_set: :class:`~bet.sample.sample_set_base` or 
+        :class:`~bet.sample.discretization`
+    :param bool descending: Flag order of sorting
+    :param bool globalize: Flag whether or not the selected samples are
+        gathered on all processors, otherwise the local arrays of
+        ``sample_set_out`` contain the locally selected samples
+
+    :rtype: tuple
+    :returns: ( num_samples, sample_set_out, indices)
+
+    """
+    if isinstance(sample_set, sample.discretization):
+        input_set = sample_set._input_sample_set
+        output_set = sample_set._output_sample_set
+    elif isinstance(sample_set, sample.sample_set_base):
+        input_set = sample_set
+        output_set = None
+    else:
+        raise bad_object("Improper sample object")
+    if input_set._probabilities_local is None:
+        input_set.global_to_local()
+    if output_set is not None and output_set._values_local is None:
+        output_set.global_to_local()
+
+    P_local = input_set._probabilities_local
+    lam_vol = input_set._volumes_local
+    if lam_vol is None:
+        rho = P_local
+    else:
+        rho = P_local/lam_vol
+    if descending:
+        rho = -rho
+
+    # Select the samples with at least the threshold density
+    percentile = percentile*(1.0 + 1e-12)
+    (threshold, boundary, P_above) = find_rho_threshold(percentile, rho,
+            P_local)
+    selected = np.zeros(P_local.shape, dtype=bool)
+    if threshold is not None:
+        selected = np.logical_and(P_local > 0.0, rho >= threshold)
+
+    # Add the samples with the boundary density in the order of the indices
+    # (in reverse order unless descending, as in sort_by_rho)
+    if boundary is not None:
+        tied = np.nonzero(np.logical_and(P_local > 0.0,
+            rho == boundary))[0]
+        P_ranks = comm.allgather(float(np.sum(P_local[tied])))
+        if descending:
+            P_offset = np.sum(P_ranks[:comm.rank])
+        else:
+            tied = tied[::-1]
+            P_offset = np.sum(P_ranks[comm.rank+1:])
+        P_tied = np.cumsum(np.append(P_above + P_offset, P_local[tied]))[1:]
+        selected[tied[P_tied <= percentile]] = True
+
+    # Sort the selected samples by density, ties are ordered by index
+    if descending:
+        tie_order = 1
+    else:
+        tie_order = -1
+    indices = np.nonzero(selected)[0]
+    indices = indices[np.lexsort((tie_order*indices, -rho[indices]))]
+    rho = rho[indices]
+    samples = input_set._values_local[indices]
+    P_samples = P_local[indices]
+    if lam_vol is not None:
+        lam_vol = lam_vol[indices]
+    data = None
+    if output_set is not None:
+        data = output_set._values_local[indices]
+    index_offset = np.sum(comm.allgather(P_local.shape[0])[:comm.rank])
+    indices = indices + int(index_offset)
+    num_samples = comm.allreduce(indices.shape[0], op=MPI.SUM)
+
+    if globalize:
+        rho = util.get_global_values(rho)
+        indices = util.get_global_values(indices)
+        order = np.lexsort((tie_order*indices, -rho))
+        indices = indices[order]
+        samples = util.get_global_values(samples)[order]
+        P_samples = util.get_global_values(P_samples)[order]
+        if lam_vol is not None:
+            lam_vol = util.get_global_values(lam_vol)[order]
+        if data is not None:
+            data = util.get_global_values(data)[order]
+
+    samples_out = sample.sample_set(input_set.get_dim())
+    if globalize:
+        samples_out.set_values(samples)
+        samples_out.set_probabilities(P_samples)
+        samples_out.set_volumes(lam_vol)
+    else:
+        samples_out.set_values_local(samples)
+        samples_out.set_probabilities_local(P_samples)
+        samples_out.set_volumes_local(lam_vol)
+    if output_set is not None:
+        data_out = sample.sample_set(output_set.get_dim())
+        if globalize:
+            data_out.set_values(data)
+        else:
+            data_out.set_values_local(data)
+        sample_set_out = sample.discretization(samples_out, data_out)
+    else:
+        sample_set_out = samples_out
+
+    return (num_samples, sample_set_out, indices)
+
 def compare_yield(sort_ind, sample_quality, run_param, column_headings=None):
     """
     .. todo::
@@ -3,6 +3,7 @@
 """
 This module contains data structure/storage classes for BET. Notably:
     :class:`bet.sample.sample_set`
+    :class:`bet.sample.regular_grid_sample_set`
     :class:`bet.sample.discretization`
     :class:`bet.sample.length_not_matching`
     :class:`bet.sample.dim_not_matching`
@@ -19,6 +20,7 @@ import bet
 from bet.Comm import comm, MPI
 import bet.util as util
 import bet.sampling.LpGeneralizedSamples as lp
+import bet.sampling.quasiMonteCarlo as qmc
 
 class length_not_matching(Exception):
     """
@@ -268,7 +270,7 @@ class sample_set_base(object):
     #: List of global attribute names for attributes that are 
     #: :class:`numpy.ndarray`
     array_names = ['_values', '_volumes', '_probabilities', '_jacobians',
-                   '_error_estimates', '_right', '_left', '_width',
+                   '_hessians', '_error_estimates', '_right', '_left', '_width',
                    '_kdtree_values', '_radii', '_normalized_radii',
                    '_region', '_error_id'] 
     #: List of attribute names for attributes that are
@@ -277,7 +279,8 @@ class sample_set_base(object):
                          '_values', '_values_local', '_left', '_left_local', 
                          '_right', '_right_local', '_width', '_width_local', 
                          '_domain', '_kdtree_values', '_jacobians', 
-                         '_jacobians_local', '_domain_original'] 
+                         '_jacobians_local', '_hessians', '_hessians_local',
+                         '_domain_original'] 
 
 
     def __init__(self, dim):
@@ -299,6 +302,9 @@ class sample_set_base(object):
         #: :class:`numpy.ndarray` of Jacobians at samples of shape (num,
         #: other_dim, dim)
         self._jacobians = None
+        #: :class:`numpy.ndarray` of Hessians at samples of shape (num,
+        #: other_dim, dim, dim)
+        self._hessians = None
         #: :class:`numpy.ndarray` of model error estimates at samples of shape
         #: (num, dim) 
         self._error_estimates = None
@@ -320,6 +326,9 @@ class sample_set_base(object):
         #: Local Jacobians for parallelism, :class:`numpy.ndarray` of shape
         #: (local_num, other_dim, dim)
         self._jacobians_local = None
+        #: Local Hessians for parallelism, :class:`numpy.ndarray` of shape
+        #: (local_num, other_dim, dim, dim)
+        self._hessians_local = None
         #: Local error_estimates for parallelism, :class:`numpy.ndarray` of
         #: shape (local_num,)
         self._error_estimates_local = None
@@ -384,6 +393,13 @@ class sample_set_base(object):
                 if val is not None:
                     val *= (self._domain[:, 1] - self._domain[:, 0])
                     setattr(self, obj, val)
+            rescale_list = ['_hessians', '_hessians_local']
+            width = self._domain[:, 1] - self._domain[:, 0]
+            for obj in rescale_list:
+                val = getattr(self, obj)
+                if val is not None:
+                    val *= np.outer(width, width)
+                    setattr(self, obj, val)
 
             shift_list = ['_values', '_values_local',
                           '_error_estimates', '_error_estimates_local',
@@ -420,6 +436,13 @@ class sample_set_base(object):
                 if val is not None:
                     val = val/(self._domain_original[:, 1] - self._domain_original[:, 0])
                     setattr(self, obj, val)
+            rescale_list = ['_hessians', '_hessians_local']
+            width = self._domain_original[:, 1] - self._domain_original[:, 0]
+            for obj in rescale_list:
+                val = getattr(self, obj)
+                if val is not None:
+                    val = val/np.outer(width, width)
+                    setattr(self, obj, val)
               
             shift_list = ['_values', '_values_local',
                           '_error_estimates', '_error_estimates_local',
@@ -825,6 +848,44 @@ class sample_set_base(object):
         self._jacobians = np.concatenate((self._jacobians, new_jacobians),
                 axis=0)
 
+    def set_hessians(self, hessians):
+        """
+        Sets sample Hessians.
+
+        :type hessians: :class:`numpy.ndarray` of shape (num, other_dim, dim,
+            dim)
+        :param hessians: sample Hessians
+
+        """
+        self._hessians = hessians
+        
+    def get_hessians(self):
+        """
+        Returns sample Hessians.
+
+        :rtype: :class:`numpy.ndarray` of shape (num, other_dim, dim, dim)
+        :returns: sample Hessians
+
+        """
+        return self._hessians
+
+    def append_hessians(self, new_hessians):
+        """
+        Appends the ``new_hessians`` to ``self._hessians``. 
+
+        .. note::
+
+            Remember to update the other member attribute arrays so that
+            :meth:`~sample.sample.check_num` does not fail.
+
+        :param new_hessians: New Hessians to append.
+        :type new_hessians: :class:`numpy.ndarray` of shape (num, other_dim, 
+            dim, dim)
+
+        """
+        self._hessians = np.concatenate((self._hessians, new_hessians),
+                axis=0)
+
     def set_error_estimates(self, error_estimates):
         """
         Returns sample error estimates.
@@ -968,6 +1029,27 @@ class sample_set_base(object):
         """
         return self._jacobians_local
 
+    def set_hessians_local(self, hessians_local):
+        """
+        Sets local sample Hessians.
+
+        :type hessians_local: :class:`numpy.ndarray` of shape (num, other_dim,
+            dim, dim) 
+        :param hessians_local: local sample Hessians
+
+        """
+        self._hessians_local = hessians_local
+
+    def get_hessians_local(self):
+        """
+        Returns local sample Hessians.
+
+        :rtype: :class:`numpy.ndarray` of shape (num, other_dim, dim, dim)
+        :returns: local sample Hessians
+
+        """
+        return self._hessians_local
+
     def set_error_estimates_local(self, error_estimates_local):
         """
         Returns local sample error estimates.
@@ -1010,19 +1092,22 @@ class sample_set_base(object):
         """
         pass
 
-    def estimate_volume(self, n_mc_points=int(1E4)):
+    def estimate_volume(self, n_mc_points=int(1E4), sample_type='random',
+            seed=None):
         """
         Calculate the volume faction of cells approximately using Monte
         Carlo integration. 
 
         :param int n_mc_points: If estimate is True, number of MC points to use
+        :param string sample_type: type of MC points, see
+            :meth:`~bet.sampling.quasiMonteCarlo.uniform_local`
+        :param int seed: shared seed of the MC points, if ``None`` the global
+            :mod:`numpy.random` generator is used
         """
         num = self.check_num()
-        n_mc_points_local = (n_mc_points/comm.size) + \
-                            (comm.rank < n_mc_points%comm.size)
         width = self._domain[:, 1] - self._domain[:, 0]
-        mc_points = width*np.random.random((n_mc_points_local,
-            self._domain.shape[0])) + self._domain[:, 0]
+        mc_points = width*qmc.uniform_local(self._domain.shape[0],
+                n_mc_points, sample_type, seed) + self._domain[:, 0]
         (_, emulate_ptr) = self.query(mc_points)
         vol = np.zeros((num,))
         for i in xrange(num):
@@ -1480,7 +1565,8 @@ class voronoi_sample_set(sample_set_base):
         self._volumes[global_index] = lam_vol_global[:]
         self.global_to_local()
 
-    def estimate_radii(self, n_mc_points=int(1E4), normalize=True):
+    def estimate_radii(self, n_mc_points=int(1E4), normalize=True,
+            sample_type='random', seed=None):
         """
         Calculate the radii of cells approximately using Monte
         Carlo integration. 
@@ -1494,13 +1580,15 @@ class voronoi_sample_set(sample_set_base):
 
         :param int n_mc_points: If estimate is True, number of MC points to use
         :param bool normalize: estimate normalized radius
+        :param string sample_type: type of MC points, see
+            :meth:`~bet.sampling.quasiMonteCarlo.uniform_local`
+        :param int seed: shared seed of the MC points, if ``None`` the global
+            :mod:`numpy.random` generator is used
 
         """
         num = self.check_num()
 
         samples = np.copy(self.get_values())
-        n_mc_points_local = (n_mc_points/comm.size) + \
-                            (comm.rank < n_mc_points%comm.size)
 
         # normalize the samples
         if normalize:
@@ -1512,8 +1600,9 @@ class voronoi_sample_set(sample_set_base):
             self._width = None
 
         width = self._domain[:, 1] - self._domain[:, 0]
-        mc_points = width*np.random.random((n_mc_points_local,
-                self._domain.shape[0])) + self._domain[:, 0]
+        mc_points = width*qmc.uniform_local(self._domain.shape[0],
+                n_mc_points, sample_type, seed) + self._domain[:, 0]
+        n_mc_points_local = mc_points.shape[0]
 
         (_, emulate_ptr) = self.query(mc_points)
 
@@ -1542,7 +1631,8 @@ class voronoi_sample_set(sample_set_base):
         
         self.global_to_local()
 
-    def estimate_radii_and_volume(self, n_mc_points=int(1E4), normalize=True):
+    def estimate_radii_and_volume(self, n_mc_points=int(1E4), normalize=True,
+            sample_type='random', seed=None):
         """
         Calculate the radii and volume faction of cells approximately using
         Monte Carlo integration. 
@@ -1556,13 +1646,15 @@ class voronoi_sample_set(sample_set_base):
 
         :param int n_mc_points: If estimate is True, number of MC points to use
         :param bool normalize: estimate normalized radius
+        :param string sample_type: type of MC points, see
+            :meth:`~bet.sampling.quasiMonteCarlo.uniform_local`
+        :param int seed: shared seed of the MC points, if ``None`` the global
+            :mod:`numpy.random` generator is used
 
         """
         num = self.check_num()
 
         samples = np.copy(self.get_values())
-        n_mc_points_local = (n_mc_points/comm.size) + \
-                            (comm.rank < n_mc_points%comm.size)
 
         # normalize the samples
         if normalize:
@@ -1571,8 +1663,9 @@ class voronoi_sample_set(sample_set_base):
             samples = samples/self._width
         
         width = self._domain[:, 1] - self._domain[:, 0]
-        mc_points = width*np.random.random((n_mc_points_local,
-                self._domain.shape[0])) + self._domain[:, 0]
+        mc_points = width*qmc.uniform_local(self._domain.shape[0],
+                n_mc_points, sample_type, seed) + self._domain[:, 0]
+        n_mc_points_local = mc_points.shape[0]
 
         (_, emulate_ptr) = self.query(mc_points)
 
@@ -1777,6 +1870,192 @@ class sample_set(voronoi_sample_set):
     Set Voronoi cells as the default for now.
     """
 
+def regular_grid_coordinates(domain, grid_shape):
+    """
+    Returns the coordinates along each dimension of a regular grid with
+    ``grid_shape`` points where each point is centered in a cell of equal
+    width.
+
+    :param domain: domain of the grid
+    :type domain: :class:`numpy.ndarray` of shape (dim, 2)
+    :param grid_shape: number of samples per dimension
+    :type grid_shape: :class:`numpy.ndarray` of shape (dim,)
+
+    :rtype: list
+    :returns: list of :class:`numpy.ndarray` of shape (grid_shape[i],)
+
+    """
+    coordinates = list()
+    for i in xrange(len(grid_shape)):
+        num = int(grid_shape[i])
+        bin_width = (domain[i, 1] - domain[i, 0]) / np.float(num)
+        coordinates.append(np.linspace(domain[i, 0] - 0.5 * bin_width,
+            domain[i, 1] + 0.5 * bin_width, num + 2)[1:num + 1])
+    return coordinates
+
+def regular_grid_values(domain, grid_shape, start=0, stop=None):
+    """
+    Computes the points with (C-ordered) global indices ``start:stop`` of a
+    regular grid without creating the rest of the grid.
+
+    :param domain: domain of the grid
+    :type domain: :class:`numpy.ndarray` of shape (dim, 2)
+    :param grid_shape: number of samples per dimension
+    :type grid_shape: :class:`numpy.ndarray` of shape (dim,)
+    :param int start: first global index
+    :param int stop: one past the last global index, defaults to the total
+        number of points
+
+    :rtype: :class:`numpy.ndarray` of shape (stop-start, dim)
+    :returns: grid points
+
+    """
+    grid_shape = tuple([int(num) for num in grid_shape])
+    if stop is None:
+        stop = int(np.product(grid_shape))
+    coordinates = regular_grid_coordinates(domain, grid_shape)
+    index = np.unravel_index(np.arange(start, stop), grid_shape)
+    values = np.empty((stop-start, len(grid_shape)))
+    for i in xrange(len(grid_shape)):
+        values[:, i] = coordinates[i][index[i]]
+    return values
+
+class regular_grid_sample_set(sample_set):
+    """
+    A set of samples on a regular grid defining a Voronoi tesselation. The
+    nearest sample to a point is found directly from the grid structure so
+    that neither a :class:`scipy.spatial.KDTree` nor the global values are
+    needed to :meth:`query`.
+
+    The grid structure is discarded if the values or domain are reset or
+    values are appended.
+    """
+    #: List of attribute names for attributes which are vectors or 1D
+    #: :class:`numpy.ndarray` or int/float
+    vector_names = sample_set.vector_names + ['_grid_shape']
+
+    def __init__(self, dim):
+        """
+
+        Initialization
+
+        :param int dim: Dimension of the space in which these samples reside.
+
+        """
+        super(regular_grid_sample_set, self).__init__(dim)
+        #: Number of samples per dimension, :class:`numpy.ndarray` of shape
+        #: (dim,)
+        self._grid_shape = None
+
+    def set_grid_shape(self, grid_shape):
+        """
+        Sets the number of samples per dimension of the regular grid.
+
+        :param grid_shape: number of samples per dimension
+        :type grid_shape: :class:`numpy.ndarray` of shape (dim,)
+
+        """
+        grid_shape = np.array(grid_shape, dtype=np.int).ravel()
+        if grid_shape.shape[0] != self._dim:
+            raise dim_not_matching("dimension of grid shape incorrect")
+        self._grid_shape = grid_shape
+
+    def get_grid_shape(self):
+        """
+        Returns the number of samples per dimension of the regular grid.
+
+        :rtype: :class:`numpy.ndarray` of shape (dim,)
+        :returns: number of samples per dimension
+
+        """
+        return self._grid_shape
+
+    def set_values(self, values):
+        """
+        Sets the sample values and discards the grid structure.
+
+        :param values: sample values
+        :type values: :class:`numpy.ndarray` of shape (num, dim)
+
+        """
+        super(regular_grid_sample_set, self).set_values(values)
+        self._grid_shape = None
+
+    def append_values(self, values):
+        """
+        Appends the values and discards the grid structure.
+
+        :param values: values to append
+        :type values: :class:`numpy.ndarray` of shape (some_num, dim)
+
+        """
+        super(regular_grid_sample_set, self).append_values(values)
+        self._grid_shape = None
+
+    def set_values_local(self, values_local):
+        """
+        Sets the local sample values and discards the grid structure.
+
+        :param values_local: local sample values
+        :type values_local: :class:`numpy.ndarray` of shape (local_num, dim)
+
+        """
+        super(regular_grid_sample_set, self).set_values_local(values_local)
+        self._grid_shape = None
+
+    def append_values_local(self, values_local):
+        """
+        Appends the local values and discards the grid structure.
+
+        :param values_local: local values to append
+        :type values_local: :class:`numpy.ndarray` of shape (some_num, dim)
+
+        """
+        super(regular_grid_sample_set, self).append_values_local(values_local)
+        self._grid_shape = None
+
+    def set_domain(self, domain):
+        """
+        Sets the domain and discards the grid structure.
+
+        :param domain: Sample domain
+        :type domain: :class:`numpy.ndarray` of shape (dim, 2)
+
+        """
+        super(regular_grid_sample_set, self).set_domain(domain)
+        self._grid_shape = None
+
+    def query(self, x, k=1):
+        """
+        Identify which value points x are associated with for discretization.
+        If ``k == 1`` the nearest grid point is found in each dimension
+        independently, otherwise a :class:`scipy.spatial.KDTree` is used.
+
+        :param x: points for query
+        :type x: :class:`numpy.ndarray` of shape ``(*, dim)``
+        :param int k: number of nearest neighbors to return
+
+        :rtype: tuple
+        :returns: (dist, ptr)
+        """
+        if self._grid_shape is None or k != 1:
+            return super(regular_grid_sample_set, self).query(x, k)
+        x = util.fix_dimensions_data(x, self._dim)
+        # a loaded grid shape may have been squeezed
+        num_per_dim = np.ravel(self._grid_shape).astype(np.int)
+        grid_shape = tuple(num_per_dim)
+        width = (self._domain[:, 1] - self._domain[:, 0]) / \
+                num_per_dim.astype(np.float)
+        index = np.floor((x - self._domain[:, 0]) / width).astype(np.int)
+        index = np.clip(index, 0, num_per_dim - 1)
+        coordinates = regular_grid_coordinates(self._domain, grid_shape)
+        nearest = np.empty(x.shape)
+        for i in xrange(self._dim):
+            nearest[:, i] = coordinates[i][index[:, i]]
+        dist = np.linalg.norm(x - nearest, ord=self._p_norm, axis=1)
+        ptr = np.ravel_multi_index(tuple(index.transpose()), grid_shape)
+        return (dist, ptr)
+
 class rectangle_sample_set(sample_set_base):
     r"""
     A data structure containing arrays specific to a set of samples defining a
@@ -1889,6 +2168,18 @@ class rectangle_sample_set(sample_set_base):
         msg = "Values cannot be appended for this type of sample set."
         logging.warning(msg)
 
+    def append_hessians(self, new_hessians):
+        """
+        Does nothing for this type of sample set. 
+
+        :param new_hessians: New Hessians to append.
+        :type new_hessians: :class:`numpy.ndarray` of shape (num, other_dim, 
+            dim, dim)
+
+        """
+        msg = "Values cannot be appended for this type of sample set."
+        logging.warning(msg)
+
     def append_error_estimates(self, new_error_estimates):
         """
         Does nothing for this type of sample set.
@@ -2044,6 +2335,18 @@ class ball_sample_set(sample_set_base):
         msg = "Values cannot be appended for this type of sample set."
         logging.warning(msg)
 
+    def append_hessians(self, new_hessians):
+        """
+        Does nothing for this type of sample set. 
+
+        :param new_hessians: New Hessians to append.
+        :type new_hessians: :class:`numpy.ndarray` of shape (num, other_dim, 
+            dim, dim)
+
+        """
+        msg = "Values cannot be appended for this type of sample set."
+        logging.warning(msg)
+
     def append_error_estimates(self, new_error_estimates):
         """
         Does nothing for this type of sample set.
@@ -2682,6 +2985,13 @@ class discretization(object):
                 nval = nval.take(outputs, axis=1)
                 nval = nval.take(inputs, axis=2)
                 setattr(input_ss, obj, nval)
+        for obj in ['_hessians', '_hessians_local']:
+            val = getattr(self._input_sample_set, obj)
+            if val is not None:
+                nval = val.take(outputs, axis=1)
+                nval = nval.take(inputs, axis=2)
+                nval = nval.take(inputs, axis=3)
+                setattr(input_ss, obj, nval)
         disc = discretization(input_sample_set=input_ss,
                               output_sample_set=output_ss)
         return disc
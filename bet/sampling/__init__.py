@@ -9,5 +9,20 @@ This subpackage contains
     specified set of parameter samples.
 * :class:`bet.sampling.adaptiveSampling` inherits from
     :class:`~bet.sampling.basicSampling` adaptively generates samples.
+* :mod:`~bet.sampling.modelEvaluators` provides serial and concurrent batched
+    evaluation of a model at a set of samples.
+* :mod:`~bet.sampling.modelCache` provides a persistent on-disk memoization
+    cache for model evaluations.
+* :mod:`~bet.sampling.externalModel` runs a model in a pool of persistent
+    external worker processes.
+* :mod:`~bet.sampling.latinHypercube` generates the local part of a
+    distributed Latin hypercube design.
+* :mod:`~bet.sampling.randomStreams` provides reproducible counter-based
+    random number streams that do not depend on the number of processors.
+* :mod:`~bet.sampling.quasiMonteCarlo` generates the local part of
+    distributed scrambled Sobol and Halton sequences.
 """
-__all__ = ['basicSampling', 'adaptiveSampling', 'LpGeneralizedSamples']
+__all__ = ['basicSampling', 'adaptiveSampling', 'LpGeneralizedSamples',
+        'modelEvaluators', 'modelCache',
+        'externalModel', 'latinHypercube', 'quasiMonteCarlo',
+        'randomStreams']
@@ -12,9 +12,11 @@ coordinate pairing. We assume the measure of both spaces is Lebesgue.
 We employ an approach based on using multiple sample chains.
 """
 
-import math, os, glob, logging
+import math, os, glob, logging, copy, Queue
 import numpy as np
 import scipy.io as sio
+import scipy.spatial as spatial
+from multiprocessing.pool import ThreadPool
 import bet.sampling.basicSampling as bsam
 import bet.util as util
 from bet.Comm import comm 
@@ -190,7 +192,7 @@ class sampler(bsam.sampler):
     provide samples to be used by algorithms to solve inverse problems. 
     
     """
-    def __init__(self, num_samples, chain_length, lb_model):
+    def __init__(self, num_samples, chain_length, lb_model, evaluator=None):
         """
         
         Initialization
@@ -199,9 +201,13 @@ class sampler(bsam.sampler):
         :param int chain_length: number of batches of samples
         :param callable lb_model: runs the model at a given set of parameter
             samples, (N, ndim), and returns data (N, mdim)
+        :param evaluator: Evaluates ``lb_model`` in (possibly concurrent)
+            batches, defaults to a single serial batch
+        :type evaluator: :class:`~bet.sampling.modelEvaluators.evaluator`
         
         """
-        super(sampler, self).__init__(lb_model, num_samples)
+        super(sampler, self).__init__(lb_model, num_samples,
+                evaluator=evaluator)
         #: number of batches of samples
         self.chain_length = chain_length
         #: number of samples per processor per batch (either a single int or a
@@ -231,8 +237,108 @@ class sampler(bsam.sampler):
         mdict['num_chains'] = self.num_chains
         mdict['sample_batch_no'] = self.sample_batch_no
         
+    def create_initial_discretization(self, input_obj, savefile,
+            initial_sample_type="lhs", criterion='center'):
+        """
+        Creates and evaluates the initial batch of ``num_chains`` samples for
+        :meth:`~bet.sampling.adaptiveSampling.sampler.generalized_chains`.
+        The returned discretization only has local values and may be shared
+        by several calls to
+        :meth:`~bet.sampling.adaptiveSampling.sampler.generalized_chains`.
+
+        :param input_obj: Either a :class:`bet.sample.sample_set` object for an
+            input space, an array of min and max bounds for the input values
+            with ``min = input_domain[:, 0]`` and ``max = input_domain[:, 1]``,
+            or the dimension of an input space
+        :type input_obj: :class:`~bet.sample.sample_set`,
+            :class:`numpy.ndarray` of shape (ndim, 2), or :class: `int`
+        :param string savefile: filename to save samples and data
+        :param string initial_sample_type: type of initial sample random (or r),
+            latin hypercube(lhs), or space-filling curve(TBD)
+        :param string criterion: latin hypercube criterion see
+            :mod:`~bet.sampling.latinHypercube`
+
+        :rtype: :class:`~bet.sample.discretization`
+        :returns: discretization of the initial batch of samples
+
+        """
+        return super(sampler, self).create_random_discretization(
+                initial_sample_type, input_obj, savefile, self.num_chains,
+                criterion, globalize=False)
+
+    def run_members(self, members, input_domain, savefile,
+            initial_sample_type="lhs", criterion='center',
+            shared_initial=False, num_workers=None):
+        """
+        Runs :meth:`~bet.sampling.adaptiveSampling.sampler.generalized_chains`
+        for each (transition set, kernel) pair in ``members``.
+
+        If ``shared_initial`` the initial batch of samples is evaluated once
+        and shared by all of the members. If ``num_workers > 1`` the members
+        are run concurrently by a pool of threads (this is useful when the
+        model runs outside of the interpreter, e.g.
+        :class:`~bet.sampling.externalModel.external_model`). Each concurrent
+        member saves to its own file, ``savefile`` with ``_member{i}``
+        appended to the file name, and uses its own copy of the kernel.
+        Members use collective communication so they are only run
+        concurrently in serial, in parallel they are run one after another.
+
+        :param list members: list of tuples of
+            (:class:`~bet.sampling.adaptiveSampling.transition_set`,
+            :class:`~bet.sampling.adaptiveSampling.kernel`)
+        :param input_domain: min, max value for each input dimension
+        :type input_domain: :class:`numpy.ndarray` (ndim, 2)
+        :param string savefile: filename to save samples and data
+        :param string initial_sample_type: type of initial sample random (or r),
+            latin hypercube(lhs), or space-filling curve(TBD)
+        :param string criterion: latin hypercube criterion see
+            :mod:`~bet.sampling.latinHypercube`
+        :param bool shared_initial: Flag whether or not to share the initial
+            batch of samples among the members
+        :param int num_workers: number of members to run concurrently
+
+        :rtype: list
+        :returns: list of (``discretization``, ``all_step_ratios``) for each
+            member, see
+            :meth:`~bet.sampling.adaptiveSampling.sampler.generalized_chains`
+
+        """
+        initial_disc = None
+        if shared_initial:
+            initial_disc = self.create_initial_discretization(input_domain,
+                    savefile, initial_sample_type, criterion)
+            self.num_samples = self.chain_length * self.num_chains
+        concurrent = num_workers is not None and num_workers > 1 and \
+                len(members) > 1 and comm.size == 1
+
+        def run_member(i):
+            (t_set, kern) = members[i]
+            member_sampler = self
+            member_savefile = savefile
+            if concurrent:
+                # generalized_chains updates the state of the sampler, the
+                # transition set, and the kernel
+                member_sampler = copy.copy(self)
+                t_set = copy.deepcopy(t_set)
+                kern = copy.deepcopy(kern)
+                (root, ext) = os.path.splitext(savefile)
+                member_savefile = "{}_member{}{}".format(root, i, ext)
+            return member_sampler.generalized_chains(input_domain, t_set,
+                    kern, member_savefile, initial_sample_type, criterion,
+                    initial_discretization=initial_disc)
+
+        if not concurrent:
+            return [run_member(i) for i in xrange(len(members))]
+        pool = ThreadPool(min(num_workers, len(members)))
+        try:
+            return pool.map(run_member, range(len(members)))
+        finally:
+            pool.close()
+            pool.join()
+
     def run_gen(self, kern_list, rho_D, maximum, input_domain,
-            t_set, savefile, initial_sample_type="lhs", criterion='center'):
+            t_set, savefile, initial_sample_type="lhs", criterion='center',
+            shared_initial=False, num_workers=None):
         """
         Generates samples using generalized chains and a list of different
         kernels.
@@ -251,8 +357,12 @@ class sampler(bsam.sampler):
         :param string savefile: filename to save samples and data
         :param string initial_sample_type: type of initial sample random (or r),
             latin hypercube(lhs), or space-filling curve(TBD)
-        :param string criterion: latin hypercube criterion see 
-            `PyDOE <http://pythonhosted.org/pyDOE/randomized.html>`_
+        :param string criterion: latin hypercube criterion see
+            :mod:`~bet.sampling.latinHypercube`
+        :param bool shared_initial: Flag whether or not to evaluate the
+            initial batch of samples once and share it among the sweep
+        :param int num_workers: number of sweep members to run concurrently,
+            see :meth:`~bet.sampling.adaptiveSampling.sampler.run_members`
         
         :rtype: tuple
         :returns: (discretization, , num_high_prob_samples,
@@ -264,10 +374,10 @@ class sampler(bsam.sampler):
         r_step_size = list()
         results_rD = list()
         mean_ss = list()
-        for kern in kern_list:
-            (discretization, step_sizes) = self.generalized_chains(
-                    input_domain, t_set, kern, savefile,
-                    initial_sample_type, criterion)
+        members = [(t_set, kern) for kern in kern_list]
+        for (discretization, step_sizes) in self.run_members(members,
+                input_domain, savefile, initial_sample_type, criterion,
+                shared_initial, num_workers):
             results.append(discretization)
             r_step_size.append(step_sizes)
             results_rD.append(int(sum(rho_D(discretization._output_sample_set.\
@@ -278,7 +388,8 @@ class sampler(bsam.sampler):
 
     def run_tk(self, init_ratio, min_ratio, max_ratio, rho_D, maximum,
             input_domain, kernel, savefile,
-            initial_sample_type="lhs", criterion='center'):
+            initial_sample_type="lhs", criterion='center',
+            shared_initial=False, num_workers=None):
         """
         Generates samples using generalized chains and
         :class:`~bet.sampling.transition_set` created using
@@ -302,8 +413,12 @@ class sampler(bsam.sampler):
         :param string savefile: filename to save samples and data
         :param string initial_sample_type: type of initial sample random (or r),
             latin hypercube(lhs), or space-filling curve(TBD)
-        :param string criterion: latin hypercube criterion see 
-            `PyDOE <http://pythonhosted.org/pyDOE/randomized.html>`_
+        :param string criterion: latin hypercube criterion see
+            :mod:`~bet.sampling.latinHypercube`
+        :param bool shared_initial: Flag whether or not to evaluate the
+            initial batch of samples once and share it among the sweep
+        :param int num_workers: number of sweep members to run concurrently,
+            see :meth:`~bet.sampling.adaptiveSampling.sampler.run_members`
         
         :rtype: tuple
         :returns: (discretization, , num_high_prob_samples,
@@ -314,11 +429,11 @@ class sampler(bsam.sampler):
         r_step_size = list()
         results_rD = list()
         mean_ss = list()
-        for i, j, k  in zip(init_ratio, min_ratio, max_ratio):
-            ts = transition_set(i, j, k)
-            (discretization, step_sizes) = self.generalized_chains(
-                   input_domain, ts, kernel, savefile,
-                    initial_sample_type, criterion)
+        members = [(transition_set(i, j, k), kernel) for i, j, k in
+                zip(init_ratio, min_ratio, max_ratio)]
+        for (discretization, step_sizes) in self.run_members(members,
+                input_domain, savefile, initial_sample_type, criterion,
+                shared_initial, num_workers):
             results.append(discretization)
             r_step_size.append(step_sizes)
             results_rD.append(int(sum(rho_D(discretization._output_sample_set.\
@@ -329,7 +444,8 @@ class sampler(bsam.sampler):
 
     def run_inc_dec(self, increase, decrease, tolerance, rho_D, maximum,
             input_domain, t_set, savefile,
-            initial_sample_type="lhs", criterion='center'):
+            initial_sample_type="lhs", criterion='center',
+            shared_initial=False, num_workers=None):
         """
         Generates samples using generalized chains and
         :class:`~bet.sampling.adaptiveSampling.rhoD_kernel` created using
@@ -351,8 +467,12 @@ class sampler(bsam.sampler):
         :param string savefile: filename to save samples and data
         :param string initial_sample_type: type of initial sample random (or r),
             latin hypercube(lhs), or space-filling curve(TBD)
-        :param string criterion: latin hypercube criterion see 
-            `PyDOE <http://pythonhosted.org/pyDOE/randomized.html>`_
+        :param string criterion: latin hypercube criterion see
+            :mod:`~bet.sampling.latinHypercube`
+        :param bool shared_initial: Flag whether or not to evaluate the
+            initial batch of samples once and share it among the sweep
+        :param int num_workers: number of sweep members to run concurrently,
+            see :meth:`~bet.sampling.adaptiveSampling.sampler.run_members`
         
         :rtype: tuple
         :returns: (discretization, , num_high_prob_samples,
@@ -363,11 +483,12 @@ class sampler(bsam.sampler):
         for i, j, z in zip(increase, decrease, tolerance):
             kern_list.append(rhoD_kernel(maximum, rho_D, i, j, z)) 
         return self.run_gen(kern_list, rho_D, maximum, input_domain,
-                t_set, savefile, initial_sample_type, criterion)
+                t_set, savefile, initial_sample_type, criterion,
+                shared_initial, num_workers)
 
     def generalized_chains(self, input_obj, t_set, kern,
             savefile, initial_sample_type="random", criterion='center',
-            hot_start=0): 
+            hot_start=0, initial_discretization=None, budget=None): 
         """
         Basic adaptive sampling algorithm using generalized chains.
 
@@ -395,14 +516,23 @@ class sampler(bsam.sampler):
             be the same, but ``num_chains_pproc`` need not be the same. 0 -
             cold start, 1 - hot start from uncompleted run, 2 - hot
             start from finished run
-        :param string criterion: latin hypercube criterion see 
-            `PyDOE <http://pythonhosted.org/pyDOE/randomized.html>`_
+        :param string criterion: latin hypercube criterion see
+            :mod:`~bet.sampling.latinHypercube`
+        :param initial_discretization: previously evaluated initial batch of
+            samples (see :meth:`create_initial_discretization`), if ``None``
+            a new initial batch is created
+        :type initial_discretization: :class:`~bet.sample.discretization`
+        :param budget: retires unproductive chains and stops the chains early
+            once enough samples of high probability have been found, if
+            ``None`` all chains run for ``chain_length`` batches
+        :type budget: :class:`~bet.sampling.adaptiveSampling.chain_budget`
         
         :rtype: tuple
         :returns: (``discretization``, ``all_step_ratios``) where
             ``discretization`` is a :class:`~bet.sample.discretization` object
             containing ``num_samples``  and  ``all_step_ratios`` is np.ndarray
-            of shape ``(num_chains, chain_length)``
+            of shape ``(num_chains, chain_length)`` (fewer batches if
+            ``budget`` stops the chains early)
         
         """
 
@@ -417,9 +547,11 @@ class sampler(bsam.sampler):
             # Initiative first batch of N samples (maybe taken from latin
             # hypercube/space-filling curve to fully explore parameter space -
             # not necessarily random). Call these Samples_old.
-            disc_old = super(sampler, self).create_random_discretization(
-                    initial_sample_type, input_obj, savefile,
-                    self.num_chains, criterion, globalize=False)
+            if initial_discretization is None:
+                disc_old = self.create_initial_discretization(input_obj,
+                        savefile, initial_sample_type, criterion)
+            else:
+                disc_old = initial_discretization
             self.num_samples = self.chain_length * self.num_chains
             comm.Barrier()
             
@@ -433,6 +565,8 @@ class sampler(bsam.sampler):
 
             (kern_old, proposal) = kern.delta_step(disc_old.\
                     _output_sample_set.get_values_local(), None)
+            if kern_old is None:
+                kern_old = np.zeros((self.num_chains_pproc,))
 
             start_ind = 1
 
@@ -457,6 +591,8 @@ class sampler(bsam.sampler):
         mdat = dict()
         self.update_mdict(mdat)
         input_old.update_bounds_local()
+        if budget is not None:
+            budget.reset(step_ratio.shape[0])
 
         for batch in xrange(start_ind, self.chain_length):
             # For each of N samples_old, create N new parameter samples using
@@ -464,7 +600,8 @@ class sampler(bsam.sampler):
             input_new = t_set.step(step_ratio, input_old)
         
             # Solve the model for the input_new.
-            output_new_values = self.lb_model(input_new.get_values_local())
+            output_new_values = self.evaluator.evaluate(self.lb_model,
+                    input_new.get_values_local())
             
             # Make some decision about changing step_size(k).  There are
             # multiple ways to do this.
@@ -492,6 +629,47 @@ class sampler(bsam.sampler):
             super(sampler, self).save(mdat, savefile, disc, globalize=False)
             input_old = input_new
 
+            if budget is not None:
+                (retired, sources, stop) = budget.update(output_new_values,
+                        step_ratio, min_ratio)
+                if stop:
+                    self.num_samples = (batch+1) * self.num_chains
+                    self.update_mdict(mdat)
+                    mdat['sample_batch_no'] = np.repeat(range(\
+                            self.num_chains), batch+1, 0)
+                    break
+                if len(retired) > 0:
+                    # respawn the retired chains at productive chains
+                    input_old = input_new.copy()
+                    values_old = input_old.get_values_local()
+                    values_old[retired] = values_old[sources]
+                    step_ratio[retired] = t_set.init_ratio
+                    kern_old[retired] = kern_old[sources]
+
+        return self.collect_chains(disc, all_step_ratios, kern_old, mdat,
+                savefile)
+
+    def collect_chains(self, disc, all_step_ratios, kern_old, mdat,
+            savefile):
+        """
+        Collects and saves the results of running the chains.
+
+        :param disc: local samples ordered by batch
+        :type disc: :class:`~bet.sample.discretization`
+        :param all_step_ratios: local step ratios ordered by batch
+        :type all_step_ratios: :class:`numpy.ndarray` of shape
+            (num_chains_pproc*chain_length,)
+        :param kern_old: kernel evaluated at the last step of each local chain
+        :type kern_old: :class:`numpy.ndarray` of shape (num_chains_pproc,)
+        :param dict mdat: dictonary of sampler parameters
+        :param string savefile: filename to save samples and data
+
+        :rtype: tuple
+        :returns: (``discretization``, ``all_step_ratios``) where
+            ``all_step_ratios`` is np.ndarray of shape ``(num_chains,
+            chain_length)``
+
+        """
         # collect everything
         disc._input_sample_set.update_bounds_local() 
         #disc._input_sample_set.local_to_global()
@@ -503,7 +681,7 @@ class sampler(bsam.sampler):
         all_step_ratios = util.get_global_values(MYall_step_ratios,
                 shape=(self.num_samples,))
         all_step_ratios = np.reshape(all_step_ratios, (self.num_chains,
-            self.chain_length), 'F')
+            self.num_samples/self.num_chains), 'F')
 
         # save everything
         mdat['step_ratios'] = all_step_ratios
@@ -512,6 +690,162 @@ class sampler(bsam.sampler):
         super(sampler, self).save(mdat, savefile, disc, globalize=True)
 
         return (disc, all_step_ratios)
+
+    def asynchronous_chains(self, input_obj, t_set, kern, savefile,
+            initial_sample_type="random", criterion='center',
+            num_workers=None, initial_discretization=None):
+        """
+        Adaptive sampling algorithm using generalized chains where each chain
+        advances as soon as the model evaluation of its previous sample
+        completes rather than in lockstep with the other chains (see
+        :meth:`~bet.sampling.adaptiveSampling.sampler.generalized_chains`).
+        The model is evaluated one sample at a time by a pool of
+        ``num_workers`` threads, so ``lb_model`` must be thread safe. This is
+        useful when the model runs outside of the interpreter (e.g.
+        :class:`~bet.sampling.externalModel.external_model`) and the run time
+        varies between samples. The step ratio and the kernel are updated
+        per chain using all of the chains whose evaluations have completed.
+        The results are intermediately saved only at the end.
+
+        :param input_obj: Either a :class:`bet.sample.sample_set` object for an
+            input space, an array of min and max bounds for the input values
+            with ``min = input_domain[:, 0]`` and ``max = input_domain[:, 1]``,
+            or the dimension of an input space
+        :type input_obj: :class:`~bet.sample.sample_set`,
+            :class:`numpy.ndarray` of shape (ndim, 2), or :class: `int`
+        :param t_set: method for creating new parameter steps using
+            given a step size based on the paramter domain size
+        :type t_set: :class:`bet.sampling.adaptiveSampling.transition_set`
+        :param kern: functional that acts on the data used to
+            determine the proposed change to the ``step_size``
+        :type kernel: :class:~`bet.sampling.adaptiveSampling.kernel` object.
+        :param string savefile: filename to save samples and data
+        :param string initial_sample_type: type of initial sample random (or r),
+            latin hypercube(lhs), or space-filling curve(TBD)
+        :param string criterion: latin hypercube criterion see
+            :mod:`~bet.sampling.latinHypercube`
+        :param int num_workers: number of concurrent model evaluations,
+            defaults to ``num_chains_pproc``
+        :param initial_discretization: previously evaluated initial batch of
+            samples (see :meth:`create_initial_discretization`), if ``None``
+            a new initial batch is created
+        :type initial_discretization: :class:`~bet.sample.discretization`
+
+        :rtype: tuple
+        :returns: (``discretization``, ``all_step_ratios``) where
+            ``discretization`` is a :class:`~bet.sample.discretization` object
+            containing ``num_samples``  and  ``all_step_ratios`` is np.ndarray
+            of shape ``(num_chains, chain_length)``
+
+        """
+        max_ratio = t_set.max_ratio
+        min_ratio = t_set.min_ratio
+
+        if initial_discretization is None:
+            disc_old = self.create_initial_discretization(input_obj,
+                    savefile, initial_sample_type, criterion)
+        else:
+            disc_old = initial_discretization
+        self.num_samples = self.chain_length * self.num_chains
+
+        input_old = disc_old._input_sample_set
+        output_old = disc_old._output_sample_set.get_values_local()
+        num_local = input_old.get_values_local().shape[0]
+        (kern_old, _) = kern.delta_step(output_old, None)
+        if kern_old is None:
+            kern_old = np.zeros((num_local,))
+        step_ratio = t_set.init_ratio*np.ones(num_local)
+
+        # samples, data, and step ratios of each local chain by batch
+        all_inputs = np.empty((self.chain_length, num_local,
+            input_old.get_dim()))
+        all_outputs = np.empty((self.chain_length,)+output_old.shape)
+        all_step_ratios = np.empty((self.chain_length, num_local))
+        all_inputs[0] = input_old.get_values_local()
+        all_outputs[0] = output_old
+        all_step_ratios[0] = step_ratio
+        # next batch of each local chain
+        chain_batch = np.ones((num_local,), dtype=np.int)
+
+        def step(chains):
+            """
+            Creates the next sample of each chain in ``chains``.
+            """
+            input_chains = sample.sample_set(input_old.get_dim())
+            input_chains.set_domain(input_old.get_domain())
+            input_chains.set_values_local(all_inputs[chain_batch[chains]-1,
+                chains])
+            input_chains.update_bounds_local()
+            return np.copy(t_set.step(step_ratio[chains], input_chains).\
+                    get_values_local())
+
+        completed = Queue.Queue()
+        def evaluate(chain, values):
+            """
+            Evaluates the model at the next sample of ``chain``.
+            """
+            try:
+                completed.put((chain, values, self.lb_model(values), None))
+            except Exception as exc:
+                completed.put((chain, values, None, exc))
+
+        if num_workers is None:
+            num_workers = num_local
+        pool = ThreadPool(max(1, num_workers))
+        num_pending = 0
+        try:
+            ready = np.arange(num_local)[chain_batch < self.chain_length]
+            while True:
+                if len(ready) > 0:
+                    for chain, values in zip(ready, step(ready)):
+                        pool.apply_async(evaluate, (chain,
+                            values[np.newaxis, :]))
+                        num_pending += 1
+                if num_pending == 0:
+                    break
+                # wait for at least one evaluation and take all completed
+                done = [completed.get()]
+                while True:
+                    try:
+                        done.append(completed.get_nowait())
+                    except Queue.Empty:
+                        break
+                num_pending -= len(done)
+                for (_, _, _, exc) in done:
+                    if exc is not None:
+                        raise exc
+                chains = np.array([d[0] for d in done])
+                output_new = np.vstack([np.reshape(d[2], (1, -1)) for d in
+                    done])
+                (kern_new, proposal) = kern.delta_step(output_new,
+                        kern_old[chains])
+                kern_old[chains] = kern_new
+                step_ratio[chains] = proposal*step_ratio[chains]
+                # Is the ratio greater than max?
+                step_ratio[step_ratio > max_ratio] = max_ratio
+                # Is the ratio less than min?
+                step_ratio[step_ratio < min_ratio] = min_ratio
+                batch = chain_batch[chains]
+                all_inputs[batch, chains] = np.vstack([d[1] for d in done])
+                all_outputs[batch, chains] = np.reshape(output_new,
+                        (len(done),)+output_old.shape[1:])
+                all_step_ratios[batch, chains] = step_ratio[chains]
+                chain_batch[chains] += 1
+                ready = chains[chain_batch[chains] < self.chain_length]
+        finally:
+            pool.close()
+            pool.join()
+
+        # use the same layout as generalized_chains
+        disc = disc_old.copy()
+        disc._input_sample_set.set_values_local(np.reshape(all_inputs, (-1,
+            input_old.get_dim())))
+        disc._output_sample_set.set_values_local(np.reshape(all_outputs,
+            (-1,)+output_old.shape[1:]))
+        mdat = dict()
+        self.update_mdict(mdat)
+        return self.collect_chains(disc, np.ravel(all_step_ratios), kern_old,
+                mdat, savefile)
         
 def kernels(Q_ref, rho_D, maximum):
     """
@@ -560,45 +894,180 @@ class transition_set(object):
         self.min_ratio = min_ratio
         #: float, maximum step_ratio
         self.max_ratio = max_ratio
+        # preallocated (left, right, values, values) buffers for step
+        self._buffers = None
+        self._next_values = 2
     
     def step(self, step_ratio, input_old): 
         """
         Generate ``num_samples`` new steps using ``step_ratio`` and
         ``input_width`` to calculate the ``step size``. Each step will have a
         random direction.
+
+        The new samples are written into buffers that are preallocated for
+        the number of samples and reused, and the returned sample set shares
+        the domain, bounds, and all other attributes (except the local
+        values) with ``input_old`` rather than copying them. The local values
+        of the returned sample set are overwritten by the step after next, so
+        copy them if they need to be kept longer.
         
         :param step_ratio: define maximum step_size = ``step_ratio*input_width``
         :type step_ratio: :class:`numpy.ndarray` of shape (num_samples,)
         :param input_old: Input from the previous step.
-        :type input_old: :class:`~numpy.ndarray` of shape (num_samples,
-            ndim)
+        :type input_old: :class:`~bet.sample.sample_set` with
+            ``num_samples`` local samples
         
-        :rtype: :class:`numpy.ndarray` of shape (num_samples, ndim)
+        :rtype: :class:`~bet.sample.sample_set`
         :returns: input_new
         
         """
-        # calculate maximum step size
-        step_size = np.repeat([step_ratio], input_old.get_dim(),
-                0).transpose()*input_old._width_local
-        # check to see if step will take you out of parameter space
+        values_old = input_old.get_values_local()
+        if self._buffers is None or self._buffers[0].shape != \
+                values_old.shape:
+            self._buffers = [np.empty(values_old.shape) for _ in xrange(4)]
+        (my_left, my_right) = self._buffers[:2]
+        # calculate half of the maximum step size
+        np.multiply(step_ratio[:, np.newaxis], input_old._width_local,
+                out=my_right)
+        my_right *= 0.5
         # calculate maximum proposed step
-        my_right = input_old.get_values_local() + 0.5*step_size
-        my_left = input_old.get_values_local() - 0.5*step_size
-        # Is the new sample greaters than the right limit?
-        far_right = my_right >= input_old._right_local
-        far_left = my_left <= input_old._left_local
+        np.subtract(values_old, my_right, out=my_left)
+        np.add(values_old, my_right, out=my_right)
         # If the input could leave the domain then truncate the box defining
         # the step_size
-        my_right[far_right] = input_old._right_local[far_right]
-        my_left[far_left] = input_old._left_local[far_left]
-        my_width = my_right-my_left
-        #input_center = (input_right+input_left)/2.0
-        input_new_values = my_width * np.random.random(input_old.shape_local())
-        input_new_values = input_new_values + my_left
-        input_new = input_old.copy()
-        input_new.set_values_local(input_new_values)
+        np.maximum(my_left, input_old._left_local, out=my_left)
+        np.minimum(my_right, input_old._right_local, out=my_right)
+        my_width = my_right
+        my_width -= my_left
+        # alternate between the value buffers so that the values of
+        # input_old are not overwritten
+        self._next_values = 5 - self._next_values
+        input_new_values = self._buffers[self._next_values]
+        np.multiply(my_width, np.random.random(values_old.shape),
+                out=input_new_values)
+        input_new_values += my_left
+
+        input_new = type(input_old)(input_old.get_dim())
+        for name in input_old.all_ndarray_names + input_old.vector_names:
+            setattr(input_new, name, getattr(input_old, name))
+        input_new._values_local = input_new_values
         return input_new
 
+class chain_budget(object):
+    """
+    Monitors the chains in
+    :meth:`~bet.sampling.adaptiveSampling.sampler.generalized_chains` so that
+    a fixed number of model evaluations goes further. A chain is retired if
+    none of its last ``patience`` samples had a non-negligible probability
+    (it is stuck in a region of zero probability) or, optionally, if its step
+    ratio has been at the minimum for ``patience`` batches (it keeps
+    resampling the same small region of high probability). A retired chain is
+    respawned at the current sample of a randomly chosen productive chain on
+    the same processor (one whose latest sample had a non-negligible
+    probability) with the initial step ratio. The chains are stopped early
+    once ``target`` samples of non-negligible probability have been found.
+
+    """
+
+    def __init__(self, rho_D, maximum, target=None, patience=5,
+            retire_collapsed=False, tolerance=1E-08):
+        """
+        Initialization
+
+        :param rho_D: probability density on D
+        :type rho_D: callable function that takes a :class:`numpy.ndarray` and
+            returns a :class:`numpy.ndarray`
+        :param float maximum: maximum value of rho_D
+        :param int target: number of samples of high probability after which
+            the chains are stopped, if ``None`` the chains are not stopped
+            early
+        :param int patience: number of batches after which an unproductive
+            chain is retired
+        :param bool retire_collapsed: Flag whether or not to retire chains
+            whose step ratio has been at the minimum for ``patience`` batches
+        :param float tolerance: Tolerance for comparing rho_D/maximum to zero
+
+        """
+        #: float, Tolerance for comparing two values
+        self.TOL = tolerance
+        #: float, maximum value of rho_D
+        self.MAX = maximum
+        #: callable function, probability density on D
+        self.rho_D = rho_D
+        #: int, number of samples of high probability to stop at
+        self.target = target
+        #: int, number of batches after which an unproductive chain is retired
+        self.patience = patience
+        #: bool, flag whether or not to retire collapsed chains
+        self.retire_collapsed = retire_collapsed
+        self.reset(0)
+
+    def reset(self, num_chains_pproc):
+        """
+        Resets the statistics of the chains.
+
+        :param int num_chains_pproc: number of chains on this processor
+
+        """
+        #: number of samples of high probability of each local chain
+        self.hits = np.zeros((num_chains_pproc,), dtype=np.int)
+        #: number of consecutive batches without a sample of high probability
+        #: of each local chain
+        self.misses_in_row = np.zeros((num_chains_pproc,), dtype=np.int)
+        #: number of consecutive batches at the minimum step ratio of each
+        #: local chain
+        self.collapsed_in_row = np.zeros((num_chains_pproc,), dtype=np.int)
+        #: total number of samples of high probability on all processors
+        self.num_high_prob = 0
+        #: number of chains respawned on this processor
+        self.num_respawned = 0
+
+    def update(self, output_new, step_ratio, min_ratio):
+        """
+        Updates the statistics of the chains with a new batch of samples and
+        determines which chains to retire and whether or not to stop. This
+        must be called by all processors.
+
+        :param output_new: QoI for a given batch of samples 
+        :type output_new: :class:`numpy.ndarray` of shape (num_chains, mdim)
+        :param step_ratio: current step ratio of each chain
+        :type step_ratio: :class:`numpy.ndarray` of shape (num_chains,)
+        :param float min_ratio: minimum step ratio
+
+        :rtype: tuple
+        :returns: (retired, sources, stop) where ``retired`` are the indices
+            of the chains to respawn at the current samples of the chains
+            ``sources`` and ``stop`` is a flag whether or not to stop
+
+        """
+        in_region = self.rho_D(output_new)/self.MAX > self.TOL
+        self.hits += in_region
+        self.misses_in_row[in_region] = 0
+        self.misses_in_row[np.logical_not(in_region)] += 1
+        collapsed = np.isclose(step_ratio, min_ratio)
+        self.collapsed_in_row[collapsed] += 1
+        self.collapsed_in_row[np.logical_not(collapsed)] = 0
+
+        self.num_high_prob = comm.allreduce(int(np.sum(self.hits)))
+        if self.target is not None and self.num_high_prob >= self.target:
+            return (np.array([], dtype=np.int), np.array([], dtype=np.int),
+                    True)
+
+        retire = self.misses_in_row >= self.patience
+        if self.retire_collapsed:
+            retire = np.logical_or(retire, self.collapsed_in_row >=
+                    self.patience)
+        productive = np.logical_and(in_region, np.logical_not(retire))
+        if not np.any(productive):
+            return (np.array([], dtype=np.int), np.array([], dtype=np.int),
+                    False)
+        retired = np.nonzero(retire)[0]
+        sources = np.random.choice(np.nonzero(productive)[0], len(retired))
+        self.misses_in_row[retired] = 0
+        self.collapsed_in_row[retired] = 0
+        self.num_respawned += len(retired)
+        return (retired, sources, False)
+
 class kernel(object):
     """
     Parent class for kernels to determine change in step size. This class
@@ -719,6 +1188,12 @@ class maxima_kernel(kernel):
 
     """
 
+    #: maximum number of entries in a temporary block of distances
+    block_size = 2**20
+    #: minimum number of maxima for which a KD-tree is used (if ``rho_max`` is
+    #: constant)
+    kdtree_threshold = 1000
+
     def __init__(self, maxima, rho_D, tolerance=1E-08, increase=2.0, 
             decrease=0.5):
         """
@@ -743,6 +1218,39 @@ class maxima_kernel(kernel):
         super(maxima_kernel, self).__init__(tolerance, increase, decrease)
         #: bool, flag sort order
         self.sort_ascending = True
+        self._kdtree = None
+
+    def weighted_distance(self, output_new):
+        """
+        Calculates the minimum over the maxima of the distance from each
+        sample in ``output_new`` to the maxima weighted by 1/rho_D(maxima).
+        The distances are computed in blocks of at most ``self.block_size``
+        entries. If ``rho_max`` is constant and there are at least
+        ``self.kdtree_threshold`` maxima a KD-tree on the maxima is used.
+
+        :param output_new: QoI for a given batch of samples 
+        :type output_new: :class:`numpy.ndarray` of shape (num_chains, mdim)
+
+        :rtype: :class:`numpy.ndarray` of shape (num_chains,)
+        :returns: weighted distance to the nearest maxima
+
+        """
+        output_new = output_new.reshape((output_new.shape[0], -1))
+        maxima = self.MAXIMA.reshape((self.num_maxima, -1))
+        rho_max = np.ravel(self.rho_max).astype(np.float)
+        if self.num_maxima >= self.kdtree_threshold and \
+                np.all(rho_max == rho_max[0]):
+            if self._kdtree is None:
+                self._kdtree = spatial.cKDTree(maxima)
+            return self._kdtree.query(output_new)[0]/rho_max[0]
+        kern_new = np.empty((output_new.shape[0],))
+        num_rows = max(1, self.block_size/max(1, self.num_maxima))
+        for start in xrange(0, output_new.shape[0], num_rows):
+            block = output_new[start:start+num_rows]
+            # weight distances by 1/rho_D(maxima)
+            kern_new[start:start+num_rows] = np.min(spatial.distance.cdist(
+                block, maxima)/rho_max, 1)
+        return kern_new
 
     def delta_step(self, output_new, kern_old=None):
         """
@@ -756,18 +1264,10 @@ class maxima_kernel(kernel):
         :returns: (kern_new, proposal)
         
         """
-        # Evaluate kernel for new data.
-        kern_new = np.zeros((output_new.shape[0]))
+        # Evaluate kernel for new data, the minimum of weighted distances
+        # from the maxima
+        kern_new = self.weighted_distance(output_new)
 
-        for i in xrange(output_new.shape[0]):
-            # calculate distance from each of the maxima
-            vec_from_maxima = np.repeat([output_new[i, :]], self.num_maxima, 0)
-            vec_from_maxima = vec_from_maxima - self.MAXIMA
-            # weight distances by 1/rho_D(maxima)
-            dist_from_maxima = np.linalg.norm(vec_from_maxima, 2,
-                1)/self.rho_max
-            # set kern_new to be the minimum of weighted distances from maxima
-            kern_new[i] = np.min(dist_from_maxima)
         
         if kern_old is None:
             return (kern_new, None)
@@ -846,19 +1346,11 @@ class maxima_mean_kernel(maxima_kernel):
         :returns: (kern_new, proposal)
         
         """
-        # Evaluate kernel for new data.
-        kern_new = np.zeros((output_new.shape[0]))
+        # Evaluate kernel for new data, the minimum of weighted distances
+        # from the maxima
+        kern_new = self.weighted_distance(output_new)
         self.current_clength = self.current_clength + 1
 
-        for i in xrange(output_new.shape[0]):
-            # calculate distance from each of the maxima
-            vec_from_maxima = np.repeat([output_new[i, :]], self.num_maxima, 0)
-            vec_from_maxima = vec_from_maxima - self.MAXIMA
-            # weight distances by 1/rho_D(maxima)
-            dist_from_maxima = np.linalg.norm(vec_from_maxima, 2,
-                1)/self.rho_max
-            # set kern_new to be the minimum of weighted distances from maxima
-            kern_new[i] = np.min(dist_from_maxima)
         if kern_old is None:
             # calculate the mean
             self.mean = np.mean(output_new, 0)
@@ -16,9 +16,11 @@ import warnings
 import glob
 import numpy as np
 import scipy.io as sio
-from pyDOE import lhs
 from bet.Comm import comm
 import bet.sample as sample
+import bet.sampling.modelEvaluators as mev
+import bet.sampling.latinHypercube as lhc
+import bet.sampling.quasiMonteCarlo as qmc
 
 class bad_object(Exception):
     """
@@ -59,20 +61,23 @@ def loadmat(save_file, disc_name=None, model=None):
     return (loaded_sampler, discretization)
 
 def random_sample_set(sample_type, input_obj, num_samples,
-        criterion='center', globalize=True):
+        criterion='center', globalize=True, seed=None):
     """
     Sampling algorithm with three basic options
 
         * ``random`` (or ``r``) generates ``num_samples`` samples in
             ``lam_domain`` assuming a Lebesgue measure.
         * ``lhs`` generates a latin hyper cube of samples.
+        * ``sobol`` (or ``s``) and ``halton`` (or ``h``) generate scrambled
+            quasi-Monte Carlo points, see
+            :mod:`~bet.sampling.quasiMonteCarlo`.
 
     Note: This function is designed only for generalized rectangles and
     assumes a Lebesgue measure on the parameter space.
    
     :param string sample_type: type sampling random (or r),
-        latin hypercube(lhs), regular grid (rg), or space-filling
-        curve(TBD)
+        latin hypercube(lhs), Sobol (sobol or s), Halton (halton or h),
+        regular grid (rg), or space-filling curve(TBD)
     :param input_obj: :class:`~bet.sample.sample_set` object containing
         the dimension/domain to sample from, domain to sample from, or the
         dimension
@@ -80,10 +85,13 @@ def random_sample_set(sample_type, input_obj, num_samples,
         :class:`numpy.ndarray` of shape (dim, 2) or ``int``
     :param string savefile: filename to save discretization
     :param int num_samples: N, number of samples 
-    :param string criterion: latin hypercube criterion see 
-        `PyDOE <http://pythonhosted.org/pyDOE/randomized.html>`_
+    :param string criterion: latin hypercube criterion see
+        :mod:`~bet.sampling.latinHypercube`
     :param bool globalize: Makes local variables global. Only applies if
         ``parallel==True``.
+    :param int seed: shared seed, if given the samples do not depend on the
+        number of processors, if ``None`` the global :mod:`numpy.random`
+        generator is used
     
     :rtype: :class:`~bet.sample.sample_set`
     :returns: :class:`~bet.sample.sample_set` object which contains
@@ -110,15 +118,20 @@ def random_sample_set(sample_type, input_obj, num_samples,
         input_domain = np.array([[0., 1.]]*dim)
         input_sample_set.set_domain(input_domain)
      
-    if sample_type == "lhs":
+    if sample_type in ["lhs", "sobol", "s", "halton", "h"] or seed is not None:
+        # each processor generates only its slice of the global design
+        if sample_type == "lhs":
+            input_values_local = lhc.lhs_local(dim, num_samples, criterion,
+                    seed)
+        else:
+            input_values_local = qmc.uniform_local(dim, num_samples,
+                    sample_type, seed)
         # update the bounds based on the number of samples
-        input_sample_set.update_bounds(num_samples)
-        input_values = np.copy(input_sample_set._width)
-        input_values = input_values * lhs(dim,
-            num_samples, criterion)
-        input_values = input_values + input_sample_set._left
-        input_sample_set.set_values_local(np.array_split(input_values,
-            comm.size)[comm.rank])
+        input_sample_set.update_bounds_local(input_values_local.shape[0])
+        input_values_local = input_values_local * \
+                input_sample_set._width_local
+        input_values_local = input_values_local + input_sample_set._left_local
+        input_sample_set.set_values_local(input_values_local)
     elif sample_type == "random" or "r":
         # define local number of samples
         num_samples_local = int((num_samples/comm.size) + \
@@ -140,11 +153,16 @@ def random_sample_set(sample_type, input_obj, num_samples,
         input_sample_set._values = None
     return input_sample_set
 
-def regular_sample_set(input_obj, num_samples_per_dim=1):
+def regular_sample_set(input_obj, num_samples_per_dim=1, globalize=True):
     """
     Sampling algorithm for generating a regular grid of samples taken
     on the domain present with ``input_obj`` (a default unit hypercube
     is used if no domain has been specified)
+
+    Each processor only creates its own block of the grid (see
+    :meth:`~bet.sample.regular_grid_values`). If ``input_obj`` is not a
+    :class:`~bet.sample.sample_set` the samples are returned as a
+    :class:`~bet.sample.regular_grid_sample_set`.
     
     :param input_obj: :class:`~bet.sample.sample_set` object containing
         the dimension or domain to sample from, the domain to sample from, or
@@ -154,6 +172,7 @@ def regular_sample_set(input_obj, num_samples_per_dim=1):
     :param num_samples_per_dim: number of samples per dimension
     :type num_samples_per_dim: :class:`~numpy.ndarray` of dimension
         ``(input_sample_set._dim,)``
+    :param bool globalize: Makes local variables global.
 
     :rtype: :class:`~bet.sample.sample_set`
     :returns: :class:`~bet.sample.sample_set` object which contains
@@ -164,9 +183,9 @@ def regular_sample_set(input_obj, num_samples_per_dim=1):
     if isinstance(input_obj, sample.sample_set):
         input_sample_set = input_obj.copy()
     elif isinstance(input_obj, int):
-        input_sample_set = sample.sample_set(input_obj)
+        input_sample_set = sample.regular_grid_sample_set(input_obj)
     elif isinstance(input_obj, np.ndarray):
-        input_sample_set = sample.sample_set(input_obj.shape[0])
+        input_sample_set = sample.regular_grid_sample_set(input_obj.shape[0])
         input_sample_set.set_domain(input_obj)
     else:
         raise bad_object("Improper sample object")
@@ -179,7 +198,7 @@ def regular_sample_set(input_obj, num_samples_per_dim=1):
     if np.any(np.less_equal(num_samples_per_dim, 0)):
         warnings.warn('Warning: num_samples_per_dim must be greater than 0')
 
-    num_samples = np.product(num_samples_per_dim)
+    num_samples = int(np.product(num_samples_per_dim))
 
     if input_sample_set.get_domain() is None:
         # create the domain
@@ -187,30 +206,21 @@ def regular_sample_set(input_obj, num_samples_per_dim=1):
         input_sample_set.set_domain(input_domain)
     else:
         input_domain = input_sample_set.get_domain()
-    # update the bounds based on the number of samples
-    input_values = np.zeros((num_samples, dim))
-
-    vec_samples_dimension = np.empty((dim), dtype=object)
-    for i in np.arange(0, dim):
-        bin_width = (input_domain[i, 1] - input_domain[i, 0]) / \
-                    np.float(num_samples_per_dim[i])
-        vec_samples_dimension[i] = list(np.linspace(
-            input_domain[i, 0] - 0.5 * bin_width,
-            input_domain[i, 1] + 0.5 * bin_width,
-            num_samples_per_dim[i] + 2))[1:num_samples_per_dim[i] + 1]
-
-    arrays_samples_dimension = np.meshgrid(
-            *[vec_samples_dimension[i] for i in np.arange(0, dim)],
-            indexing='ij')
-
 
-    for i in np.arange(0, dim):
-    	input_values[:, i:i+1] = np.vstack(arrays_samples_dimension[i]\
-                    .flat[:])
+    # create only the local block of the grid
+    (start, stop) = lhc.local_range(num_samples)
+    input_sample_set._local_index = np.arange(start, stop, dtype=np.int)
+    input_sample_set.set_values_local(sample.regular_grid_values(input_domain,
+        num_samples_per_dim, start, stop))
+    if isinstance(input_sample_set, sample.regular_grid_sample_set):
+        input_sample_set.set_grid_shape(num_samples_per_dim)
 
-    input_sample_set.set_values(input_values)
-    input_sample_set.global_to_local() 
+    comm.barrier()
 
+    if globalize:
+        input_sample_set.local_to_global()
+    else:
+        input_sample_set._values = None
     return input_sample_set
 
 
@@ -225,9 +235,12 @@ class sampler(object):
     lb_model
         callable function that runs the model at a given set of input and
         returns output
+    evaluator
+        :class:`~bet.sampling.modelEvaluators.evaluator` that controls how
+        ``lb_model`` is run at the local samples
     """
     def __init__(self, lb_model, num_samples=None,
-                 error_estimates=False, jacobians=False):
+                 error_estimates=False, jacobians=False, evaluator=None):
         """
         Initialization
         
@@ -238,6 +251,9 @@ class sampler(object):
         :param bool error_estimates: Whether or not the model returns error
             estimates 
         :param bool jacobians: Whether or not the model returns Jacobians
+        :param evaluator: Evaluates ``lb_model`` in (possibly concurrent)
+            batches, defaults to a single serial batch
+        :type evaluator: :class:`~bet.sampling.modelEvaluators.evaluator`
 
         """
         #: int, total number of samples OR list of number of samples per
@@ -250,6 +266,11 @@ class sampler(object):
         self.lb_model = lb_model
         self.error_estimates = error_estimates
         self.jacobians = jacobians
+        if evaluator is None:
+            evaluator = mev.evaluator()
+        #: :class:`~bet.sampling.modelEvaluators.evaluator` used to run
+        #: ``lb_model``
+        self.evaluator = evaluator
 
     def save(self, mdict, save_file, discretization=None, globalize=False):
         """
@@ -288,20 +309,23 @@ class sampler(object):
         mdict['num_samples'] = self.num_samples
 
     def random_sample_set(self, sample_type, input_obj,
-            num_samples=None, criterion='center', globalize=True):
+            num_samples=None, criterion='center', globalize=True, seed=None):
         """
         Sampling algorithm with three basic options
 
             * ``random`` (or ``r``) generates ``num_samples`` samples in
                 ``lam_domain`` assuming a Lebesgue measure.
             * ``lhs`` generates a latin hyper cube of samples.
+            * ``sobol`` (or ``s``) and ``halton`` (or ``h``) generate scrambled
+                quasi-Monte Carlo points, see
+                :mod:`~bet.sampling.quasiMonteCarlo`.
 
         Note: This function is designed only for generalized rectangles and
         assumes a Lebesgue measure on the parameter space.
        
         :param string sample_type: type sampling random (or r),
-            latin hypercube(lhs), regular grid (rg), or space-filling
-            curve(TBD)
+            latin hypercube(lhs), Sobol (sobol or s), Halton (halton or h),
+            regular grid (rg), or space-filling curve(TBD)
         :param input_obj: :class:`~bet.sample.sample_set` object containing
             the dimension/domain to sample from, domain to sample from, or the
             dimension
@@ -309,9 +333,11 @@ class sampler(object):
             :class:`numpy.ndarray` of shape (dim, 2) or ``int``
         :param string savefile: filename to save discretization
         :param int num_samples: N, number of samples (optional)
-        :param string criterion: latin hypercube criterion see 
-            `PyDOE <http://pythonhosted.org/pyDOE/randomized.html>`_
+        :param string criterion: latin hypercube criterion see
+            :mod:`~bet.sampling.latinHypercube`
         :param bool globalize: Makes local variables global. 
+        :param int seed: shared seed, if given the samples do not depend on
+            the number of processors
         
         :rtype: :class:`~bet.sample.sample_set`
         :returns: :class:`~bet.sample.sample_set` object which contains
@@ -322,9 +348,10 @@ class sampler(object):
             num_samples = self.num_samples
         
         return random_sample_set(sample_type, input_obj, num_samples,
-                criterion, globalize)
+                criterion, globalize, seed)
 
-    def regular_sample_set(self, input_obj, num_samples_per_dim=1):
+    def regular_sample_set(self, input_obj, num_samples_per_dim=1,
+            globalize=True):
         """
         Sampling algorithm for generating a regular grid of samples taken
         on the domain present with ``input_obj`` (a default unit hypercube
@@ -338,6 +365,7 @@ class sampler(object):
         :param num_samples_per_dim: number of samples per dimension
         :type num_samples_per_dim: :class:`~numpy.ndarray` of dimension
             (dim,)
+        :param bool globalize: Makes local variables global.
 
         :rtype: :class:`~bet.sample.sample_set`
         :returns: :class:`~bet.sample.sample_set` object which contains
@@ -345,7 +373,7 @@ class sampler(object):
         
         """
         self.num_samples = np.product(num_samples_per_dim)
-        return regular_sample_set(input_obj, num_samples_per_dim)
+        return regular_sample_set(input_obj, num_samples_per_dim, globalize)
         
     def compute_QoI_and_create_discretization(self, input_sample_set,
             savefile=None, globalize=True):
@@ -374,7 +402,7 @@ class sampler(object):
         # Solve the model at the samples
         if input_sample_set._values_local is None: 
             input_sample_set.global_to_local()
-        local_output = self.lb_model(\
+        local_output = self.evaluator.evaluate(self.lb_model,
                 input_sample_set.get_values_local())
         if isinstance(local_output, np.ndarray):
             local_output_values = local_output
@@ -425,13 +453,16 @@ class sampler(object):
 
     def create_random_discretization(self, sample_type, input_obj,
             savefile=None, num_samples=None, criterion='center',
-            globalize=True):
+            globalize=True, seed=None):
         """
         Sampling algorithm with three basic options
 
             * ``random`` (or ``r``) generates ``num_samples`` samples in
                 ``lam_domain`` assuming a Lebesgue measure.
             * ``lhs`` generates a latin hyper cube of samples.
+            * ``sobol`` (or ``s``) and ``halton`` (or ``h``) generate scrambled
+                quasi-Monte Carlo points, see
+                :mod:`~bet.sampling.quasiMonteCarlo`.
 
         .. note:: 
         
@@ -440,8 +471,8 @@ class sampler(object):
 
 
         :param string sample_type: type sampling random (or r),
-            latin hypercube(lhs), regular grid (rg), or space-filling
-            curve(TBD)
+            latin hypercube(lhs), Sobol (sobol or s), Halton (halton or h),
+            regular grid (rg), or space-filling curve(TBD)
         :param input_obj: Either a :class:`bet.sample.sample_set` object for an
             input space, an array of min and max bounds for the input values
             with ``min = input_domain[:, 0]`` and ``max = input_domain[:, 1]``,
@@ -451,8 +482,10 @@ class sampler(object):
         :param string savefile: filename to save discretization
         :param int num_samples: N, number of samples (optional)
         :param string criterion: latin hypercube criterion see
-            `PyDOE <http://pythonhosted.org/pyDOE/randomized.html>`_
+            :mod:`~bet.sampling.latinHypercube`
         :param bool globalize: Makes local variables global.
+        :param int seed: shared seed, if given the samples do not depend on
+            the number of processors
 
         :rtype: :class:`~bet.sample.discretization`
         :returns: :class:`~bet.sample.discretization` object which contains
@@ -464,7 +497,7 @@ class sampler(object):
             num_samples = self.num_samples
 
         input_sample_set = self.random_sample_set(sample_type, input_obj,
-                num_samples, criterion, globalize)
+                num_samples, criterion, globalize, seed)
 
         return self.compute_QoI_and_create_discretization(input_sample_set, 
                 savefile, globalize)
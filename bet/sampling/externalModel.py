@@ -0,0 +1,335 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains a runner for models that live in an external process.
+Rather than writing the input samples to a ``.mat`` file and spawning a new
+interpreter for every call to ``lb_model`` (see
+``examples/parallel_and_serial_sampling``), an
+:class:`~bet.sampling.externalModel.external_model` keeps a pool of
+long-lived worker processes and streams :class:`numpy.ndarray` objects to
+and from them over pipes using a compact binary framing. An
+:class:`~bet.sampling.externalModel.external_model` is itself a valid
+``lb_model``.
+
+A worker is any script that calls :meth:`~bet.sampling.externalModel.serve`
+with the model, e.g.::
+
+    import bet.sampling.externalModel as em
+
+    def my_model(input_samples):
+        return sum(np.split(input_samples, 2, 1))
+
+    if __name__ == "__main__":
+        em.serve(my_model)
+
+Alternatively a model function that is importable can be served with::
+
+    python -m bet.sampling.externalModel my_module:my_model
+
+Each message consists of a one byte count of arrays followed by the arrays.
+Each array is sent as the length of its dtype string, the dtype string, the
+number of dimensions, the shape (as 64-bit integers) and then the raw data in
+C order. A count of 255 denotes an error message that was raised by the model.
+"""
+
+import os, sys, struct, logging, subprocess, traceback, importlib
+import numpy as np
+import bet.sampling.modelEvaluators as mev
+
+#: message count used to flag an error raised by the model
+ERROR_FLAG = 255
+
+class worker_crashed(Exception):
+    """
+    Exception for when a worker process dies or returns a malformed message.
+    """
+
+class model_error(Exception):
+    """
+    Exception for when the model raises an error inside a worker process.
+    """
+
+def read_exact(stream, num_bytes):
+    """
+    Reads exactly ``num_bytes`` from ``stream``.
+
+    :param stream: binary file-like object
+    :param int num_bytes: number of bytes to read
+
+    :rtype: string
+    :returns: bytes read
+
+    """
+    data = stream.read(num_bytes)
+    if len(data) != num_bytes:
+        raise worker_crashed("Unexpected end of stream.")
+    return data
+
+def write_arrays(stream, arrays):
+    """
+    Writes a message containing ``arrays`` to ``stream``.
+
+    :param stream: binary file-like object
+    :param list arrays: list of :class:`numpy.ndarray`
+
+    """
+    stream.write(struct.pack('<B', len(arrays)))
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        dtype = array.dtype.str
+        stream.write(struct.pack('<B', len(dtype)) + dtype)
+        stream.write(struct.pack('<B', array.ndim))
+        stream.write(struct.pack('<{}q'.format(array.ndim), *array.shape))
+        stream.write(array.tostring())
+    stream.flush()
+
+def write_error(stream, msg):
+    """
+    Writes an error message to ``stream``.
+
+    :param stream: binary file-like object
+    :param string msg: error message
+
+    """
+    stream.write(struct.pack('<BI', ERROR_FLAG, len(msg)) + msg)
+    stream.flush()
+
+def read_arrays(stream):
+    """
+    Reads a message from ``stream``.
+
+    :param stream: binary file-like object
+
+    :rtype: list
+    :returns: list of :class:`numpy.ndarray`, or ``None`` if ``stream`` is
+        at the end of the file
+
+    """
+    count = stream.read(1)
+    if len(count) == 0:
+        return None
+    count = struct.unpack('<B', count)[0]
+    if count == ERROR_FLAG:
+        msg_len = struct.unpack('<I', read_exact(stream, 4))[0]
+        raise model_error(read_exact(stream, msg_len))
+    arrays = list()
+    for _ in xrange(count):
+        dtype_len = struct.unpack('<B', read_exact(stream, 1))[0]
+        dtype = np.dtype(read_exact(stream, dtype_len))
+        ndim = struct.unpack('<B', read_exact(stream, 1))[0]
+        shape = struct.unpack('<{}q'.format(ndim), read_exact(stream,
+            8*ndim))
+        num_bytes = int(np.prod(shape))*dtype.itemsize
+        arrays.append(np.fromstring(read_exact(stream, num_bytes),
+            dtype=dtype).reshape(shape))
+    return arrays
+
+def serve(lb_model, stdin=None, stdout=None):
+    """
+    Runs a worker loop that reads input samples from ``stdin``, evaluates
+    ``lb_model`` and writes the output to ``stdout`` until ``stdin`` is
+    closed. Anything the model prints is redirected to ``stderr`` so that it
+    does not corrupt the message stream.
+
+    :param lb_model: runs the model at a given set of input samples, (N,
+        ndim), and returns output (N, mdim) or a tuple of (output,
+        error_estimates, jacobians)
+    :type lb_model: callable
+    :param stdin: binary file-like object, defaults to standard input
+    :param stdout: binary file-like object, defaults to standard output
+
+    """
+    if stdin is None:
+        stdin = os.fdopen(os.dup(sys.stdin.fileno()), 'rb')
+    if stdout is None:
+        sys.stdout.flush()
+        stdout = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    while True:
+        arrays = read_arrays(stdin)
+        if arrays is None:
+            break
+        try:
+            output = lb_model(arrays[0])
+        except Exception:
+            write_error(stdout, traceback.format_exc())
+            continue
+        if isinstance(output, tuple):
+            write_arrays(stdout, list(output))
+        else:
+            write_arrays(stdout, [output])
+
+def worker_command(model_path):
+    """
+    Creates the command to serve an importable model function.
+
+    :param string model_path: ``module:function`` name of the model
+
+    :rtype: list
+    :returns: command for :class:`~bet.sampling.externalModel.external_model`
+
+    """
+    return [sys.executable, '-m', 'bet.sampling.externalModel', model_path]
+
+class external_model(object):
+    """
+    Runs a model in a pool of long-lived external worker processes.
+
+    command
+        command (list of strings) that starts a worker process
+    num_workers
+        number of worker processes
+    max_retries
+        number of times a batch is resubmitted to a restarted worker if the
+        worker crashes
+    """
+    def __init__(self, command, num_workers=1, max_retries=2, cwd=None):
+        """
+        Initialization
+
+        :param list command: command that starts a worker process, e.g.
+            ``['python', 'my_model.py']``
+        :param int num_workers: number of worker processes
+        :param int max_retries: number of times a batch is retried if a
+            worker crashes
+        :param string cwd: working directory for the worker processes
+
+        """
+        if num_workers < 1:
+            raise ValueError("num_workers must be greater than 0")
+        #: command that starts a worker process
+        self.command = command
+        #: number of worker processes
+        self.num_workers = num_workers
+        #: number of times a batch is retried if a worker crashes
+        self.max_retries = max_retries
+        #: working directory for the worker processes
+        self.cwd = cwd
+        self._workers = [None]*num_workers
+
+    def start_worker(self, i):
+        """
+        (Re)starts the ``i``-th worker process.
+
+        :param int i: worker index
+
+        """
+        self.stop_worker(i)
+        self._workers[i] = subprocess.Popen(self.command,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=self.cwd)
+
+    def stop_worker(self, i):
+        """
+        Stops the ``i``-th worker process.
+
+        :param int i: worker index
+
+        """
+        worker = self._workers[i]
+        if worker is None:
+            return
+        try:
+            worker.stdin.close()
+        except IOError:
+            pass
+        if worker.poll() is None:
+            worker.wait()
+        worker.stdout.close()
+        self._workers[i] = None
+
+    def send(self, i, values):
+        """
+        Sends ``values`` to the ``i``-th worker.
+
+        :param int i: worker index
+        :param values: input samples
+        :type values: :class:`numpy.ndarray` of shape (num, ndim)
+
+        """
+        if self._workers[i] is None or self._workers[i].poll() is not None:
+            self.start_worker(i)
+        try:
+            write_arrays(self._workers[i].stdin, [values])
+        except IOError as exc:
+            raise worker_crashed(str(exc))
+
+    def receive(self, i):
+        """
+        Receives the output of the ``i``-th worker.
+
+        :param int i: worker index
+
+        :rtype: :class:`numpy.ndarray` or tuple
+        :returns: output of the model
+
+        """
+        arrays = read_arrays(self._workers[i].stdout)
+        if arrays is None:
+            raise worker_crashed("Worker {} exited.".format(i))
+        if len(arrays) == 1:
+            return arrays[0]
+        return tuple(arrays)
+
+    def __call__(self, values):
+        """
+        Runs the model at ``values`` by splitting the samples among the
+        workers. Batches on workers that crash are resubmitted to a restarted
+        worker up to ``self.max_retries`` times.
+
+        :param values: input samples
+        :type values: :class:`numpy.ndarray` of shape (num, ndim)
+
+        :rtype: :class:`numpy.ndarray` or tuple
+        :returns: the output of the model at ``values``
+
+        """
+        num_batches = max(1, min(self.num_workers, values.shape[0]))
+        batches = np.array_split(values, num_batches)
+        outputs = [None]*num_batches
+        pending = range(num_batches)
+        retries = 0
+        while len(pending) > 0:
+            failed = list()
+            sent = list()
+            for i in pending:
+                try:
+                    self.send(i, batches[i])
+                    sent.append(i)
+                except worker_crashed:
+                    failed.append(i)
+            error = None
+            for i in sent:
+                try:
+                    outputs[i] = self.receive(i)
+                except worker_crashed:
+                    failed.append(i)
+                except model_error as exc:
+                    # keep reading so no output is left in the other pipes
+                    error = exc
+            if error is not None:
+                raise error
+            if len(failed) > 0:
+                retries += 1
+                if retries > self.max_retries:
+                    raise worker_crashed("Workers {} crashed after {} "\
+                            "retries.".format(failed, self.max_retries))
+                logging.warning("Restarting crashed workers {}".format(
+                    failed))
+                for i in failed:
+                    self.start_worker(i)
+            pending = sorted(failed)
+        return mev.gather_outputs(outputs)
+
+    def close(self):
+        """
+        Stops all of the worker processes.
+        """
+        for i in xrange(self.num_workers):
+            self.stop_worker(i)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        (module_name, function_name) = sys.argv[1].split(':')
+        serve(getattr(importlib.import_module(module_name), function_name))
+    else:
+        print "usage: python -m bet.sampling.externalModel module:function"
@@ -0,0 +1,195 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains a vectorized, distributed Latin hypercube generator.
+
+A single global design of ``num_samples`` points is defined by a shared seed.
+For each dimension the design uses a pseudo-random permutation of
+``0, ..., num_samples-1`` that is evaluated pointwise (a keyed Feistel network
+with cycle walking), and the jitter within each stratum is drawn from a
+counter-based stream indexed by the global sample number. Therefore any
+contiguous block of the global design can be generated directly without
+generating the rest of it, each processor only generates its own slice, and
+the design is identical regardless of the number of processors.
+
+The criteria follow the naming used by `PyDOE
+<http://pythonhosted.org/pyDOE/randomized.html>`_:
+
+    * ``None`` randomly places points within each stratum
+    * ``center`` (``c``) places points at the center of each stratum
+    * ``maximin`` (``m``) maximizes the minimum distance between points
+    * ``centermaximin`` (``cm``) is ``maximin`` with centered points
+    * ``correlation`` (``corr``) minimizes the maximum correlation between
+        dimensions
+
+The ``maximin`` and ``correlation`` criteria choose the best of
+``iterations`` candidate designs, where each candidate is scored over
+consecutive batches of ``batch_size`` points (the scores of the batches are
+distributed among the processors). When ``num_samples <= batch_size`` this
+is the same as scoring the whole design.
+"""
+
+import numpy as np
+import scipy.spatial as spatial
+from bet.Comm import comm, MPI
+from bet.sampling.randomStreams import mix, stream_key, uniform, shared_seed
+
+def permute(index, num, key, rounds=4):
+    """
+    Evaluates a pseudo-random permutation of ``0, ..., num-1`` at ``index``
+    using a balanced Feistel network with cycle walking.
+
+    :param index: indices in ``[0, num)``
+    :type index: :class:`numpy.ndarray` of int
+    :param int num: size of the permutation
+    :param int key: stream key
+    :param int rounds: number of Feistel rounds
+
+    :rtype: :class:`numpy.ndarray` of int
+    :returns: permuted indices
+
+    """
+    bits = max(2, int(np.ceil(np.log2(max(num, 2)))))
+    half = np.uint64((bits + 1)/2)
+    mask = np.uint64((1 << int(half)) - 1)
+    round_keys = [np.uint64(stream_key(key, r)) for r in xrange(rounds)]
+
+    def encrypt(x):
+        left = x >> half
+        right = x & mask
+        for round_key in round_keys:
+            (left, right) = (right, left ^ (mix(right ^ round_key) & mask))
+        return (left << half) | right
+
+    perm = encrypt(np.asarray(index).astype(np.uint64))
+    outside = perm >= np.uint64(num)
+    while np.any(outside):
+        perm[outside] = encrypt(perm[outside])
+        outside = perm >= np.uint64(num)
+    return perm.astype(np.int64)
+
+def lhs_block(dim, num_samples, start, stop, seed, centered=False):
+    """
+    Generates the rows ``start:stop`` of the global Latin hypercube design on
+    the unit hypercube defined by ``seed``.
+
+    :param int dim: dimension
+    :param int num_samples: total number of samples in the design
+    :param int start: first global index
+    :param int stop: one past the last global index
+    :param int seed: shared seed
+    :param bool centered: place points at the center of each stratum
+
+    :rtype: :class:`numpy.ndarray` of shape (stop-start, dim)
+    :returns: block of the design
+
+    """
+    index = np.arange(start, stop, dtype=np.int64)
+    block = np.empty((index.shape[0], dim))
+    for j in xrange(dim):
+        strata = permute(index, num_samples, stream_key(seed, 0, j))
+        if centered:
+            jitter = 0.5
+        else:
+            jitter = uniform(stream_key(seed, 1, j), index)
+        block[:, j] = (strata + jitter)/float(num_samples)
+    return block
+
+def local_range(num_samples):
+    """
+    Determines the global indices local to this processor. This matches the
+    partitioning of :meth:`numpy.array_split`.
+
+    :param int num_samples: total number of samples
+
+    :rtype: tuple
+    :returns: (start, stop)
+
+    """
+    base = num_samples/comm.size
+    extra = num_samples%comm.size
+    start = comm.rank*base + min(comm.rank, extra)
+    stop = start + base + (comm.rank < extra)
+    return (start, stop)
+
+def score_design(dim, num_samples, seed, centered, criterion, batch_size):
+    """
+    Scores a candidate design by batches of ``batch_size`` points. The
+    batches are distributed among the processors.
+
+    :param int dim: dimension
+    :param int num_samples: total number of samples in the design
+    :param int seed: seed of the candidate design
+    :param bool centered: place points at the center of each stratum
+    :param string criterion: ``maximin`` or ``correlation``
+    :param int batch_size: number of points per batch
+
+    :rtype: float
+    :returns: score (larger is better)
+
+    """
+    num_batches = int(np.ceil(num_samples/float(batch_size)))
+    local_score = np.inf
+    for batch in xrange(comm.rank, num_batches, comm.size):
+        start = batch*batch_size
+        stop = min(num_samples, start+batch_size)
+        if stop - start < 2:
+            continue
+        block = lhs_block(dim, num_samples, start, stop, seed, centered)
+        if criterion == 'maximin':
+            score = np.min(spatial.distance.pdist(block))
+        else:
+            corr = np.corrcoef(block.transpose())
+            score = -np.max(np.abs(corr[np.triu_indices(dim, 1)]))
+        local_score = min(local_score, score)
+    # the global score is the worst score of all of the batches
+    return -comm.allreduce(-local_score, op=MPI.MAX)
+
+def lhs_local(dim, num_samples, criterion=None, seed=None, iterations=5,
+        batch_size=1000):
+    """
+    Generates the local slice of a global Latin hypercube design of
+    ``num_samples`` points on the unit hypercube. The local slice is the one
+    that :meth:`numpy.array_split` would assign to this processor.
+
+    :param int dim: dimension
+    :param int num_samples: total number of samples in the design
+    :param string criterion: latin hypercube criterion see
+        :mod:`~bet.sampling.latinHypercube`
+    :param int seed: shared seed, if ``None`` a seed is drawn from
+        :mod:`numpy.random` on rank 0 and broadcast
+    :param int iterations: number of candidate designs for the ``maximin``
+        and ``correlation`` criteria
+    :param int batch_size: number of points per batch used to score
+        candidate designs
+
+    :rtype: :class:`numpy.ndarray` of shape (num_samples_local, dim)
+    :returns: local samples
+
+    """
+    seed = shared_seed(seed)
+    if criterion in [None, 'random', 'r']:
+        (centered, criterion) = (False, None)
+    elif criterion in ['center', 'c']:
+        (centered, criterion) = (True, None)
+    elif criterion in ['maximin', 'm']:
+        (centered, criterion) = (False, 'maximin')
+    elif criterion in ['centermaximin', 'cm']:
+        (centered, criterion) = (True, 'maximin')
+    elif criterion in ['correlation', 'corr']:
+        (centered, criterion) = (False, 'correlation')
+    else:
+        raise ValueError("Invalid value for criterion: {}".format(criterion))
+
+    design_seed = stream_key(seed, 0)
+    if criterion is not None and (criterion != 'correlation' or dim > 1):
+        best_score = -np.inf
+        for candidate in xrange(iterations):
+            candidate_seed = stream_key(seed, candidate)
+            score = score_design(dim, num_samples, candidate_seed, centered,
+                    criterion, batch_size)
+            if score > best_score:
+                (best_score, design_seed) = (score, candidate_seed)
+
+    (start, stop) = local_range(num_samples)
+    return lhs_block(dim, num_samples, start, stop, design_seed, centered)
@@ -0,0 +1,261 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains a persistent on-disk memoization cache for models. A
+:class:`~bet.sampling.modelCache.model_cache` wraps an ``lb_model`` and is
+itself a valid ``lb_model``, e.g.::
+
+    my_sampler.lb_model = model_cache(my_sampler.lb_model, 'model_cache')
+
+Each input sample (row) is hashed together with a model identifier and the
+corresponding output (and error estimates and Jacobians if the model returns
+them) is stored as a single file in a cache directory. Samples that have been
+evaluated before, by this or a previous run, are served from the cache without
+calling the model.
+
+Entries are written to a temporary file and atomically renamed into place so
+that multiple MPI processes (or separate runs) can safely share a cache
+directory. The cache may be size-bounded, in which case the least recently
+used entries are evicted first.
+"""
+
+import os, hashlib, tempfile, errno, logging
+import numpy as np
+from bet.Comm import comm, MPI
+
+def row_keys(values, model_id):
+    """
+    Computes a content-addressed key for each row of ``values``.
+
+    :param values: input samples
+    :type values: :class:`numpy.ndarray` of shape (num, ndim)
+    :param string model_id: model identifier
+
+    :rtype: list
+    :returns: list of hexadecimal keys of length num
+
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if len(values.shape) <= 1:
+        values = values.reshape((values.shape[0], -1))
+    keys = list()
+    for row in values:
+        key = hashlib.sha1(model_id)
+        key.update(row.tostring())
+        keys.append(key.hexdigest())
+    return keys
+
+class model_cache(object):
+    """
+    Persistent on-disk memoization cache wrapped around a model.
+
+    lb_model
+        callable function that runs the model at a given set of input and
+        returns output
+    cache_dir
+        directory where the cache entries are stored
+    model_id
+        string that identifies the model, entries from different models do
+        not collide
+    max_size
+        maximum size of the cache in bytes, if ``None`` the cache is unbounded
+    hits
+        number of samples served from the cache on this processor
+    misses
+        number of samples evaluated by the model on this processor
+    """
+    def __init__(self, lb_model, cache_dir, model_id=None, max_size=None):
+        """
+        Initialization
+
+        :param lb_model: Interface to physics-based model takes an input of
+            shape (N, ndim) and returns an output of shape (N, mdim) or a
+            tuple of (output, error_estimates, jacobians)
+        :type lb_model: callable function
+        :param string cache_dir: directory to store the cache entries in
+        :param string model_id: identifier for the model, defaults to the
+            module and name of ``lb_model``
+        :param int max_size: maximum size of the cache in bytes
+
+        """
+        #: callable function that runs the model
+        self.lb_model = lb_model
+        #: directory where the cache entries are stored
+        self.cache_dir = cache_dir
+        if model_id is None:
+            model_id = "{}.{}".format(getattr(lb_model, '__module__', None),
+                    getattr(lb_model, '__name__', type(lb_model).__name__))
+        #: string identifier for the model
+        self.model_id = str(model_id)
+        #: maximum size of the cache in bytes
+        self.max_size = max_size
+        #: number of samples served from the cache
+        self.hits = 0
+        #: number of samples evaluated by the model
+        self.misses = 0
+        try:
+            os.makedirs(cache_dir)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+    def entry_path(self, key):
+        """
+        Returns the path of the cache entry for ``key``.
+
+        :param string key: cache key
+
+        :rtype: string
+        :returns: path to the cache entry
+
+        """
+        return os.path.join(self.cache_dir, key+'.npz')
+
+    def load(self, key):
+        """
+        Loads the cache entry for ``key`` and marks it as recently used.
+
+        :param string key: cache key
+
+        :rtype: tuple or None
+        :returns: (is_tuple, list of :class:`numpy.ndarray`) or ``None`` if
+            there is no entry for ``key``
+
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as entry_file:
+                mdat = np.load(entry_file)
+                num_entries = int(mdat['num_entries'])
+                is_tuple = bool(mdat['is_tuple'])
+                entry = [mdat['arr_{}'.format(i)] for i in
+                        xrange(num_entries)]
+            os.utime(path, None)
+        except (IOError, OSError, KeyError, ValueError):
+            # missing, evicted, or partially written by another process
+            return None
+        return (is_tuple, entry)
+
+    def store(self, key, is_tuple, entry):
+        """
+        Atomically stores ``entry`` for ``key``.
+
+        :param string key: cache key
+        :param bool is_tuple: whether or not the model returns a tuple
+        :param list entry: list of :class:`numpy.ndarray` for a single sample
+
+        """
+        (fd, tmp_path) = tempfile.mkstemp(dir=self.cache_dir,
+                suffix='.tmp')
+        mdict = {'num_entries':len(entry), 'is_tuple':is_tuple}
+        for i, array in enumerate(entry):
+            mdict['arr_{}'.format(i)] = array
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                np.savez(tmp_file, **mdict)
+            os.rename(tmp_path, self.entry_path(key))
+        except (IOError, OSError):
+            logging.warning("Unable to store cache entry {}".format(key))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the size of the cache
+        is at most ``self.max_size``.
+        """
+        if self.max_size is None:
+            return
+        entries = list()
+        total_size = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        entries.sort()
+        for (_, size, path) in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # already removed by another process
+                pass
+            total_size -= size
+
+    def __call__(self, values):
+        """
+        Runs the model at ``values`` evaluating only the samples that are not
+        already in the cache.
+
+        :param values: input samples
+        :type values: :class:`numpy.ndarray` of shape (num, ndim)
+
+        :rtype: :class:`numpy.ndarray` or tuple
+        :returns: the output of ``lb_model`` at ``values``
+
+        """
+        if values.shape[0] == 0:
+            return self.lb_model(values)
+        keys = row_keys(values, self.model_id)
+        entries = [self.load(key) for key in keys]
+        # evaluate each distinct missing sample only once
+        miss_rows = dict()
+        for i, entry in enumerate(entries):
+            if entry is None and keys[i] not in miss_rows:
+                miss_rows[keys[i]] = i
+        num_misses = sum([1 for entry in entries if entry is None])
+        self.hits += len(keys) - num_misses
+        self.misses += num_misses
+
+        if len(miss_rows) > 0:
+            miss_index = sorted(miss_rows.values())
+            output = self.lb_model(values[miss_index])
+            is_tuple = isinstance(output, tuple)
+            if not is_tuple:
+                output = (output,)
+            for j, i in enumerate(miss_index):
+                entry = [array[j] for array in output]
+                self.store(keys[i], is_tuple, entry)
+                miss_rows[keys[i]] = (is_tuple, entry)
+            for i, entry in enumerate(entries):
+                if entry is None:
+                    entries[i] = miss_rows[keys[i]]
+            self.evict()
+
+        is_tuple = entries[0][0]
+        output = tuple([np.array([entry[1][i] for entry in entries]) for i in
+            xrange(len(entries[0][1]))])
+        if is_tuple:
+            return output
+        return output[0]
+
+    def get_stats(self):
+        """
+        Returns the hit/miss statistics of this cache summed over all
+        processors. This must be called by all processors.
+
+        :rtype: dict
+        :returns: dictionary with keys ``hits``, ``misses``, and ``hit_rate``
+
+        """
+        hits = comm.allreduce(self.hits, op=MPI.SUM)
+        misses = comm.allreduce(self.misses, op=MPI.SUM)
+        if hits + misses > 0:
+            hit_rate = hits/float(hits + misses)
+        else:
+            hit_rate = 0.0
+        return {'hits':hits, 'misses':misses, 'hit_rate':hit_rate}
+
+    def reset_stats(self):
+        """
+        Resets the hit/miss statistics on this processor.
+        """
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,244 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains evaluators that control how a model is run at a set of
+local input samples. The samples local to a processor are split into batches
+which are then dispatched to the model either serially, on a pool of threads,
+or on a pool of processes. The outputs (and optional error estimates and
+Jacobians) are gathered back together in the original sample order.
+
+* :class:`~bet.sampling.modelEvaluators.evaluator` evaluates batches serially
+    and is the default for :class:`~bet.sampling.basicSampling.sampler`.
+* :class:`~bet.sampling.modelEvaluators.thread_evaluator` evaluates batches
+    concurrently on a pool of threads. This is appropriate for models that
+    release the GIL, e.g. models that wait on external solvers.
+* :class:`~bet.sampling.modelEvaluators.process_evaluator` evaluates batches
+    concurrently on a pool of processes. The model must be picklable.
+"""
+
+import time, logging
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+class bad_output(Exception):
+    """
+    Exception for when batch outputs of a model cannot be gathered.
+    """
+
+def timed_evaluation(model_and_values):
+    """
+    Runs ``lb_model`` at ``values`` and times the evaluation. This is a module
+    level function so that it may be pickled by
+    :class:`~bet.sampling.modelEvaluators.process_evaluator`.
+
+    :param tuple model_and_values: (lb_model, values)
+
+    :rtype: tuple
+    :returns: (output, elapsed_time)
+
+    """
+    (lb_model, values) = model_and_values
+    start = time.time()
+    output = lb_model(values)
+    return (output, time.time()-start)
+
+def gather_outputs(outputs):
+    """
+    Concatenates the outputs from a list of batches of model evaluations. Each
+    output is either a :class:`numpy.ndarray` or a tuple of
+    :class:`numpy.ndarray` (e.g. ``(values, error_estimates, jacobians)``) in
+    which case each entry of the tuple is concatenated separately.
+
+    :param list outputs: list of outputs from ``lb_model``
+
+    :rtype: :class:`numpy.ndarray` or tuple
+    :returns: gathered output with the same structure as a single output
+
+    """
+    if len(outputs) == 1:
+        return outputs[0]
+    for output in outputs:
+        if type(output) is not type(outputs[0]):
+            raise bad_output("Batch outputs do not have the same type.")
+    if isinstance(outputs[0], np.ndarray):
+        return np.concatenate(outputs, 0)
+    elif isinstance(outputs[0], tuple):
+        num_entries = len(outputs[0])
+        for output in outputs:
+            if len(output) != num_entries:
+                raise bad_output("Batch outputs do not have the same length.")
+        return tuple([np.concatenate([output[i] for output in outputs], 0)
+            for i in xrange(num_entries)])
+    else:
+        raise bad_output("lb_model is not returning the proper type")
+
+class evaluator(object):
+    """
+    Evaluates a model at a set of samples by splitting the samples into
+    batches and evaluating each batch serially. Subclasses override
+    :meth:`~bet.sampling.modelEvaluators.evaluator.map` to change how the
+    batches are dispatched.
+
+    batch_size
+        maximum number of samples per batch, if ``None`` all of the samples
+        are evaluated in a single batch
+    batch_stats
+        list of (num_samples, elapsed_time, samples_per_second) for each
+        batch of the most recent call to
+        :meth:`~bet.sampling.modelEvaluators.evaluator.evaluate`
+
+    """
+    def __init__(self, batch_size=None):
+        """
+        Initialization
+
+        :param int batch_size: maximum number of samples per batch
+
+        """
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("batch_size must be greater than 0")
+        #: int, maximum number of samples per batch
+        self.batch_size = batch_size
+        #: list of (num_samples, elapsed_time, samples_per_second)
+        self.batch_stats = list()
+
+    def split(self, values):
+        """
+        Splits ``values`` into batches of at most ``self.batch_size`` samples
+        preserving the order of the samples.
+
+        :param values: samples
+        :type values: :class:`numpy.ndarray` of shape (num, ndim)
+
+        :rtype: list
+        :returns: list of :class:`numpy.ndarray`
+
+        """
+        num = values.shape[0]
+        if self.batch_size is None or num <= self.batch_size:
+            return [values]
+        return [values[i:i+self.batch_size] for i in xrange(0, num,
+            self.batch_size)]
+
+    def map(self, lb_model, batches):
+        """
+        Evaluates ``lb_model`` at each batch serially.
+
+        :param lb_model: runs the model at a given set of input samples
+        :type lb_model: callable
+        :param list batches: list of :class:`numpy.ndarray`
+
+        :rtype: list
+        :returns: list of (output, elapsed_time) in the order of ``batches``
+
+        """
+        return [timed_evaluation((lb_model, batch)) for batch in batches]
+
+    def evaluate(self, lb_model, values):
+        """
+        Evaluates ``lb_model`` at ``values`` in batches and gathers the
+        outputs in order.
+
+        :param lb_model: runs the model at a given set of input samples,
+            (N, ndim), and returns output (N, mdim) or a tuple of (output,
+            error_estimates, jacobians)
+        :type lb_model: callable
+        :param values: samples to evaluate the model at
+        :type values: :class:`numpy.ndarray` of shape (num, ndim)
+
+        :rtype: :class:`numpy.ndarray` or tuple
+        :returns: the gathered output of ``lb_model``
+
+        """
+        batches = self.split(values)
+        results = self.map(lb_model, batches)
+        self.batch_stats = list()
+        for i, (batch, (_, elapsed)) in enumerate(zip(batches, results)):
+            if elapsed > 0:
+                rate = batch.shape[0]/elapsed
+            else:
+                rate = np.inf
+            self.batch_stats.append((batch.shape[0], elapsed, rate))
+            logging.info("Batch {}/{}: {} samples in {:.3g}s ({:.3g} "\
+                    "samples/s)".format(i+1, len(batches), batch.shape[0],
+                        elapsed, rate))
+        return gather_outputs([output for (output, _) in results])
+
+    def close(self):
+        """
+        Releases any resources held by this evaluator.
+        """
+        pass
+
+class thread_evaluator(evaluator):
+    """
+    Evaluates a model at a set of samples by dispatching batches of samples
+    concurrently to a pool of threads.
+    """
+    def __init__(self, num_workers=None, batch_size=None):
+        """
+        Initialization
+
+        :param int num_workers: number of threads, defaults to the number of
+            CPUs
+        :param int batch_size: maximum number of samples per batch
+
+        """
+        super(thread_evaluator, self).__init__(batch_size)
+        #: int, number of threads
+        self.num_workers = num_workers
+        self._pool = None
+
+    def map(self, lb_model, batches):
+        """
+        Evaluates ``lb_model`` at each batch on a pool of threads.
+
+        :param lb_model: runs the model at a given set of input samples
+        :type lb_model: callable
+        :param list batches: list of :class:`numpy.ndarray`
+
+        :rtype: list
+        :returns: list of (output, elapsed_time) in the order of ``batches``
+
+        """
+        if len(batches) == 1:
+            return super(thread_evaluator, self).map(lb_model, batches)
+        if self._pool is None:
+            self._pool = ThreadPool(self.num_workers)
+        return self._pool.map(timed_evaluation, [(lb_model, batch) for batch
+            in batches])
+
+    def close(self):
+        """
+        Terminates the pool of threads.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+class process_evaluator(thread_evaluator):
+    """
+    Evaluates a model at a set of samples by dispatching batches of samples
+    concurrently to a pool of processes. ``lb_model`` must be picklable, i.e.
+    a function defined at the top level of a module.
+    """
+    def map(self, lb_model, batches):
+        """
+        Evaluates ``lb_model`` at each batch on a pool of processes.
+
+        :param lb_model: runs the model at a given set of input samples
+        :type lb_model: callable
+        :param list batches: list of :class:`numpy.ndarray`
+
+        :rtype: list
+        :returns: list of (output, elapsed_time) in the order of ``batches``
+
+        """
+        if len(batches) == 1:
+            return evaluator.map(self, lb_model, batches)
+        if self._pool is None:
+            self._pool = Pool(self.num_workers)
+        return self._pool.map(timed_evaluation, [(lb_model, batch) for batch
+            in batches])
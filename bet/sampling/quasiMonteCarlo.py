@@ -0,0 +1,300 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains vectorized, distributed quasi-Monte Carlo generators.
+
+The ``num_samples`` points of a global low-discrepancy sequence are defined by
+a shared seed. Each point is evaluated directly from its global index (the
+Gray code construction for Sobol points, the radical inverse for Halton
+points), so any contiguous block of the sequence can be generated without
+generating the rest of it. Each processor only generates its own slice, and
+the points are identical regardless of the number of processors.
+
+The available sequences are:
+
+    * ``sobol`` (``s``) Sobol points using the direction numbers of
+        `Joe and Kuo <http://web.maths.unsw.edu.au/~fkuo/sobol/>`_
+        (up to :data:`SOBOL_MAX_DIM` dimensions) scrambled with a random
+        linear matrix scramble and a digital shift
+    * ``halton`` (``h``) Halton points scrambled with random digit
+        permutations
+
+Both scramblings preserve the low-discrepancy structure of the points while
+making each point uniformly distributed on the unit hypercube, so estimates
+made with scrambled points are unbiased.
+
+:meth:`~bet.sampling.quasiMonteCarlo.uniform_local` generates the local
+slice of ``num_samples`` points on the unit hypercube for any of these
+sequences or for ``random`` (``r``) points from the streams of
+:mod:`~bet.sampling.randomStreams` and is used as the emulation source
+throughout BET.
+"""
+
+import numpy as np
+import bet.sampling.latinHypercube as lhc
+import bet.sampling.randomStreams as rs
+
+#: number of bits in the Sobol points (at most ``2**BITS`` points)
+BITS = 32
+
+#: (degree, coefficients, initial direction numbers) of the primitive
+#: polynomials for dimensions 2, 3, ...
+SOBOL_TABLE = [(1, 0, [1]), (2, 1, [1, 3]), (3, 1, [1, 3, 1]),
+        (3, 2, [1, 1, 1]), (4, 1, [1, 1, 3, 3]), (4, 4, [1, 3, 5, 13]),
+        (5, 2, [1, 1, 5, 5, 17]), (5, 4, [1, 1, 5, 5, 5]),
+        (5, 7, [1, 1, 7, 11, 19]), (5, 11, [1, 1, 5, 1, 1]),
+        (5, 13, [1, 1, 1, 3, 11]), (5, 14, [1, 3, 5, 5, 31]),
+        (6, 1, [1, 3, 3, 9, 7, 49]), (6, 13, [1, 1, 1, 15, 21, 21]),
+        (6, 16, [1, 3, 1, 13, 27, 49]), (6, 19, [1, 1, 1, 15, 7, 5]),
+        (6, 22, [1, 3, 1, 15, 13, 25]), (6, 25, [1, 1, 5, 5, 19, 61]),
+        (7, 1, [1, 3, 7, 11, 23, 15, 103]), (7, 4, [1, 3, 7, 13, 13, 15, 69])]
+
+#: maximum dimension of the Sobol points
+SOBOL_MAX_DIM = len(SOBOL_TABLE) + 1
+
+def random_bits(key, index, bits=BITS):
+    """
+    Counter-based random integers with ``bits`` bits. The same ``key`` and
+    ``index`` always produce the same integer.
+
+    :param int key: stream key
+    :param index: indices
+    :type index: :class:`numpy.ndarray` of int
+    :param int bits: number of bits
+
+    :rtype: :class:`numpy.ndarray` of dtype ``uint64``
+    :returns: random integers
+
+    """
+    index = np.asarray(index).astype(np.uint64)
+    return rs.mix(rs.mix(index ^ np.uint64(key))) >> np.uint64(64-bits)
+
+def sobol_direction_numbers(dim):
+    """
+    Computes the direction numbers of the first ``dim`` dimensions of the
+    Sobol points.
+
+    :param int dim: dimension
+
+    :rtype: :class:`numpy.ndarray` of shape (dim, BITS) and dtype ``uint64``
+    :returns: direction numbers
+
+    """
+    if dim > SOBOL_MAX_DIM:
+        raise ValueError("Sobol points are only available for up to "+\
+                "{} dimensions, use Halton points.".format(SOBOL_MAX_DIM))
+    directions = np.zeros((dim, BITS), dtype=np.uint64)
+    directions[0] = [1 << (BITS-1-k) for k in xrange(BITS)]
+    for j in xrange(1, dim):
+        (degree, coeffs, initial) = SOBOL_TABLE[j-1]
+        m = list(initial)
+        for k in xrange(degree, BITS):
+            new = m[k-degree] ^ (m[k-degree] << degree)
+            for i in xrange(1, degree):
+                if (coeffs >> (degree-1-i)) & 1:
+                    new ^= m[k-i] << i
+            m.append(new)
+        directions[j] = [m[k] << (BITS-1-k) for k in xrange(BITS)]
+    return directions
+
+def scramble_directions(directions, key):
+    """
+    Applies a random lower triangular (most significant bit first) binary
+    matrix with unit diagonal to the direction numbers of each dimension.
+
+    :param directions: direction numbers
+    :type directions: :class:`numpy.ndarray` of shape (dim, BITS)
+    :param int key: stream key
+
+    :rtype: :class:`numpy.ndarray` of shape (dim, BITS) and dtype ``uint64``
+    :returns: scrambled direction numbers
+
+    """
+    dim = directions.shape[0]
+    scrambled = np.zeros(directions.shape, dtype=np.uint64)
+    for j in xrange(dim):
+        rows = random_bits(rs.stream_key(key, j), np.arange(BITS))
+        for i in xrange(BITS):
+            # row i keeps the diagonal bit and random bits above it
+            above = ((1 << BITS) - 1) ^ ((1 << (BITS-i)) - 1)
+            row = (int(rows[i]) & above) | (1 << (BITS-1-i))
+            for k in xrange(BITS):
+                if bin(row & int(directions[j, k])).count('1') % 2:
+                    scrambled[j, k] |= np.uint64(1 << (BITS-1-i))
+    return scrambled
+
+def sobol_block(dim, start, stop, seed, scramble=True):
+    """
+    Generates the points ``start:stop`` of the Sobol sequence on the unit
+    hypercube defined by ``seed``.
+
+    :param int dim: dimension
+    :param int start: first global index
+    :param int stop: one past the last global index
+    :param int seed: shared seed
+    :param bool scramble: scramble the points
+
+    :rtype: :class:`numpy.ndarray` of shape (stop-start, dim)
+    :returns: block of the sequence
+
+    """
+    if stop > 2**BITS:
+        raise ValueError("At most 2**{} Sobol points.".format(BITS))
+    directions = sobol_direction_numbers(dim)
+    shift = np.zeros((dim,), dtype=np.uint64)
+    if scramble:
+        directions = scramble_directions(directions, rs.stream_key(seed, 0))
+        shift = random_bits(rs.stream_key(seed, 1), np.arange(dim))
+    index = np.arange(start, stop, dtype=np.uint64)
+    gray = index ^ (index >> np.uint64(1))
+    codes = np.tile(shift, (index.shape[0], 1))
+    for k in xrange(int(max(stop, 1)-1).bit_length()):
+        bit = ((gray >> np.uint64(k)) & np.uint64(1)).astype(bool)
+        codes[bit] ^= directions[:, k]
+    # use the centers of the binary intervals so that no point is 0 or 1
+    return (codes.astype(np.float64) + 0.5) * 2.0**-BITS
+
+def primes(num):
+    """
+    Computes the first ``num`` prime numbers.
+
+    :param int num: number of primes
+
+    :rtype: list
+    :returns: primes
+
+    """
+    found = []
+    candidate = 2
+    while len(found) < num:
+        if all(candidate % p for p in found if p*p <= candidate):
+            found.append(candidate)
+        candidate += 1
+    return found
+
+def halton_permutation(base, seed, dim_index, digit_index):
+    """
+    Random permutation of the digits ``0, ..., base-1`` used to scramble the
+    digit ``digit_index`` of the dimension ``dim_index`` of the Halton
+    points.
+
+    :param int base: base
+    :param int seed: shared seed
+    :param int dim_index: index of the dimension
+    :param int digit_index: index of the digit
+
+    :rtype: :class:`numpy.ndarray` of shape (base,)
+    :returns: permutation
+
+    """
+    return lhc.permute(np.arange(base), base, rs.stream_key(seed,
+        dim_index, digit_index))
+
+def halton_block(dim, start, stop, seed, scramble=True):
+    """
+    Generates the points ``start:stop`` of the Halton sequence on the unit
+    hypercube defined by ``seed``.
+
+    :param int dim: dimension
+    :param int start: first global index
+    :param int stop: one past the last global index
+    :param int seed: shared seed
+    :param bool scramble: scramble the points
+
+    :rtype: :class:`numpy.ndarray` of shape (stop-start, dim)
+    :returns: block of the sequence
+
+    """
+    index = np.arange(start, stop, dtype=np.int64)
+    block = np.zeros((index.shape[0], dim))
+    for j, base in enumerate(primes(dim)):
+        num_digits = 1
+        while base**num_digits <= max(stop-1, 1):
+            num_digits += 1
+        remainder = np.copy(index)
+        scale = 1.0/base
+        for k in xrange(num_digits):
+            digits = remainder % base
+            remainder = remainder // base
+            if scramble:
+                digits = halton_permutation(base, seed, j, k)[digits]
+            block[:, j] += digits*scale
+            scale /= base
+        if scramble:
+            # the remaining digits are zero for every index, permute enough
+            # of them to resolve double precision
+            for k in xrange(num_digits, int(np.ceil(53*np.log(2)/\
+                    np.log(base)))):
+                block[:, j] += halton_permutation(base, seed, j, k)[0]*scale
+                scale /= base
+    return block
+
+def uniform_local_blocks(dim, num_samples, block_size, sample_type='random',
+        seed=None):
+    """
+    Generates the local slice of ``num_samples`` points on the unit hypercube
+    in consecutive blocks of at most ``block_size`` points. The local slice
+    is the one that :meth:`numpy.array_split` would assign to this processor.
+
+    :param int dim: dimension
+    :param int num_samples: total number of points
+    :param int block_size: maximum number of points per block
+    :param string sample_type: ``random`` (or ``r``), ``sobol`` (or ``s``),
+        or ``halton`` (or ``h``)
+    :param int seed: shared seed, if ``None`` the ``random`` points are drawn
+        from :mod:`numpy.random` and the seed of the ``sobol`` and ``halton``
+        points is drawn from :mod:`numpy.random` on rank 0 and broadcast
+
+    :rtype: generator
+    :returns: blocks of local points of shape (num_block, dim)
+
+    """
+    (start, stop) = lhc.local_range(int(num_samples))
+    if sample_type in ['random', 'r']:
+        if seed is None:
+            block = None
+        else:
+            # derive the key of the stream so that nearby seeds do not
+            # permute the same numbers
+            block = rs.uniform_block
+            seed = rs.stream_key(seed, 0)
+    elif sample_type in ['sobol', 's']:
+        block = sobol_block
+        seed = rs.shared_seed(seed)
+    elif sample_type in ['halton', 'h']:
+        block = halton_block
+        seed = rs.shared_seed(seed)
+    else:
+        raise ValueError("Invalid value for sample_type: {}".format(
+            sample_type))
+    for first in xrange(start, stop, int(block_size)):
+        last = min(stop, first+int(block_size))
+        if block is None:
+            yield np.random.random_sample((last-first, dim))
+        else:
+            yield block(dim, first, last, seed)
+
+def uniform_local(dim, num_samples, sample_type='random', seed=None):
+    """
+    Generates the local slice of ``num_samples`` points on the unit hypercube.
+    The local slice is the one that :meth:`numpy.array_split` would assign to
+    this processor.
+
+    :param int dim: dimension
+    :param int num_samples: total number of points
+    :param string sample_type: ``random`` (or ``r``), ``sobol`` (or ``s``),
+        or ``halton`` (or ``h``)
+    :param int seed: shared seed, if ``None`` the ``random`` points are drawn
+        from :mod:`numpy.random` and the seed of the ``sobol`` and ``halton``
+        points is drawn from :mod:`numpy.random` on rank 0 and broadcast
+
+    :rtype: :class:`numpy.ndarray` of shape (num_samples_local, dim)
+    :returns: local points
+
+    """
+    (start, stop) = lhc.local_range(int(num_samples))
+    blocks = list(uniform_local_blocks(dim, num_samples, max(stop-start, 1),
+        sample_type, seed))
+    if len(blocks) == 0:
+        return np.empty((0, dim))
+    return blocks[0]
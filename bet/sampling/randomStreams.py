@@ -0,0 +1,127 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains reproducible, counter-based parallel random number
+streams.
+
+A stream is identified by a 64-bit key that is derived from one shared seed
+and a sequence of stream identifiers with
+:meth:`~bet.sampling.randomStreams.stream_key`, so independent streams for
+different purposes (e.g. the bins and the emulated samples of a simple
+function approximation) or different chunks are spawned from the same seed.
+The random numbers of a stream are a pure function of the key and of the
+global index of each number. Any contiguous block of rows of the global array
+of random numbers can be generated directly, each processor only generates
+the rows of its own slice, and the numbers are identical regardless of the
+number of processors.
+"""
+
+import numpy as np
+import scipy.special as special
+from bet.Comm import comm
+
+#: mask for 64-bit unsigned integers
+MASK64 = 2**64-1
+
+def mix(x):
+    """
+    Applies the SplitMix64 finalizer to each entry of ``x``. This is a
+    bijective mixing function on 64-bit unsigned integers.
+
+    :param x: integers
+    :type x: :class:`numpy.ndarray` of dtype ``uint64``
+
+    :rtype: :class:`numpy.ndarray` of dtype ``uint64``
+    :returns: mixed integers
+
+    """
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def stream_key(seed, *stream_ids):
+    """
+    Derives a 64-bit key for an independent stream from ``seed`` and a
+    sequence of stream identifiers.
+
+    :param int seed: shared seed
+    :param stream_ids: integer identifiers of the stream
+
+    :rtype: int
+    :returns: key
+
+    """
+    key = np.array([seed & MASK64], dtype=np.uint64)
+    for stream_id in stream_ids:
+        key = mix(key ^ np.uint64(stream_id & MASK64))
+    return int(key[0])
+
+def uniform(key, index):
+    """
+    Counter-based uniform random numbers in [0, 1). The same ``key`` and
+    ``index`` always produce the same number.
+
+    :param int key: stream key
+    :param index: global indices
+    :type index: :class:`numpy.ndarray` of int
+
+    :rtype: :class:`numpy.ndarray` of shape ``index.shape``
+    :returns: uniform random numbers
+
+    """
+    bits = mix(mix(np.asarray(index).astype(np.uint64) ^ np.uint64(key)))
+    return (bits >> np.uint64(11)).astype(np.float64) * 2.0**-53
+
+def shared_seed(seed=None):
+    """
+    Returns ``seed`` or, if ``seed`` is ``None``, a seed drawn from
+    :mod:`numpy.random` on rank 0 and broadcast to all processors.
+
+    :param int seed: shared seed
+
+    :rtype: int
+    :returns: shared seed
+
+    """
+    if seed is None:
+        if comm.rank == 0:
+            seed = int(np.random.randint(0, 2**31-1))
+        seed = comm.bcast(seed, root=0)
+    return seed
+
+def uniform_block(dim, start, stop, key):
+    """
+    Generates the rows ``start:stop`` of the global array of uniform random
+    numbers in (0, 1) of the stream defined by ``key``.
+
+    :param int dim: dimension
+    :param int start: first global row
+    :param int stop: one past the last global row
+    :param int key: stream key (see
+        :meth:`~bet.sampling.randomStreams.stream_key`)
+
+    :rtype: :class:`numpy.ndarray` of shape (stop-start, dim)
+    :returns: block of uniform random numbers
+
+    """
+    index = np.arange(start*dim, stop*dim, dtype=np.int64)
+    # use the centers of the intervals so that no number is 0
+    return (uniform(key, index) + 2.0**-54).reshape((stop-start, dim))
+
+def normal_block(dim, start, stop, key):
+    """
+    Generates the rows ``start:stop`` of the global array of standard normal
+    random numbers of the stream defined by ``key``.
+
+    :param int dim: dimension
+    :param int start: first global row
+    :param int stop: one past the last global row
+    :param int key: stream key (see
+        :meth:`~bet.sampling.randomStreams.stream_key`)
+
+    :rtype: :class:`numpy.ndarray` of shape (stop-start, dim)
+    :returns: block of standard normal random numbers
+
+    """
+    return special.ndtri(uniform_block(dim, start, stop, key))
@@ -5,7 +5,7 @@ This module contains functions for choosing optimal sets of QoIs to use in the
 stochastic inverse problem.  
 """
 import logging
-from itertools import combinations
+import heapq
 import numpy as np
 from scipy import stats
 from bet.Comm import comm
@@ -48,25 +48,10 @@ def calculate_avg_measure(input_set, qoi_set=None, bin_measure=None):
         raise ValueError("Measure is not defined for more outputs than inputs.\
             Try adding a qoi_set to evaluate the measure of.")
 
-    # If no measure is given, we consider how this set of QoIs will change the
-    # measure of the unit hypercube.
-    if bin_measure is None:
-        bin_measure = 1.0
-
-    # Calculate the singular values of the matrix formed by the gradient
-    # vectors of each QoI map.  This gives a set of singular values for each
-    # center.
-    singvals = np.linalg.svd(G, compute_uv=False)
-
-    # Find the average product of the singular values over each center, then use
-    # this to compute the average measure of the inverse solution.
-    avg_prod_singvals = np.mean(np.prod(singvals, axis=1))
-    if avg_prod_singvals == 0:
-        avg_measure = np.inf
-    else:
-        avg_measure = bin_measure / avg_prod_singvals
+    (avg_measure, singvals) = calculate_avg_measure_sets(G[np.newaxis],
+            bin_measure)
 
-    return avg_measure, singvals
+    return avg_measure[0], singvals[0]
 
 def calculate_avg_skewness(input_set, qoi_set=None):
     r"""
@@ -95,8 +80,63 @@ def calculate_avg_skewness(input_set, qoi_set=None):
         msg += " Try adding a qoi_set to evaluate the skewness of."
         raise ValueError(msg)
 
-    num_centers = G.shape[0]
-    output_dim = G.shape[1]
+    (hmean_skewG, skewgi) = calculate_avg_skewness_sets(G[np.newaxis])
+
+    return hmean_skewG[0], skewgi[0]
+
+def calculate_avg_measure_sets(G, bin_measure=None):
+    r"""
+    Calculate the expected measure of the inverse image of a box in the data
+    space for several sets of QoIs at once. See
+    :meth:`~bet.sensitivity.chooseQoIs.calculate_avg_measure`.
+
+    :param G: Gradient vectors of each set of QoIs at each center
+    :type G: :class:`numpy.ndarray` of shape (num_sets, num_centers,
+        output_dim, input_dim)
+    :param float bin_measure: The measure of the output_dim hyperrectangle to
+        invert into the input space
+
+    :rtype: tuple
+    :returns: (avg_measure, singvals) where avg_measure has shape (num_sets,)
+        and singvals has shape (num_sets, num_centers, output_dim)
+
+    """
+    # If no measure is given, we consider how this set of QoIs will change the
+    # measure of the unit hypercube.
+    if bin_measure is None:
+        bin_measure = 1.0
+
+    # Calculate the singular values of the matrix formed by the gradient
+    # vectors of each QoI map.  This gives a set of singular values for each
+    # center.
+    singvals = np.linalg.svd(G, compute_uv=False)
+
+    # Find the average product of the singular values over each center, then use
+    # this to compute the average measure of the inverse solution.
+    avg_prod_singvals = np.mean(np.prod(singvals, axis=2), axis=1)
+    avg_measure = np.empty(avg_prod_singvals.shape)
+    zero = avg_prod_singvals == 0
+    avg_measure[zero] = np.inf
+    avg_measure[~zero] = bin_measure / avg_prod_singvals[~zero]
+
+    return avg_measure, singvals
+
+def calculate_avg_skewness_sets(G):
+    r"""
+    Calculate the average skewness of the arrays formed by the gradient
+    vectors of each QoI map at each center for several sets of QoIs at once.
+    See :meth:`~bet.sensitivity.chooseQoIs.calculate_avg_skewness`.
+
+    :param G: Gradient vectors of each set of QoIs at each center
+    :type G: :class:`numpy.ndarray` of shape (num_sets, num_centers,
+        output_dim, input_dim)
+
+    :rtype: tuple
+    :returns: (hmean_skewG, skewgi) where hmean_skewG has shape (num_sets,)
+        and skewgi has shape (num_sets, num_centers, output_dim)
+
+    """
+    (num_sets, num_centers, output_dim) = G.shape[:3]
 
     # Calculate the singular values of the matrix formed by the gradient
     # vectors of each QoI map.  This gives a set of singular values for each
@@ -104,24 +144,25 @@ def calculate_avg_skewness(input_set, qoi_set=None):
     singvals = np.linalg.svd(G, compute_uv=False)
 
     # The measure of the parallelepipeds defined by the rows of each Jacobian
-    muG = np.tile(np.prod(singvals, axis=1), [output_dim, 1]).transpose()
+    muG = np.repeat(np.prod(singvals, axis=2)[:, :, np.newaxis], output_dim,
+            axis=2)
 
     # Calculate the measure of the parallelepipeds defined by the rows of each
     # Jacobian if we remove the i'th row.
-    muGi = np.zeros([num_centers, output_dim])
-    for i in xrange(G.shape[1]):
-        muGi[:, i] = np.prod(np.linalg.svd(np.delete(G, i, axis=1),
-            compute_uv=False), axis=1)
+    muGi = np.zeros([num_sets, num_centers, output_dim])
+    for i in xrange(output_dim):
+        muGi[:, :, i] = np.prod(np.linalg.svd(np.delete(G, i, axis=2),
+            compute_uv=False), axis=2)
 
     # Find the norm of each gradient vector
-    normgi = np.linalg.norm(G, axis=2)
+    normgi = np.linalg.norm(G, axis=3)
 
     # Find the norm of the new vector, giperp, that is perpendicular to the span
     # of the other vectors and defines a parallelepiped of the same measure.
     normgiperp = muG / muGi
 
     # We now calculate the local skewness
-    skewgi = np.zeros([num_centers, output_dim])
+    skewgi = np.zeros([num_sets, num_centers, output_dim])
 
     # The local skewness is calculated for nonzero giperp
     skewgi[normgiperp != 0] = normgi[normgiperp != 0] / \
@@ -136,14 +177,66 @@ def calculate_avg_skewness(input_set, qoi_set=None):
     skewgi[normgiperp == np.inf] = np.inf
 
     # The local skewness is the max skewness of each vector relative the rest
-    skewG = np.max(skewgi, axis=1)
+    skewG = np.max(skewgi, axis=2)
     skewG[np.isnan(skewG)] = np.inf
 
     # We may have values equal to infinity, so we consider the harmonic mean.
-    hmean_skewG = stats.hmean(skewG)
+    hmean_skewG = stats.hmean(skewG, axis=1)
 
     return hmean_skewG, skewgi
 
+def num_combinations(num_items, num_choose):
+    """
+    Computes the number of combinations of ``num_choose`` items out of
+    ``num_items`` exactly.
+
+    :param int num_items: number of items
+    :param int num_choose: number of items in each combination
+
+    :rtype: int
+    :returns: ``num_items`` choose ``num_choose``
+
+    """
+    if num_choose < 0 or num_choose > num_items:
+        return 0
+    num_choose = min(num_choose, num_items - num_choose)
+    count = 1
+    for i in xrange(num_choose):
+        count = count * (num_items - i) / (i + 1)
+    return count
+
+def unrank_combinations(num_items, num_choose, start, stop):
+    """
+    Finds the combinations of ``num_choose`` items out of ``0, ...,
+    num_items-1`` with lexicographic ranks ``start, ..., stop-1``, i.e. rows
+    ``start:stop`` of ``list(combinations(range(num_items), num_choose))``
+    without generating the other rows.
+
+    :param int num_items: number of items
+    :param int num_choose: number of items in each combination
+    :param int start: rank of the first combination
+    :param int stop: one past the rank of the last combination
+
+    :rtype: :class:`numpy.ndarray` of shape (stop-start, num_choose)
+    :returns: combinations
+
+    """
+    ranks = np.arange(start, stop, dtype=np.int64)
+    combs = np.empty((ranks.shape[0], num_choose), dtype=np.int64)
+    first = np.zeros(ranks.shape, dtype=np.int64)
+    for j in xrange(num_choose):
+        remaining = num_choose - j - 1
+        # offsets[c] is the number of combinations whose j-th item is less
+        # than c, the j-th item can be at most num_items - remaining - 1
+        counts = [num_combinations(num_items - c - 1, remaining) for c in \
+                xrange(num_items - remaining - 1)]
+        offsets = np.cumsum([0] + counts).astype(np.int64)
+        combs[:, j] = np.searchsorted(offsets, ranks + offsets[first],
+                side='right') - 1
+        ranks = ranks - (offsets[combs[:, j]] - offsets[first])
+        first = combs[:, j] + 1
+    return combs
+
 def calculate_avg_condnum(input_set, qoi_set=None):
     r"""
     Given gradient vectors at some points (centers) in the input space and
@@ -189,7 +282,7 @@ def calculate_avg_condnum(input_set, qoi_set=None):
 
 def chooseOptQoIs(input_set, qoiIndices=None, num_qois_return=None,
         num_optsets_return=None, inner_prod_tol=1.0, measure=False,
-        remove_zeros=True):
+        remove_zeros=True, block_size=1000):
     r"""
     Given gradient vectors at some points (centers) in the parameter space, a
     set of QoIs to choose from, and the number of desired QoIs to return, this
@@ -216,6 +309,7 @@ def chooseOptQoIs(input_set, qoiIndices=None, num_qois_return=None,
         to determine optimal QoIs, else use ``calculate_avg_skewness``
     :param boolean remove_zeros: If True, ``find_unique_vecs`` will remove any
         QoIs that have a zero gradient
+    :param int block_size: Number of combinations of QoIs to evaluate at once
     
     :rtype: `np.ndarray` of shape (num_optsets_returned, num_qois_returned + 1)
     :returns: measure_skewness_indices_mat
@@ -224,13 +318,13 @@ def chooseOptQoIs(input_set, qoiIndices=None, num_qois_return=None,
 
     (measure_skewness_indices_mat, _) = chooseOptQoIs_verbose(input_set,
         qoiIndices, num_qois_return, num_optsets_return, inner_prod_tol,
-        measure, remove_zeros)
+        measure, remove_zeros, block_size)
 
     return measure_skewness_indices_mat
 
 def chooseOptQoIs_verbose(input_set, qoiIndices=None, num_qois_return=None,
             num_optsets_return=None, inner_prod_tol=1.0, measure=False,
-            remove_zeros=True):
+            remove_zeros=True, block_size=1000):
     r"""
     Given gradient vectors at some points (centers) in the parameter space, a
     set of QoIs to choose from, and the number of desired QoIs to return, this
@@ -257,6 +351,7 @@ def chooseOptQoIs_verbose(input_set, qoiIndices=None, num_qois_return=None,
         to determine optimal QoIs, else use ``calculate_avg_skewness``
     :param boolean remove_zeros: If True, ``find_unique_vecs`` will remove any
         QoIs that have a zero gradient
+    :param int block_size: Number of combinations of QoIs to evaluate at once
     
     :rtype: `np.ndarray` of shape (num_optsets_returned, num_qois_returned + 1)
     :returns: measure_skewness_indices_mat
@@ -280,41 +375,55 @@ def chooseOptQoIs_verbose(input_set, qoiIndices=None, num_qois_return=None,
     qoiIndices = find_unique_vecs(input_set, inner_prod_tol, qoiIndices,
         remove_zeros)
 
-    # Find all posible combinations of QoIs
+    # The combinations of QoIs are enumerated lexicographically in blocks of
+    # block_size and the blocks are distributed round robin among the
+    # processors, so the list of all combinations is never stored.
+    qoiIndices = np.array(list(qoiIndices))
+    num_combs = num_combinations(len(qoiIndices), num_qois_return)
     if comm.rank == 0:
-        qoi_combs = np.array(list(combinations(list(qoiIndices),
-                        num_qois_return)))
-        logging.info('Possible sets of QoIs : {}'.format(qoi_combs.shape[0]))
-        qoi_combs = np.array_split(qoi_combs, comm.size)
-    else:
-        qoi_combs = None
-
-    # Scatter them throughout the processors
-    qoi_combs = comm.scatter(qoi_combs, root=0)
+        logging.info('Possible sets of QoIs : {}'.format(num_combs))
+    num_blocks = (num_combs + block_size - 1) / block_size
+
+    # For each block of combinations, compute the skewness (measure) of all of
+    # the combinations at once and keep the sets that have the smallest
+    # skewness in a heap of (-measskew, -rank, singvals, qoi_set)
+    best_heap = []
+    for block in xrange(comm.rank, num_blocks, comm.size):
+        start = block * block_size
+        stop = min(num_combs, start + block_size)
+        qoi_combs = qoiIndices[unrank_combinations(len(qoiIndices),
+            num_qois_return, start, stop)]
+        G_sets = G[:, qoi_combs, :].transpose(1, 0, 2, 3)
+        if measure == False:
+            (current_measskew, singvals) = calculate_avg_skewness_sets(G_sets)
+        else:
+            (current_measskew, singvals) = calculate_avg_measure_sets(G_sets)
+
+        for qoi_set in np.argsort(current_measskew, kind='mergesort')[\
+                :num_optsets_return]:
+            # Sets with an infinite skewness (measure) are never stored, the
+            # rows that are not filled stay (inf, 0, ..., 0)
+            if not current_measskew[qoi_set] < np.inf:
+                break
+            item = (-current_measskew[qoi_set], -(start + qoi_set),
+                    singvals[qoi_set], qoi_combs[qoi_set])
+            if len(best_heap) < num_optsets_return:
+                heapq.heappush(best_heap, item)
+            elif item[:2] > best_heap[0][:2]:
+                heapq.heapreplace(best_heap, item)
+            else:
+                break
 
-    # For each combination, check the skewness and keep the sets
-    # that have the smallest skewness
+    # Store the best sets in order
     measure_skewness_indices_mat = np.zeros([num_optsets_return,
         num_qois_return + 1])
     measure_skewness_indices_mat[:, 0] = np.inf
     optsingvals_tensor = np.zeros([num_centers, num_qois_return,
         num_optsets_return])
-    for qoi_set in xrange(len(qoi_combs)):
-        if measure == False:
-            (current_measskew, singvals) = calculate_avg_skewness(input_set,
-                qoi_combs[qoi_set])
-        else:
-            (current_measskew, singvals) = calculate_avg_measure(input_set,
-                qoi_combs[qoi_set])
-
-        if current_measskew < measure_skewness_indices_mat[-1, 0]:
-            measure_skewness_indices_mat[-1, :] = np.append(np.array(\
-                    [current_measskew]), qoi_combs[qoi_set])
-            order = measure_skewness_indices_mat[:, 0].argsort()
-            measure_skewness_indices_mat = measure_skewness_indices_mat[order]
-
-            optsingvals_tensor[:, :, -1] = singvals
-            optsingvals_tensor = optsingvals_tensor[:, :, order]
+    for i, item in enumerate(sorted(best_heap, reverse=True)):
+        measure_skewness_indices_mat[i, 0] = -item[0]
+        measure_skewness_indices_mat[i, 1:] = item[3]
+        optsingvals_tensor[:, :, i] = item[2]
 
     # Wait for all processes to get to this point
     comm.Barrier()
@@ -346,7 +455,7 @@ def chooseOptQoIs_verbose(input_set, qoiIndices=None, num_qois_return=None,
     return (measure_skewness_indices_mat, optsingvals_tensor)
 
 def find_unique_vecs(input_set, inner_prod_tol, qoiIndices=None,
-        remove_zeros=True):
+        remove_zeros=True, block_size=1000):
     r"""
     Given gradient vectors at each center in the parameter space, sort throught
     them and remove any QoI that has a zero vector at any center, then remove
@@ -364,6 +473,8 @@ def find_unique_vecs(input_set, inner_prod_tol, qoiIndices=None,
     :param boolean remove_zeros: If True, ``find_unique_vecs`` will remove any
         QoIs that have a zero gradient vector at atleast one point in
         :math:`\Lambda`
+    :param int block_size: Number of rows of the matrix of average inner
+        products to compute at once
     
     :rtype: `np.ndarray` of shape (num_unique_vecs, 1)
     :returns: unique_vecs
@@ -383,10 +494,7 @@ def find_unique_vecs(input_set, inner_prod_tol, qoiIndices=None,
 
     # Remove any QoI that has a zero vector at atleast one of the centers.
     if remove_zeros:
-        indz = np.array([])
-        for i in xrange(norm_G.shape[1]):
-            if np.sum(norm_G[:, i] == 0) > 0:
-                indz = np.append(indz, i)
+        indz = np.nonzero(np.any(norm_G == 0, axis=0))[0]
     else:
         indz = []
 
@@ -403,24 +511,24 @@ def find_unique_vecs(input_set, inner_prod_tol, qoiIndices=None,
         logging.info('Possible QoIs : {}'.format(len(qoiIndices)-len(indz)))
     qoiIndices = list(set(qoiIndices) - set(indz))
 
-    # Find all num_qois choose 2 pairs of QoIs
-    qoi_combs = np.array(list(combinations(list(qoiIndices), 2)))
-
-    # For each pair, check the angle between the vectors and throw out the
-    # second QoI if the angle is below some tolerance.  At this point all the
-    # vectors are normalized, so the inner product will be between -1 and 1.
-    repeat_vec = np.array([])
-    for qoi_set in xrange(len(qoi_combs)):
-        curr_set = qoi_combs[qoi_set]
-
-        # If neither of the current QoIs are in the repeat_vec, test them
-        if curr_set[0] not in repeat_vec and curr_set[1] not in repeat_vec:
-            curr_inner_prod = np.sum(G[:, curr_set[0], :] * \
-                G[:, curr_set[1], :]) / G.shape[0]
-
-            # If the innerprod>tol, throw out the second QoI
-            if np.abs(curr_inner_prod) > inner_prod_tol:
-                repeat_vec = np.append(repeat_vec, qoi_combs[qoi_set, -1])
+    # For each pair of QoIs (in the order of combinations(qoiIndices, 2)),
+    # check the angle between the vectors and throw out the second QoI if the
+    # angle is below some tolerance unless either QoI has already been thrown
+    # out.  At this point all the vectors are normalized, so the inner product
+    # will be between -1 and 1.  The average inner products of the pairs are
+    # computed block_size rows at a time.
+    G = G[:, qoiIndices, :]
+    num_qois = len(qoiIndices)
+    repeat = np.zeros((num_qois,), dtype=np.bool)
+    for start in xrange(0, num_qois, block_size):
+        stop = min(num_qois, start + block_size)
+        inner_prods = np.einsum('ijk,ilk->jl', G[:, start:stop, :],
+            G[:, start:, :]) / G.shape[0]
+        for i in xrange(start, stop):
+            if not repeat[i]:
+                repeat[i+1:] = np.logical_or(repeat[i+1:],
+                    np.abs(inner_prods[i-start, i+1-start:]) > inner_prod_tol)
+    repeat_vec = np.array(qoiIndices)[repeat]
 
     unique_vecs = np.array(list(set(qoiIndices) - set(repeat_vec)))
     if comm.rank == 0:
@@ -428,6 +536,160 @@ def find_unique_vecs(input_set, inner_prod_tol, qoiIndices=None,
 
     return unique_vecs
 
+def extend_gram_factor(inv_factor, G_set, G_new):
+    r"""
+    Given the inverse :math:`L^{-1}` of the lower triangular Cholesky factor
+    of the Gram matrix :math:`G G^T` of a set of gradient vectors at each
+    center, compute the new row of the Cholesky factor and of its inverse
+    when a single gradient vector :math:`g` is appended to the set. The new
+    row of the Cholesky factor is :math:`[l^T, p]` where :math:`l = L^{-1} G
+    g` and :math:`p = \|g - G^T L^{-T} l\|`, and the new row of its inverse is
+    :math:`[-l^T L^{-1}/p, 1/p]`. The pivot :math:`p` is the norm of the
+    component of :math:`g` perpendicular to the span of the set. Each of the
+    ``num_new`` vectors in ``G_new`` is appended separately.
+
+    :param inv_factor: Inverse Cholesky factors at each center
+    :type inv_factor: :class:`numpy.ndarray` of shape (num_centers, n, n)
+    :param G_set: Gradient vectors of the set at each center
+    :type G_set: :class:`numpy.ndarray` of shape (num_centers, n, input_dim)
+    :param G_new: Gradient vectors to append at each center
+    :type G_new: :class:`numpy.ndarray` of shape (num_centers, num_new,
+        input_dim)
+
+    :rtype: tuple
+    :returns: (new_rows, pivots) where new_rows has shape (num_centers,
+        num_new, n) and pivots has shape (num_centers, num_new). Pivots of
+        vectors that are not linearly independent of the set are zero.
+
+    """
+    # The rows of basis are an orthonormal basis for the span of the set
+    basis = np.einsum('ijk,ikl->ijl', inv_factor, G_set)
+    perp = np.einsum('ijk,ilk->ijl', basis, G_new)
+    # Compute the pivots from the perpendicular components rather than
+    # g^T g - l^T l to avoid cancellation
+    pivots = np.linalg.norm(G_new - np.einsum('ijl,ijk->ilk', perp, basis),
+            axis=2)
+    pivots[~np.isfinite(pivots)] = 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        new_rows = -np.einsum('ijl,ijk->ilk', perp, inv_factor) / \
+                pivots[:, :, np.newaxis]
+    return new_rows, pivots
+
+def gram_factor(G_set):
+    r"""
+    Compute the inverse of the lower triangular Cholesky factor of the Gram
+    matrix of a set of gradient vectors at each center by appending the
+    vectors one at a time with
+    :meth:`~bet.sensitivity.chooseQoIs.extend_gram_factor`.
+
+    :param G_set: Gradient vectors of the set at each center
+    :type G_set: :class:`numpy.ndarray` of shape (num_centers, n, input_dim)
+
+    :rtype: tuple
+    :returns: (inv_factor, pivots) where inv_factor has shape (num_centers,
+        n, n) and pivots, the diagonal of the Cholesky factor, has shape
+        (num_centers, n). The product of the pivots is the product of the
+        singular values of the set.
+
+    """
+    (num_centers, num_vecs) = G_set.shape[:2]
+    inv_factor = np.zeros((num_centers, num_vecs, num_vecs))
+    pivots = np.zeros((num_centers, num_vecs))
+    for i in xrange(num_vecs):
+        (new_rows, new_pivots) = extend_gram_factor(inv_factor[:, :i, :i],
+                G_set[:, :i, :], G_set[:, i:i+1, :])
+        inv_factor[:, i, :i] = new_rows[:, 0, :]
+        with np.errstate(divide='ignore'):
+            inv_factor[:, i, i] = 1.0 / new_pivots[:, 0]
+        pivots[:, i] = new_pivots[:, 0]
+    return inv_factor, pivots
+
+def calculate_avg_measure_extended(pivots, new_pivots, bin_measure=None):
+    r"""
+    Calculate the expected measure of the inverse image of a box in the data
+    space for each set formed by appending one QoI to a set of QoIs. See
+    :meth:`~bet.sensitivity.chooseQoIs.calculate_avg_measure`.
+
+    :param pivots: Diagonal of the Cholesky factors of the set
+    :type pivots: :class:`numpy.ndarray` of shape (num_centers, n)
+    :param new_pivots: Pivots of the appended QoIs from
+        :meth:`~bet.sensitivity.chooseQoIs.extend_gram_factor`
+    :type new_pivots: :class:`numpy.ndarray` of shape (num_centers, num_new)
+    :param float bin_measure: The measure of the output_dim hyperrectangle to
+        invert into the input space
+
+    :rtype: :class:`numpy.ndarray` of shape (num_new,)
+    :returns: avg_measure
+
+    """
+    if bin_measure is None:
+        bin_measure = 1.0
+
+    # The product of the singular values is the product of the pivots
+    prod_singvals = np.prod(pivots, axis=1)[:, np.newaxis] * new_pivots
+    avg_prod_singvals = np.mean(prod_singvals, axis=0)
+    avg_measure = np.empty(avg_prod_singvals.shape)
+    zero = avg_prod_singvals == 0
+    avg_measure[zero] = np.inf
+    avg_measure[~zero] = bin_measure / avg_prod_singvals[~zero]
+
+    return avg_measure
+
+def calculate_avg_skewness_extended(G_set, G_new, inv_factor, pivots,
+        new_rows, new_pivots):
+    r"""
+    Calculate the average skewness for each set formed by appending one QoI to
+    a set of QoIs. See :meth:`~bet.sensitivity.chooseQoIs.calculate_avg_skewness`.
+    The norm of the component of :math:`g_i` perpendicular to the other
+    vectors is :math:`1/\sqrt{(G G^T)^{-1}_{ii}}` and :math:`(G G^T)^{-1}_{ii}`
+    is the squared norm of the :math:`i`-th column of the inverse Cholesky
+    factor, so no leave-one-out factorizations are needed.
+
+    :param G_set: Gradient vectors of the set at each center
+    :type G_set: :class:`numpy.ndarray` of shape (num_centers, n, input_dim)
+    :param G_new: Gradient vectors to append at each center
+    :type G_new: :class:`numpy.ndarray` of shape (num_centers, num_new,
+        input_dim)
+    :param inv_factor: Inverse Cholesky factors of the set
+    :type inv_factor: :class:`numpy.ndarray` of shape (num_centers, n, n)
+    :param pivots: Diagonal of the Cholesky factors of the set
+    :type pivots: :class:`numpy.ndarray` of shape (num_centers, n)
+    :param new_rows: New rows of the inverse Cholesky factors from
+        :meth:`~bet.sensitivity.chooseQoIs.extend_gram_factor`
+    :type new_rows: :class:`numpy.ndarray` of shape (num_centers, num_new, n)
+    :param new_pivots: Pivots of the appended QoIs from
+        :meth:`~bet.sensitivity.chooseQoIs.extend_gram_factor`
+    :type new_pivots: :class:`numpy.ndarray` of shape (num_centers, num_new)
+
+    :rtype: :class:`numpy.ndarray` of shape (num_new,)
+    :returns: hmean_skewG
+
+    """
+    num_new = G_new.shape[1]
+    prod_singvals = np.prod(pivots, axis=1)[:, np.newaxis] * new_pivots
+
+    # The diagonal of the inverse of the Gram matrix of each new set
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv_gram_diag = np.concatenate([np.sum(inv_factor**2,
+            axis=1)[:, np.newaxis, :] + new_rows**2, 1.0 / \
+            new_pivots[:, :, np.newaxis]**2], axis=2)
+        normgi = np.concatenate([np.repeat(np.linalg.norm(G_set,
+            axis=2)[:, np.newaxis, :], num_new, axis=1),
+            np.linalg.norm(G_new, axis=2)[:, :, np.newaxis]], axis=2)
+        skewgi = normgi * np.sqrt(inv_gram_diag)
+
+    # If the vectors are not GD the skewness is infinity.
+    skewgi[prod_singvals == 0] = np.inf
+
+    # The local skewness is the max skewness of each vector relative the rest
+    skewG = np.max(skewgi, axis=2)
+    skewG[np.isnan(skewG)] = np.inf
+
+    # We may have values equal to infinity, so we consider the harmonic mean.
+    hmean_skewG = stats.hmean(skewG, axis=0)
+
+    return hmean_skewG
+
 def find_good_sets(input_set, good_sets_prev, unique_indices,
         num_optsets_return, measskew_tol, measure):
     r"""
@@ -463,70 +725,84 @@ def find_good_sets(input_set, good_sets_prev, unique_indices,
     if input_set._jacobians is None:
         raise ValueError("You must have jacobians to use this method.")
 
-    num_centers = input_set._jacobians.shape[0]
+    G = input_set._jacobians
+    num_centers = G.shape[0]
     num_qois_return = good_sets_prev.shape[1] + 1
+    unique_indices = np.sort(np.array(list(unique_indices), dtype=int))
+    if num_qois_return > G.shape[2]:
+        msg = "Measure and skewness are not defined for more outputs than"
+        msg += " inputs."
+        raise ValueError(msg)
     comm.Barrier()
 
-    # Initialize best sets and set all skewness values large
-    best_sets = np.zeros([num_optsets_return, num_qois_return + 1])
-    best_sets[:, 0] = np.inf
-    good_sets = np.zeros([1, num_qois_return])
-    count_qois = 0
-    optsingvals_tensor = np.zeros([num_centers, num_qois_return,
-        num_optsets_return])
-
     # For each good set of size (n - 1), find the possible sets of size n and
-    # compute the average skewness of each
+    # compute the average measure(skewness) of each.  The good sets of size
+    # (n - 1) are distributed among the processors.  The Gram matrix of each
+    # good set of size (n - 1) is factored once and the factors are extended
+    # by each QoI so the sets of size n do not need to be factored.  The best
+    # sets are kept in a heap of (-measskew, -i, -j, qoi_set).
+    good_sets = [np.zeros([0, num_qois_return], dtype=int)]
+    best_heap = []
     count_qois = 0
-    for i in xrange(good_sets_prev.shape[0]):
+    for i in xrange(comm.rank, good_sets_prev.shape[0], comm.size):
+        # Choose only the QoI indices > min_ind so we do not repeat sets
         min_ind = np.max(good_sets_prev[i, :])
-        # Find all possible combinations of QoIs that include this set of
-        # (n - 1)
-        if comm.rank == 0:
-            inds_notin_set = util.fix_dimensions_vector_2darray(list(set(\
-                unique_indices) - set(good_sets_prev[i, :])))
-
-            # Choose only the QoI indices > min_ind so we do not repeat sets
-            inds_notin_set = util.fix_dimensions_vector_2darray(inds_notin_set[\
-                inds_notin_set > min_ind])
-            qoi_combs = util.fix_dimensions_vector_2darray(np.append(np.tile(\
-                good_sets_prev[i, :], [inds_notin_set.shape[0], 1]),
-                inds_notin_set, axis=1))
-            qoi_combs = np.array_split(qoi_combs, comm.size)
+        inds_notin_set = unique_indices[unique_indices > min_ind]
+        if inds_notin_set.shape[0] == 0:
+            continue
+        count_qois += inds_notin_set.shape[0]
+        qoi_combs = np.append(np.tile(good_sets_prev[i, :],
+            [inds_notin_set.shape[0], 1]), inds_notin_set[:, np.newaxis],
+            axis=1)
+
+        G_set = G[:, good_sets_prev[i, :], :]
+        G_new = G[:, inds_notin_set, :]
+        (inv_factor, pivots) = gram_factor(G_set)
+        (new_rows, new_pivots) = extend_gram_factor(inv_factor, G_set, G_new)
+        if measure is False:
+            current_measskew = calculate_avg_skewness_extended(G_set, G_new,
+                    inv_factor, pivots, new_rows, new_pivots)
         else:
-            qoi_combs = None
-
-        # Scatter them throughout the processors
-        qoi_combs = comm.scatter(qoi_combs, root=0)
-
-        # For each combination, compute the average measure(skewness) and add
-        # the set to good_sets if it is less than measskew_tol
-        for qoi_set in xrange(len(qoi_combs)):
-            count_qois += 1
-            curr_set = util.fix_dimensions_vector_2darray(qoi_combs[qoi_set])\
-                .transpose()
-            if measure is False:
-                (current_measskew, singvals) = calculate_avg_skewness(input_set,
-                    qoi_combs[qoi_set])
+            current_measskew = calculate_avg_measure_extended(pivots,
+                    new_pivots)
+
+        # If its a good set, add it to good_sets
+        good = current_measskew < measskew_tol
+        good_sets.append(qoi_combs[good])
+
+        # If the average skewness is less than the maxskewness in our
+        # best_sets, add it to best_sets
+        for j in np.argsort(current_measskew, kind='mergesort')[\
+                :num_optsets_return]:
+            item = (-current_measskew[j], -i, -j, qoi_combs[j])
+            if not good[j]:
+                break
+            elif len(best_heap) < num_optsets_return:
+                heapq.heappush(best_heap, item)
+            elif item[:3] > best_heap[0][:3]:
+                heapq.heapreplace(best_heap, item)
             else:
-                (current_measskew, singvals) = calculate_avg_measure(input_set,
-                    qoi_combs[qoi_set])
-
-            # If its a good set, add it to good_sets
-            if current_measskew < measskew_tol:
-                good_sets = np.append(good_sets, curr_set, axis=0)
-
-                # If the average skewness is less than the maxskewness
-                # in our best_sets, add it to best_sets
-                if current_measskew < best_sets[-1, 0]:
-                    best_sets[-1, :] = np.append(np.array([current_measskew]),
-                        qoi_combs[qoi_set])
-                    order = best_sets[:, 0].argsort()
-                    best_sets = best_sets[order]
+                break
+    good_sets = np.concatenate(good_sets)
 
-                    # Store the corresponding singular values
-                    optsingvals_tensor[:, :, -1] = singvals
-                    optsingvals_tensor = optsingvals_tensor[:, :, order]
+    # Recompute the measure(skewness) and the singular values of the best
+    # sets directly
+    best_sets = np.zeros([num_optsets_return, num_qois_return + 1])
+    best_sets[:, 0] = np.inf
+    optsingvals_tensor = np.zeros([num_centers, num_qois_return,
+        num_optsets_return])
+    for k, item in enumerate(sorted(best_heap, reverse=True)):
+        if measure is False:
+            (current_measskew, singvals) = calculate_avg_skewness(input_set,
+                item[3])
+        else:
+            (current_measskew, singvals) = calculate_avg_measure(input_set,
+                item[3])
+        best_sets[k, :] = np.append(np.array([current_measskew]), item[3])
+        optsingvals_tensor[:, :, k] = singvals
+    order = best_sets[:, 0].argsort(kind='mergesort')
+    best_sets = best_sets[order]
+    optsingvals_tensor = optsingvals_tensor[:, :, order]
 
     # Wait for all processes to get to this point
     comm.Barrier()
@@ -548,21 +824,18 @@ def find_good_sets(input_set, good_sets_prev, unique_indices,
         best_sets = best_sets[:num_optsets_return, :]
 
         # Organize the good sets
-        good_sets_new = np.zeros([1, num_qois_return])
-        for each in good_sets:
-            good_sets_new = np.append(good_sets_new, each[1:], axis=0)
-        good_sets = good_sets_new
+        good_sets = np.concatenate(good_sets)
 
         logging.info('Possible sets of QoIs of size {} : {}'.format(\
                 good_sets.shape[1], np.sum(count_qois)))
         logging.info('Good sets of QoIs of size {} : {}'.format(\
-                good_sets.shape[1], good_sets.shape[0] - 1))
+                good_sets.shape[1], good_sets.shape[0]))
 
     comm.Barrier()
     best_sets = comm.bcast(best_sets, root=0)
     good_sets = comm.bcast(good_sets, root=0)
 
-    return (good_sets[1:].astype(int), best_sets, optsingvals_tensor)
+    return (good_sets.astype(int), best_sets, optsingvals_tensor)
 
 def chooseOptQoIs_large(input_set, qoiIndices=None, max_qois_return=None,
         num_optsets_return=None, inner_prod_tol=None, measskew_tol=None,
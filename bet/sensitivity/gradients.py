@@ -1,7 +1,8 @@
 # Copyright (C) 2014-2016 The BET Development Team
 
 """
-This module contains functions for approximating jacobians of QoI maps.
+This module contains functions for approximating jacobians and Hessians of QoI
+maps.
 All methods that cluster points around centers are written to return the
 input_set._values in the following order : CENTERS, FOLLOWED BY THE CLUSTER
 AROUND THE FIRST CENTER, THEN THE CLUSTER AROUND THE SECOND CENTER AND SO ON.
@@ -44,38 +45,41 @@ def sample_lp_ball(input_set, num_close, radius, p_num=2):
     cluster_set = sample.sample_set(input_dim)
     if input_domain is not None:
         cluster_set.set_domain(input_domain)
-    cluster_set.set_values(centers)
 
-    for i in xrange(num_centers):
-        in_bounds = 0
-        inflate = 1.0
-        while in_bounds < num_close:
-            # sample uniformly
-            new_cluster = lpsam.Lp_generalized_uniform(input_dim,
-                    num_close*inflate, p_num, radius, centers[i, :])
-            # check bounds
-            if input_domain is not None:
-                cluster_set.update_bounds(num_close*inflate)
-                left = np.all(np.greater_equal(new_cluster, cluster_set._left),
-                    axis=1)
-                right = np.all(np.less_equal(new_cluster, cluster_set._right),
-                    axis=1)
-                inside = np.logical_and(left, right)
-                in_bounds = np.sum(inside)
-                new_cluster = new_cluster[inside, :]
-                # increase inflate
-                inflate *= 10.0
-            else:
-                in_bounds = num_close
-
-        if in_bounds > num_close:
-            new_cluster = new_cluster[:num_close, :]
-        cluster_set.append_values(new_cluster)
-
-    # reset bounds
-    cluster_set._left = None
-    cluster_set._right = None
-    cluster_set._width = None
+    # the centers followed by the cluster of each center
+    values = np.empty(((num_close+1)*num_centers, input_dim))
+    values[:num_centers] = centers
+    clusters = values[num_centers:].reshape((num_centers, num_close,
+        input_dim))
+    num_found = np.zeros((num_centers,), dtype=np.int)
+    deficient = np.arange(num_centers)
+    inflate = 1
+    while len(deficient) > 0:
+        # sample uniformly for all of the deficient centers at once
+        num_draw = (num_close - np.min(num_found[deficient]))*inflate
+        new_clusters = lpsam.Lp_generalized_uniform(input_dim,
+                len(deficient)*num_draw, p_num, radius)
+        new_clusters = new_clusters.reshape((len(deficient), num_draw,
+            input_dim)) + centers[deficient, np.newaxis, :]
+        # check bounds
+        if input_domain is not None:
+            inside = np.all(np.logical_and(np.greater_equal(new_clusters,
+                input_domain[:, 0]), np.less_equal(new_clusters,
+                    input_domain[:, 1])), axis=2)
+        else:
+            inside = np.ones(new_clusters.shape[:2], dtype=np.bool)
+        # accept points that are inside until each cluster is full
+        slot = np.cumsum(inside, axis=1) - 1 + num_found[deficient,
+                np.newaxis]
+        accept = np.logical_and(inside, slot < num_close)
+        (rows, cols) = np.nonzero(accept)
+        clusters[deficient[rows], slot[rows, cols]] = new_clusters[rows, cols]
+        num_found[deficient] += np.sum(accept, axis=1)
+        deficient = deficient[num_found[deficient] < num_close]
+        # increase inflate
+        inflate *= 10
+
+    cluster_set.set_values(values)
     return cluster_set
 
 
@@ -205,6 +209,143 @@ def pick_cfd_points(input_set, radii_vec):
     cluster_set.append_values(samples)
     return cluster_set
 
+def pick_hessian_points(input_set, radii_vec):
+    r"""
+    Pick input_dim*(input_dim+1) points, for each center, for a centered
+    finite difference Hessian approximation.  For each center the cluster
+    contains the 2*input_dim points of the CFD stencil (see
+    :meth:`~bet.sensitivity.gradients.pick_cfd_points`) followed by the
+    input_dim*(input_dim-1)/2 points translated by the radii along two axes
+    in the positive directions and the input_dim*(input_dim-1)/2 points
+    translated in the negative directions. The points are returned in the
+    order: centers, followed by the cluster around the first center, then the
+    cluster around the second center and so on.
+    
+    :param input_set: The input sample set.  Make sure the attribute _values is
+        not None
+    :type input_set: :class:`~bet.sample.sample_set`
+    :param radii_vec: The radius of the stencil, along each axis
+    :type radii_vec: :class:`numpy.ndarray` of shape (input_dim,)
+    
+    :rtype: :class:`~bet.sample.sample_set`
+    :returns: Centers and clusters of samples near each center (values are 
+        :class:`numpy.ndarray` of shape
+        ((``input_dim*(input_dim+1)+1``)*``num_centers``, ``input_dim``))
+    
+    """
+    if input_set._values is None:
+        raise ValueError("You must have values to use this method.")
+    input_dim = input_set.get_dim()
+    centers = input_set.get_values()
+    num_centers = centers.shape[0]
+    radii_vec = util.fix_dimensions_vector(radii_vec)
+
+    # Contstruct a [input_dim*(input_dim+1), input_dim] array that translates
+    # a center to its stencil
+    ident = np.eye(input_dim) * radii_vec
+    (j, k) = np.triu_indices(input_dim, 1)
+    pairs = ident[j] + ident[k]
+    translate = np.concatenate((ident, -ident, pairs, -pairs), axis=0)
+    samples = np.repeat(centers, translate.shape[0], axis=0)
+    samples = samples + np.tile(translate, (num_centers, 1))
+
+    cluster_set = sample.sample_set(input_dim)
+    if input_set.get_domain() is not None:
+        cluster_set.set_domain(input_set.get_domain())
+    cluster_set.set_values(centers)
+    cluster_set.append_values(samples)
+    return cluster_set
+
+def calculate_hessians_cfd(cluster_discretization):
+    r"""
+    Approximate the Hessians of each QoI map at ``num_centers,
+    centers.shape[0]`` points in the parameter space with second order
+    centered finite differences.  The diagonal entries are
+
+    .. math::
+
+        \frac{Q(x+h_j e_j) - 2 Q(x) + Q(x-h_j e_j)}{h_j^2}
+
+    and the off-diagonal entries are
+
+    .. math::
+
+        \frac{Q(x+h_j e_j+h_k e_k) - Q(x+h_j e_j) - Q(x+h_k e_k) + 2 Q(x) -
+        Q(x-h_j e_j) - Q(x-h_k e_k) + Q(x-h_j e_j-h_k e_k)}{2 h_j h_k}.
+
+    THIS METHOD IS DEPENDENT ON USING
+    :meth:`~bet.sensitivity.gradients.pick_hessian_points` TO CHOOSE SAMPLES
+    FOR THE STENCIL AROUND EACH CENTER.  THE ORDERING MATTERS.
+    
+    :param cluster_discretization: Must contain input and output values for the
+        sample clusters.
+    :type cluster_discretization: :class:`~bet.sample.discretization`
+    
+    :rtype: :class:`~bet.sample.discretization`
+    :returns: A new :class:`~bet.sample.discretization` that contains only the
+        centers of the clusters and their associated ``_jacobians`` of shape
+        (num_centers, output_dim, input_dim) approximated with centered
+        finite differences and ``_hessians`` of shape (num_centers,
+        output_dim, input_dim, input_dim)
+    
+    """
+    if cluster_discretization._input_sample_set.get_values() is None \
+            or cluster_discretization._output_sample_set.get_values() is None:
+        raise ValueError("You must have values to use this method.")
+    samples = cluster_discretization._input_sample_set.get_values()
+    data = cluster_discretization._output_sample_set.get_values()
+
+    num_model_samples = cluster_discretization.check_nums()
+    input_dim = cluster_discretization._input_sample_set.get_dim()
+    output_dim = cluster_discretization._output_sample_set.get_dim()
+
+    num_close = input_dim * (input_dim + 1)
+    num_centers = num_model_samples / (num_close + 1)
+    num_pairs = input_dim * (input_dim - 1) / 2
+
+    # Find radii_vec from the first cluster of samples
+    radii_vec = samples[num_centers:num_centers + input_dim, :] - samples[0, :]
+    radii_vec = radii_vec.diagonal()
+
+    # Split the stencils, each array is of shape (num_centers, num_points,
+    # output_dim)
+    center_data = data[:num_centers, np.newaxis, :]
+    cluster_data = np.reshape(data[num_centers:], (num_centers, num_close,
+        output_dim))
+    plus = cluster_data[:, :input_dim]
+    minus = cluster_data[:, input_dim:2 * input_dim]
+    plus_pairs = cluster_data[:, 2 * input_dim:2 * input_dim + num_pairs]
+    minus_pairs = cluster_data[:, 2 * input_dim + num_pairs:]
+    (j, k) = np.triu_indices(input_dim, 1)
+
+    jacobians = (plus - minus) * (0.5 / radii_vec[:, np.newaxis])
+    hessians = np.zeros((num_centers, output_dim, input_dim, input_dim))
+    diagonal = (plus - 2.0 * center_data + minus) / \
+            (radii_vec**2)[:, np.newaxis]
+    hessians[:, :, np.arange(input_dim), np.arange(input_dim)] = \
+            diagonal.transpose(0, 2, 1)
+    off_diagonal = (plus_pairs - plus[:, j] - plus[:, k] + 2.0 * center_data \
+            - minus[:, j] - minus[:, k] + minus_pairs) / \
+            (2.0 * radii_vec[j] * radii_vec[k])[:, np.newaxis]
+    hessians[:, :, j, k] = off_diagonal.transpose(0, 2, 1)
+    hessians[:, :, k, j] = off_diagonal.transpose(0, 2, 1)
+
+    center_input_sample_set = sample.sample_set(input_dim)
+    center_input_sample_set.set_values(samples[:num_centers, :])
+    if cluster_discretization._input_sample_set.get_domain() is not None:
+        center_input_sample_set.set_domain(cluster_discretization.\
+                _input_sample_set.get_domain())
+    center_input_sample_set.set_jacobians(jacobians.transpose(0, 2, 1))
+    center_input_sample_set.set_hessians(hessians)
+    center_output_sample_set = sample.sample_set(output_dim)
+    center_output_sample_set.set_values(data[:num_centers, :])
+    if cluster_discretization._output_sample_set.get_domain() is not None:
+        center_output_sample_set.set_domain(cluster_discretization.\
+                _output_sample_set.get_domain())
+    center_discretization = sample.discretization(center_input_sample_set,
+            center_output_sample_set)
+    return center_discretization
+
 def radial_basis_function(r, kernel=None, ep=None):
     """
     Evaluate a chosen radial basis function.  Allow for the choice of several
@@ -321,36 +462,32 @@ def calculate_gradients_rbf(cluster_discretization, num_centers=None,
         num_centers = num_model_samples / (input_dim + 2)
     centers = samples[:num_centers, :]
 
-    rbf_tensor = np.zeros([num_centers, num_model_samples, input_dim])
-    gradient_tensor = np.zeros([num_centers, output_dim, input_dim])
-
-    # For each center, interpolate the data using the rbf chosen and
-    # then evaluate the partial derivative of that interpolant at the desired
-    # point.
-    for c in range(num_centers):
-        # Find the k nearest neighbors and their distances to centers[c,:]
-        [r, nearest] = cluster_discretization._input_sample_set.query(\
-                centers[c, :], k=num_neighbors)
-        r = np.tile(r, (input_dim, 1))
-
-        # Compute the linf distances to each of the nearest neighbors
-        diffVec = (centers[c, :] - samples[nearest, :]).transpose()
-
-        # Compute the l2 distances between pairs of nearest neighbors
-        distMat = spatial.distance_matrix(
-            samples[nearest, :], samples[nearest, :])
-
-        # Solve for the rbf weights using interpolation conditions and
-        # evaluate the partial derivatives
-        rbf_mat_values = \
-            np.linalg.solve(radial_basis_function(distMat, RBF),
-            radial_basis_function_dxi(r, diffVec, RBF, ep) \
-            .transpose()).transpose()
-
-        # Construct the finite difference matrices
-        rbf_tensor[c, nearest, :] = rbf_mat_values.transpose()
-
-    gradient_tensor = rbf_tensor.transpose(2, 0, 1).dot(data).transpose(1, 2, 0)
+    # Find the k nearest neighbors of all of the centers and their distances
+    [r, nearest] = cluster_discretization._input_sample_set.query(centers,
+            k=num_neighbors)
+    r = np.reshape(r, (num_centers, num_neighbors))
+    nearest = np.reshape(nearest, (num_centers, num_neighbors))
+    neighbors = samples[nearest, :]
+
+    # Compute the linf distances to each of the nearest neighbors
+    diffVec = centers[:, np.newaxis, :] - neighbors
+
+    # Compute the l2 distances between pairs of nearest neighbors
+    distMat = np.zeros((num_centers, num_neighbors, num_neighbors))
+    for i in xrange(input_dim):
+        distMat += (neighbors[:, :, np.newaxis, i] - \
+                neighbors[:, np.newaxis, :, i])**2
+    distMat = np.sqrt(distMat)
+
+    # For each center, solve for the rbf weights using interpolation
+    # conditions on the nearest neighbors and evaluate the partial derivatives
+    # of that interpolant at the center
+    rbf_mat_values = np.linalg.solve(radial_basis_function(distMat, RBF),
+            radial_basis_function_dxi(r[:, :, np.newaxis], diffVec, RBF, ep))
+
+    # Contract the weights with the data at the nearest neighbors
+    gradient_tensor = np.einsum('ijk,ijl->ilk', rbf_mat_values,
+            data[nearest, :])
 
     if normalize:
         # Compute the norm of each vector
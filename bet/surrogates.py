@@ -7,6 +7,7 @@ import numpy as np
 import bet.sample as sample
 import bet.calculateP.calculateError as calculateError
 import bet.calculateP.calculateP as calculateP
+import bet.sensitivity.gradients as grad
 from bet.Comm import comm, MPI
 
 class piecewise_polynomial_surrogate(object):
@@ -31,28 +32,69 @@ class piecewise_polynomial_surrogate(object):
         self.input_disc = input_disc
         self.input_disc._input_sample_set.local_to_global()
         self.input_disc._output_sample_set.local_to_global()
+        #: pointer from the local values of the last surrogate input sample
+        #: set to the cells of the input sample set of ``input_disc``
+        self.emulated_ii_ptr_local = None
         
-    def generate_for_input_set(self, input_sample_set, order=0):
+    def compute_hessians_cfd(self, model, radii_vec):
+        """
+        Approximates the Hessians (and, if they are not defined, the
+        Jacobians) at the samples of the input discretization with centered
+        finite differences (see
+        :meth:`~bet.sensitivity.gradients.calculate_hessians_cfd`). The model
+        is solved at ``input_dim*(input_dim+1)`` points around each sample.
+
+        :param model: python model that takes an :class:`numpy.ndarray` of
+            input values of shape (num, input_dim) and returns the output
+            values of shape (num, output_dim)
+        :type model: callable
+        :param radii_vec: The radius of the stencil, along each axis
+        :type radii_vec: :class:`numpy.ndarray` of shape (input_dim,)
+
+        """
+        input_set = self.input_disc._input_sample_set
+        cluster_input_set = grad.pick_hessian_points(input_set, radii_vec)
+        cluster_input_set.global_to_local()
+        cluster_output_set = sample.sample_set(self.input_disc.\
+                _output_sample_set._dim)
+        cluster_output_set.set_values_local(model(cluster_input_set.\
+                _values_local))
+        cluster_output_set.local_to_global()
+        cluster_disc = sample.discretization(cluster_input_set,
+                cluster_output_set)
+        center_disc = grad.calculate_hessians_cfd(cluster_disc)
+        input_set.set_hessians(center_disc._input_sample_set._hessians)
+        if input_set._jacobians is None and input_set._jacobians_local is None:
+            input_set.set_jacobians(center_disc._input_sample_set._jacobians)
+        input_set.global_to_local()
+
+    def generate_for_input_set(self, input_sample_set, order=0,
+            block_size=10000):
         """
         Generates a surrogate discretization based on the input discretization,
         for a user-defined input sample set. The output sample set values
         and error estimates are piecewise polynomially defined over input sample
         set cells from the input discretization. For order 0, both are piecewise
         constant. For order 1, values are piecewise linear (assuming Jacobians
-        exist), and error estimates are piecewise constant.
+        exist), and error estimates are piecewise constant. For order 2, values
+        are piecewise quadratic (assuming Jacobians and Hessians exist, see
+        :meth:`~bet.surrogates.piecewise_polynomial_surrogate.compute_hessians_cfd`),
+        and error estimates are piecewise constant.
 
         :param input_sample_set: input sample set for surrogate discretization
         :type set_old: :class:`~bet.sample.sample_set_base`
         :param order: Polynomial order
         :type order: int
+        :param int block_size: number of input samples for which the
+            polynomials are evaluated at once
 
         :rtype: :class:`~bet.sample.discretization`
         :returns: discretization defining the surrogate model
 
         """
         # Check inputs
-        if order not in [0, 1]:
-            msg = "Order must be 0 or 1."
+        if order not in [0, 1, 2]:
+            msg = "Order must be 0, 1, or 2."
             raise calculateError.wrong_argument_type(msg)
         input_sample_set.check_num()
         if input_sample_set._dim != self.input_disc._input_sample_set._dim:
@@ -69,43 +111,49 @@ class piecewise_polynomial_surrogate(object):
                 input_sample_set.set_p_norm(self.input_disc.\
                         _input_sample_set._p_norm)
 
-        # Setup dummy discretizion to get pointers
+        # Query the (cached) KD-tree of the input discretization directly, only
+        # the pointer is kept so repeated generation for new (or chunks of)
+        # input sample sets does not copy the input discretization
         # Assumes Voronoi sample set for now
         output_sample_set = sample.sample_set(self.input_disc.\
                 _output_sample_set._dim)
-        self.dummy_disc = self.input_disc.copy()
-        self.dummy_disc.set_emulated_input_sample_set(input_sample_set)
-        self.dummy_disc.set_emulated_ii_ptr(globalize=False)
-
-        if order == 0:
-            # define new values based on piecewise constants
-            new_values_local = self.input_disc._output_sample_set.\
-                    _values[self.dummy_disc._emulated_ii_ptr_local]
-            output_sample_set.set_values_local(new_values_local)
-        elif order == 1:
-            # define new values based on piecewise linears using Jacobians
-            if self.input_disc._input_sample_set._jacobians is None:
-                if self.input_disc._input_sample_set._jacobians_local is None:
-                    msg = "The input discretization must" 
-                    msg += " have jacobians defined."
-                    raise calculateError.wrong_argument_type(msg)
-                else:
-                    self.input_disc._input_sample_set.local_to_global()
-                    
-            jac_local = self.input_disc._input_sample_set._jacobians[\
-                    self.dummy_disc._emulated_ii_ptr_local]
-            diff_local = self.input_disc._input_sample_set._values[\
-                    self.dummy_disc._emulated_ii_ptr_local] - \
-                    input_sample_set._values_local
-            new_values_local = self.input_disc._output_sample_set._values[\
-                    self.dummy_disc._emulated_ii_ptr_local]
-            new_values_local += np.einsum('ijk,ik->ij', jac_local, diff_local)
-            output_sample_set.set_values_local(new_values_local)
+        if input_sample_set._values_local is None:
+            input_sample_set.global_to_local()
+        (_, self.emulated_ii_ptr_local) = self.input_disc._input_sample_set.\
+                query(input_sample_set._values_local)
+        ptr = self.emulated_ii_ptr_local
+
+        # define new values based on piecewise constants
+        new_values_local = self.input_disc._output_sample_set._values[ptr]
+        if order > 0:
+            # add the terms of the Taylor polynomials using the Jacobians
+            # (and Hessians) in blocks of input samples
+            input_set = self.input_disc._input_sample_set
+            names = ['_jacobians', '_hessians'][:order]
+            for name in names:
+                if getattr(input_set, name) is None:
+                    if getattr(input_set, name + '_local') is None:
+                        msg = "The input discretization must" 
+                        msg += " have {} defined.".format(name[1:])
+                        raise calculateError.wrong_argument_type(msg)
+                    else:
+                        input_set.local_to_global()
+            for start in xrange(0, ptr.shape[0], block_size):
+                stop = min(ptr.shape[0], start + block_size)
+                block_ptr = ptr[start:stop]
+                diff = input_sample_set._values_local[start:stop] - \
+                        input_set._values[block_ptr]
+                slope = input_set._jacobians[block_ptr]
+                if order == 2:
+                    slope = slope + 0.5 * np.einsum('ijkl,il->ijk',
+                            input_set._hessians[block_ptr], diff)
+                new_values_local[start:stop] += np.einsum('ijk,ik->ij', slope,
+                        diff)
+        output_sample_set.set_values_local(new_values_local)
         
         # if they exist, define error estimates with piecewise constants
         if self.input_disc._output_sample_set._error_estimates is not None:
-            new_ee = self.input_disc._output_sample_set._error_estimates[\
-                    self.dummy_disc._emulated_ii_ptr_local]
+            new_ee = self.input_disc._output_sample_set._error_estimates[ptr]
             output_sample_set.set_error_estimates_local(new_ee)
         # create discretization object for the surrogate
         self.surrogate_discretization = sample.discretization(input_sample_set\
@@ -149,35 +197,36 @@ class piecewise_polynomial_surrogate(object):
         prob_new_values = calculateP.prob_from_sample_set(\
                 self.surrogate_discretization._input_sample_set, s_set)
         
-        # Calculate for each region
+        # Calculate probabilities of all regions from the region labels
+        if s_set._region is None:
+            msg = "regions must be defined for the sample set."
+            raise calculateError.wrong_argument_type(msg)
         probabilities = []
-        error_estimates = []
         for region in regions:
             marker = np.equal(s_set._region, region)
-            probability = np.sum(prob_new_values[marker])
-
-            # Calculate error estimate for region
-            model_error = calculateError.model_error(\
-                    self.surrogate_discretization)
-            error_estimate = model_error.calculate_for_sample_set_region_mc(\
-                    s_set, region)
-            probabilities.append(probability)
-            error_estimates.append(error_estimate)
-        # Update input only if 1 region is given
+            probabilities.append(np.sum(prob_new_values[marker]))
+
+        # Calculate error estimates of all regions
+        model_error = calculateError.model_error(\
+                self.surrogate_discretization)
+        error_estimates = model_error.calculate_for_sample_set_regions_mc(\
+                s_set, regions)
+
+        # Update input with the error identifiers of the last region
         if update_input:
             num = self.input_disc._input_sample_set.check_num()
-            prob = np.zeros((num,))
-            error_id = np.zeros((num,))
-            for i in range(num):
-                Itemp = np.equal(self.dummy_disc._emulated_ii_ptr_local, i)
-                prob_sum = np.sum(self.surrogate_discretization.\
-                        _input_sample_set._probabilities_local[Itemp])
-                prob[i] = comm.allreduce(prob_sum, op=MPI.SUM)
-                error_id_sum = np.sum(self.surrogate_discretization.\
-                        _input_sample_set._error_id_local[Itemp])
-                error_id[i] = comm.allreduce(error_id_sum, op=MPI.SUM)
-            self.input_disc._input_sample_set.set_probabilities(prob)
-            self.input_disc._input_sample_set.set_error_id(error_id)
+            ptr = self.emulated_ii_ptr_local
+            sums_local = np.vstack([np.bincount(ptr, weights=self.\
+                    surrogate_discretization._input_sample_set.\
+                    _probabilities_local, minlength=num), np.bincount(ptr,
+                        weights=self.surrogate_discretization.\
+                            _input_sample_set._error_id_local,
+                        minlength=num)])
+            sums = np.copy(sums_local)
+            comm.Allreduce([sums_local, MPI.DOUBLE], [sums, MPI.DOUBLE],
+                    op=MPI.SUM)
+            self.input_disc._input_sample_set.set_probabilities(sums[0])
+            self.input_disc._input_sample_set.set_error_id(sums[1])
                     
         return (probabilities, error_estimates)
         
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This example times
+:meth:`bet.sampling.adaptiveSampling.maxima_kernel.delta_step` for an
+increasing number of chains and maxima and compares it to the per-sample loop
+that was used previously. Both blocked distance calculations (non-constant
+rho_D at the maxima) and the KD-tree (constant rho_D at the maxima) are
+timed.
+"""
+
+import time
+import numpy as np
+import bet.sampling.adaptiveSampling as asam
+
+def loop_distance(kernel, output_new):
+    """
+    Weighted distance to the nearest maximum computed one sample at a time.
+    """
+    kern_new = np.zeros((output_new.shape[0]))
+    for i in xrange(output_new.shape[0]):
+        vec_from_maxima = np.repeat([output_new[i, :]], kernel.num_maxima, 0)
+        vec_from_maxima = vec_from_maxima - kernel.MAXIMA
+        dist_from_maxima = np.linalg.norm(vec_from_maxima, 2,
+                1)/kernel.rho_max
+        kern_new[i] = np.min(dist_from_maxima)
+    return kern_new
+
+def time_call(function, *args):
+    """
+    Returns the result of ``function(*args)`` and the wall time in seconds.
+    """
+    start = time.time()
+    result = function(*args)
+    return (result, time.time()-start)
+
+mdim = 3
+np.random.seed(0)
+print "{:>8} {:>8} {:>10} {:>10} {:>10} {:>8}".format("chains", "maxima",
+        "rho_D", "loop (s)", "kernel (s)", "speedup")
+for num_chains in [100, 1000, 10000]:
+    for num_maxima in [10, 1000, 5000]:
+        output_new = np.random.random((num_chains, mdim))
+        maxima = np.random.random((num_maxima, mdim))
+        for rho_type in ["varying", "constant"]:
+            if rho_type == "varying":
+                rho_D = lambda x: 1.0 + np.random.random((x.shape[0],))
+            else:
+                rho_D = lambda x: np.ones((x.shape[0],))
+            kernel = asam.maxima_kernel(maxima, rho_D)
+            (kern_loop, t_loop) = time_call(loop_distance, kernel, output_new)
+            (kern_new, t_kernel) = time_call(lambda y: kernel.delta_step(y)[0],
+                    output_new)
+            assert np.allclose(kern_loop, kern_new)
+            print "{:>8} {:>8} {:>10} {:>10.4f} {:>10.4f} {:>8.1f}".format(
+                    num_chains, num_maxima, rho_type, t_loop, t_kernel,
+                    t_loop/max(t_kernel, 1e-6))
@@ -0,0 +1,49 @@
+#! /usr/bin/env python
+
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This example compares the convergence of
+:meth:`bet.calculateP.simpleFunP.uniform_partition_uniform_distribution_rectangle_size`
+when the samples of :math:`\rho_{\mathcal{D}}` are emulated with random,
+scrambled Sobol, and scrambled Halton points. The error is measured against
+the exact bin probabilities. The errors are averaged over several seeds.
+"""
+
+import time
+import numpy as np
+import bet.calculateP.simpleFunP as simpleFunP
+
+dim = 2
+M = 50
+Q_ref = 0.5*np.ones((dim,))
+data = np.array([Q_ref])
+num_seeds = 5
+
+exact = [simpleFunP.uniform_partition_uniform_distribution_rectangle_size(
+    data, Q_ref, rect_size=0.5, M=M, seed=seed, exact=True)\
+            .get_probabilities() for seed in xrange(num_seeds)]
+
+print "{:>10} {:>12} {:>12} {:>12}".format("points", "random", "sobol",
+        "halton")
+for power in xrange(8, 17, 2):
+    errors = []
+    for sample_type in ["random", "sobol", "halton"]:
+        error = 0.0
+        for seed in xrange(num_seeds):
+            rho_D_M = simpleFunP.\
+                uniform_partition_uniform_distribution_rectangle_size(data,
+                        Q_ref, rect_size=0.5, M=M, num_d_emulate=2**power,
+                        seed=seed, sample_type=sample_type)
+            error += np.max(np.abs(rho_D_M.get_probabilities() - \
+                    exact[seed]))/num_seeds
+        errors.append(error)
+    print "{:>10} {:>12.2e} {:>12.2e} {:>12.2e}".format(2**power, *errors)
+
+print "time to emulate {} points in {} dimensions".format(2**16, dim)
+for sample_type in ["random", "sobol", "halton"]:
+    start = time.time()
+    simpleFunP.uniform_partition_uniform_distribution_rectangle_size(data,
+            Q_ref, rect_size=0.5, M=M, num_d_emulate=2**16, seed=0,
+            sample_type=sample_type)
+    print "{:>10}: {:.3f} s".format(sample_type, time.time()-start)
@@ -0,0 +1,43 @@
+#! /usr/bin/env python
+
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This example compares the time to select the samples of highest probability
+density whose probabilities sum to 1% with
+:meth:`bet.postProcess.postTools.sample_highest_prob`, which sorts all of the
+samples, and :meth:`bet.postProcess.postTools.sample_prob_select`, which
+searches for the density threshold on the local arrays.
+"""
+
+import time
+import numpy as np
+import bet.sample as sample
+import bet.postProcess.postTools as postTools
+
+top_percentile = 0.01
+dim = 2
+
+print "{:>10} {:>12} {:>12} {:>10}".format("samples", "sort (s)",
+        "select (s)", "selected")
+for power in xrange(5, 8):
+    num_samples = 10**power
+    np.random.seed(0)
+    input_set = sample.sample_set(dim)
+    input_set.set_values(np.random.random((num_samples, dim)))
+    P_samples = np.random.random((num_samples,))**4
+    input_set.set_probabilities(P_samples/np.sum(P_samples))
+    input_set.set_volumes(np.ones((num_samples,))/num_samples)
+    input_set.global_to_local()
+
+    start = time.time()
+    (num_sort, _, _) = postTools.sample_highest_prob(top_percentile,
+            input_set, sort=True)
+    t_sort = time.time()-start
+    start = time.time()
+    (num_select, _, _) = postTools.sample_prob_select(top_percentile,
+            input_set)
+    t_select = time.time()-start
+    assert num_sort == num_select
+    print "{:>10} {:>12.3f} {:>12.3f} {:>10}".format(num_samples, t_sort,
+            t_select, num_select)
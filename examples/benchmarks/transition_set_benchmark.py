@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This example times 100 steps of
+:meth:`bet.sampling.adaptiveSampling.transition_set.step` for 1e5 chains and
+compares it to the previous implementation that created temporary arrays and
+copied the old sample set (and rebuilt its KD-tree) on every step.
+"""
+
+import time
+import numpy as np
+import bet.sample as sample
+import bet.sampling.adaptiveSampling as asam
+
+def copy_step(step_ratio, input_old):
+    """
+    Previous implementation of
+    :meth:`bet.sampling.adaptiveSampling.transition_set.step`.
+    """
+    step_size = np.repeat([step_ratio], input_old.get_dim(),
+            0).transpose()*input_old._width_local
+    my_right = input_old.get_values_local() + 0.5*step_size
+    my_left = input_old.get_values_local() - 0.5*step_size
+    far_right = my_right >= input_old._right_local
+    far_left = my_left <= input_old._left_local
+    my_right[far_right] = input_old._right_local[far_right]
+    my_left[far_left] = input_old._left_local[far_left]
+    my_width = my_right-my_left
+    input_new_values = my_width * np.random.random(input_old.shape_local())
+    input_new_values = input_new_values + my_left
+    input_new = input_old.copy()
+    input_new.set_values_local(input_new_values)
+    return input_new
+
+def run_steps(step, step_ratio, input_set, num_steps):
+    """
+    Runs ``num_steps`` steps and returns the wall time in seconds.
+    """
+    start = time.time()
+    for _ in xrange(num_steps):
+        input_set = step(step_ratio, input_set)
+    return time.time()-start
+
+num_chains = int(1e5)
+num_steps = 100
+dim = 4
+
+np.random.seed(0)
+input_set = sample.sample_set(dim)
+input_set.set_domain(np.array([[0.0, 1.0]]*dim))
+input_set.set_values_local(np.random.random((num_chains, dim)))
+input_set.update_bounds_local()
+step_ratio = 0.5*np.ones((num_chains,))
+
+t_set = asam.transition_set(.5, .5**5, 1.0)
+t_new = run_steps(t_set.step, step_ratio, input_set, num_steps)
+t_copy = run_steps(copy_step, step_ratio, input_set, num_steps)
+print "{} chains x {} steps in {} dimensions".format(num_chains, num_steps,
+        dim)
+print "copying step: {:.3f} s".format(t_copy)
+print "buffered step: {:.3f} s".format(t_new)
+
+input_set.set_values(input_set.get_values_local())
+input_set.set_kdtree()
+t_new = run_steps(t_set.step, step_ratio, input_set, 5)
+t_copy = run_steps(copy_step, step_ratio, input_set, 5)
+print "with a KD-tree, {} steps".format(5)
+print "copying step: {:.3f} s".format(t_copy)
+print "buffered step: {:.3f} s".format(t_new)
@@ -0,0 +1,20 @@
+# Copyright (C) 2016 The BET Development Team
+
+# -*- coding: utf-8 -*-
+
+# This demonstrates how to use BET in parallel to sample a serial external
+# model using a pool of persistent worker processes rather than spawning a new
+# process and writing a file for every call of the model.
+# run by calling "mpirun -np nprocs python parallel_serial_workers.py"
+
+import bet.sampling.basicSampling as bsam
+import bet.sampling.externalModel as em
+
+lb_model = em.external_model(['python', 'serial_model.py', '--worker'],
+        num_workers=2)
+
+my_sampler = bsam.sampler(lb_model)
+my_discretization = my_sampler.create_random_discretization(sample_type='r',
+        input_obj=4, savefile="parallel_serial_workers_example",
+        num_samples=100)
+lb_model.close()
@@ -18,5 +18,5 @@ setup(name='bet',
       license='GNU LGPL',
       url='https://github.com/UT-CHG/BET',
       packages=['bet', 'bet.sampling', 'bet.calculateP', 'bet.postProcess', 'bet.sensitivity'],
-      install_requires=['matplotlib', 'pyDOE', 'scipy',
+      install_requires=['matplotlib', 'scipy',
           'numpy', 'nose'])
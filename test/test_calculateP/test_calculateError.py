@@ -120,6 +120,29 @@ class calculate_error(object):
                                                     1)
         self.assertAlmostEqual(er_est[0], er_est4)
 
+    def Test_model_error_regions(self):
+        """
+        Testing
+        :meth:`bet.calculateP.calculateError.model_error.calculate_for_sample_set_regions_mc`
+        """
+        m_error = calculateError.model_error(self.disc)
+        s_set = self.disc._input_sample_set.copy()
+        s_set.set_region_local(np.arange(s_set.check_num_local()) % 3)
+        s_set.local_to_global()
+
+        er_single = []
+        for region in [0, 1, 2]:
+            er_single.append(m_error.calculate_for_sample_set_region_mc(s_set,
+                region))
+        error_id = np.copy(self.disc._input_sample_set._error_id_local)
+
+        er_est = m_error.calculate_for_sample_set_regions_mc(s_set,
+                [1, 0, 1, 2])
+        nptest.assert_array_almost_equal(er_est, [er_single[1], er_single[0],
+            er_single[1], er_single[2]])
+        nptest.assert_array_almost_equal(error_id,
+                self.disc._input_sample_set._error_id_local)
+
         
 
 class Test_3_to_2(calculate_error, unittest.TestCase):
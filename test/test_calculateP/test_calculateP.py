@@ -413,3 +413,52 @@ class Test_prob_from_sample_set(unittest.TestCase):
         nptest.assert_almost_equal(self.set_new._probabilities, [0.25, 0.75])
 
         
+
+class Test_prob_multiple_data_3to2(TestProbMethod_3to2):
+    """
+    Test :meth:`bet.calculateP.calculateP.prob_multiple_data` on a 3 to 2
+    map.
+    """
+    def setUp(self):
+        """
+        Set up problem.
+        """
+        super(Test_prob_multiple_data_3to2, self).setUp()
+        self.disc._input_sample_set.estimate_volume_mc()
+        self.Q_ref = np.array([0.422, 0.9385])
+        self.Q_refs = self.Q_ref + 0.1*(np.random.random((5, 2)) - 0.5)
+
+    def test_matches_prob(self):
+        """
+        Test that the probabilities match
+        :meth:`bet.calculateP.calculateP.prob` for each reference value.
+        """
+        P = calcP.prob_multiple_data(self.disc, self.Q_refs, self.Q_ref,
+                block_size=2)
+        self.assertEqual(P.shape, (5, self.inputs.check_num()))
+        for j in xrange(5):
+            disc = self.disc.copy()
+            disc._io_ptr_local = None
+            disc._output_probability_set = simpleFunP.\
+                regular_partition_uniform_distribution_rectangle_scaled(\
+                self.outputs, Q_ref=self.Q_refs[j], rect_scale=0.2,
+                cells_per_dimension=1)
+            calcP.prob(disc)
+            nptest.assert_almost_equal(P[j],
+                    disc._input_sample_set._probabilities)
+
+    def test_file(self):
+        """
+        Test that the probabilities written to a file match.
+        """
+        P = calcP.prob_multiple_data(self.disc, self.Q_refs, self.Q_ref,
+                globalize=False)
+        file_name = os.path.join(data_path, 'prob_multiple_data.npy')
+        P_file = calcP.prob_multiple_data(self.disc, self.Q_refs, self.Q_ref,
+                file_name=file_name)
+        nptest.assert_almost_equal(np.array(P_file), P)
+        del P_file
+        if bet.Comm.comm.size > 1:
+            file_name = os.path.join(data_path,
+                    "proc{}_prob_multiple_data.npy".format(bet.Comm.comm.rank))
+        os.remove(file_name)
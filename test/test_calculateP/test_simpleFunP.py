@@ -1096,6 +1096,130 @@ class test_uniform_partition_uniform_distribution_rectangle_size_3D(data_3D,
         super(test_uniform_partition_uniform_distribution_rectangle_size_3D, self).setUp()
 
 
+class uniform_partition_uniform_distribution_rectangle_size_exact(
+        uniform_partition_uniform_distribution_rectangle_size):
+    """
+    Set up :meth:`bet.calculateP.simpleFunP.uniform_partition_uniform_distribution_rectangle_size`
+    with exact probabilities on data domain.
+    """
+
+    def setUp(self):
+        """
+        Set up problem.
+        """
+        self.data_prob = sFun.uniform_partition_uniform_distribution_rectangle_size(
+            self.data, self.Q_ref, rect_size=1.0, M=67, seed=3, exact=True)
+        self.d_distr_samples = self.data_prob.get_values()
+        self.rho_D_M = self.data_prob.get_probabilities()
+
+        if type(self.Q_ref) != np.array:
+            self.Q_ref = np.array([self.Q_ref])
+        if len(self.data_domain.shape) == 1:
+            self.data_domain = np.expand_dims(self.data_domain, axis=0)
+
+        self.rect_domain = np.zeros((self.data_domain.shape[0], 2))
+        self.rect_domain[:, 0] = self.Q_ref - .5
+        self.rect_domain[:, 1] = self.Q_ref + .5
+
+    def test_emulated(self):
+        """
+        Test that the exact probabilities agree with the emulated
+        probabilities for the same bins.
+        """
+        emulated = sFun.uniform_partition_uniform_distribution_rectangle_size(
+            self.data, self.Q_ref, rect_size=1.0, M=67, num_d_emulate=1E5,
+            seed=3)
+        nptest.assert_array_equal(emulated.get_values(), self.d_distr_samples)
+        nptest.assert_allclose(emulated.get_probabilities(), self.rho_D_M,
+                atol=0.01)
+
+    def test_quasi_monte_carlo(self):
+        """
+        Test that the probabilities emulated with quasi-Monte Carlo samples
+        agree with the exact probabilities.
+        """
+        for sample_type in ['sobol', 'halton']:
+            emulated = sFun.uniform_partition_uniform_distribution_rectangle_size(
+                self.data, self.Q_ref, rect_size=1.0, M=67,
+                num_d_emulate=2**14, seed=3, sample_type=sample_type)
+            nptest.assert_allclose(emulated.get_probabilities(),
+                    self.rho_D_M, atol=0.003)
+
+    def test_domain(self):
+        """
+        Test that exactly the bins that intersect the prescribed domain have
+        non-zero probability.
+        """
+        emulate = np.random.random((1000, self.mdim)) - 0.5 + self.Q_ref
+        (_, ptr) = self.data_prob.query(emulate)
+        assert np.all(self.rho_D_M[np.unique(ptr)] > 0.0)
+        inside = np.logical_and(np.all(np.greater_equal(self.d_distr_samples,
+            self.rect_domain[:, 0]), axis=1),
+            np.all(np.less_equal(self.d_distr_samples,
+            self.rect_domain[:, 1]), axis=1))
+        assert np.all(self.rho_D_M[inside] > 0.0)
+
+
+class test_uniform_partition_uniform_distribution_rectangle_size_exact_01D(data_01D,
+                                            uniform_partition_uniform_distribution_rectangle_size_exact):
+    """
+    Tests :meth:`bet.calculateP.simpleFunP.uniform_partition_uniform_distribution_rectangle_size`
+    with exact probabilities on 01D data domain.
+    """
+
+    def setUp(self):
+        """
+        Set up problem.
+        """
+        super(test_uniform_partition_uniform_distribution_rectangle_size_exact_01D, self).createData()
+        super(test_uniform_partition_uniform_distribution_rectangle_size_exact_01D, self).setUp()
+
+
+class test_uniform_partition_uniform_distribution_rectangle_size_exact_1D(data_1D,
+                                            uniform_partition_uniform_distribution_rectangle_size_exact):
+    """
+    Tests :meth:`bet.calculateP.simpleFunP.uniform_partition_uniform_distribution_rectangle_size`
+    with exact probabilities on 1D data domain.
+    """
+
+    def setUp(self):
+        """
+        Set up problem.
+        """
+        super(test_uniform_partition_uniform_distribution_rectangle_size_exact_1D, self).createData()
+        super(test_uniform_partition_uniform_distribution_rectangle_size_exact_1D, self).setUp()
+
+
+class test_uniform_partition_uniform_distribution_rectangle_size_exact_2D(data_2D,
+                                            uniform_partition_uniform_distribution_rectangle_size_exact):
+    """
+    Tests :meth:`bet.calculateP.simpleFunP.uniform_partition_uniform_distribution_rectangle_size`
+    with exact probabilities on 2D data domain.
+    """
+
+    def setUp(self):
+        """
+        Set up problem.
+        """
+        super(test_uniform_partition_uniform_distribution_rectangle_size_exact_2D, self).createData()
+        super(test_uniform_partition_uniform_distribution_rectangle_size_exact_2D, self).setUp()
+
+
+class test_uniform_partition_uniform_distribution_rectangle_size_exact_3D(data_3D,
+                                            uniform_partition_uniform_distribution_rectangle_size_exact):
+    """
+    Tests :meth:`bet.calculateP.simpleFunP.uniform_partition_uniform_distribution_rectangle_size`
+    with exact probabilities on 3D data domain.
+    """
+
+    def setUp(self):
+        """
+        Set up problem.
+        """
+        super(test_uniform_partition_uniform_distribution_rectangle_size_exact_3D, self).createData()
+        super(test_uniform_partition_uniform_distribution_rectangle_size_exact_3D, self).setUp()
+
+
 class uniform_partition_uniform_distribution_rectangle_domain(prob_uniform):
     """
     Set up :meth:`bet.calculateP.simpleFunP.uniform_partition_uniform_distribution_rectangle_domain` on data domain.
@@ -1276,3 +1400,94 @@ class test_user_partition_user_distribution_3D(data_3D,
         """
         super(test_user_partition_user_distribution_3D, self).createData()
         super(test_user_partition_user_distribution_3D, self).setUp()
+
+
+class test_rho_D_M_cache(unittest.TestCase):
+    """
+    Tests :class:`bet.calculateP.simpleFunP.rho_D_M_cache`.
+    """
+
+    def setUp(self):
+        """
+        Set up problem.
+        """
+        self.data = np.random.random((10, 2))
+        self.Q_ref = np.array([0.5, 0.5])
+        self.std = np.array([0.1, 0.2])
+        self.cache_dir = os.path.join(os.path.dirname(bet.__file__),
+                '../rho_D_M_cache')
+        self.cache = sFun.rho_D_M_cache(max_entries=2,
+                cache_dir=self.cache_dir, max_disk_entries=2)
+
+    def tearDown(self):
+        """
+        Remove the cache directory.
+        """
+        self.cache.clear()
+        if bet.Comm.comm.rank == 0 and os.path.exists(self.cache_dir):
+            os.rmdir(self.cache_dir)
+
+    def compare(self, s_set, c_set):
+        """
+        Compare two simple function approximations.
+        """
+        nptest.assert_array_almost_equal(s_set.get_values(),
+                c_set.get_values())
+        nptest.assert_array_almost_equal(s_set.get_probabilities(),
+                c_set.get_probabilities())
+        if s_set.get_volumes() is not None:
+            nptest.assert_array_almost_equal(s_set.get_volumes(),
+                    c_set.get_volumes())
+
+    def test_translate(self):
+        """
+        Test that cached entries are translated to a new reference value and
+        match the uncached construction.
+        """
+        Q_ref = np.array([1.0, -2.0])
+        for constructor in [sFun.normal_partition_normal_distribution,
+                sFun.uniform_partition_normal_distribution]:
+            constructor(self.data, self.Q_ref, self.std, 20, 1E3, seed=4,
+                    cache=self.cache)
+            c_set = constructor(self.data, Q_ref, self.std, 20, 1E3, seed=4,
+                    cache=self.cache)
+            s_set = constructor(self.data, Q_ref, self.std, 20, 1E3, seed=4)
+            self.compare(s_set, c_set)
+        sFun.uniform_partition_uniform_distribution_rectangle_size(self.data,
+                self.Q_ref, 0.1, 20, 1E3, seed=4, cache=self.cache)
+        c_set = sFun.uniform_partition_uniform_distribution_rectangle_size(\
+                self.data, Q_ref, 0.1, 20, 1E3, seed=4, cache=self.cache)
+        s_set = sFun.uniform_partition_uniform_distribution_rectangle_size(\
+                self.data, Q_ref, 0.1, 20, 1E3, seed=4)
+        self.compare(s_set, c_set)
+        self.assertEqual(self.cache.hits, 3)
+        self.assertEqual(self.cache.misses, 3)
+
+    def test_disk(self):
+        """
+        Test that entries are read from disk and that the least recently used
+        entries are evicted.
+        """
+        s_set = sFun.normal_partition_normal_distribution(self.data,
+                self.Q_ref, self.std, 20, 1E3, seed=4, cache=self.cache)
+        for M in [10, 11]:
+            sFun.normal_partition_normal_distribution(self.data, self.Q_ref,
+                    self.std, M, 1E3, seed=4, cache=self.cache)
+        self.assertEqual(len(self.cache._entries), 2)
+
+        cache = sFun.rho_D_M_cache(cache_dir=self.cache_dir)
+        c_set = sFun.normal_partition_normal_distribution(self.data,
+                self.Q_ref, self.std, 11, 1E3, seed=4, cache=cache)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(len([f for f in os.listdir(self.cache_dir) if \
+                f.startswith('rho_D_M_')]), 2)
+
+        # different seeds are different entries
+        sFun.normal_partition_normal_distribution(self.data, self.Q_ref,
+                self.std, 20, 1E3, seed=5, cache=self.cache)
+        self.assertEqual(self.cache.hits, 0)
+
+        # no seed is never cached
+        sFun.normal_partition_normal_distribution(self.data, self.Q_ref,
+                self.std, 20, 1E3, cache=self.cache)
+        self.assertEqual(self.cache.hits + self.cache.misses, 4)
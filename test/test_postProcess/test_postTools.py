@@ -13,7 +13,7 @@ import numpy as np
 import scipy.spatial as spatial
 import numpy.testing as nptest
 import bet.util as util
-from bet.Comm import comm
+from bet.Comm import comm, MPI
 import bet.sample as sample
 
 '''
@@ -196,3 +196,68 @@ class Test_PostTools(unittest.TestCase):
                                                                       sort=True)
 
         nptest.assert_allclose(np.sum(sample_set_out.get_probabilities()),0.8,0.001)
+
+    def test_sample_prob_select(self):
+        """
+        Test :meth:`bet.postProcess.postTools.sample_prob_select`.
+        """
+        for descending in [False, True]:
+            for percentile in [1.0, 0.8, 0.1]:
+                (num_samples, sample_set_out, indices) = postTools.\
+                        sample_prob(percentile, self.data.copy(), sort=True,
+                                descending=descending)
+                (num_select, select_set_out, select_indices) = postTools.\
+                        sample_prob_select(percentile, self.data,
+                                descending=descending)
+                nptest.assert_equal(num_select, num_samples)
+                nptest.assert_almost_equal(np.sum(select_set_out.\
+                        get_probabilities()), np.sum(sample_set_out.\
+                            get_probabilities()))
+                nptest.assert_array_equal(select_set_out.get_values(),
+                        self.data.get_values()[select_indices])
+
+        # random densities without ties select the same sorted samples
+        np.random.seed(0)
+        input_samples = sample.sample_set(2)
+        input_samples.set_values(np.random.random((500, 2)))
+        P_samples = np.random.random((500,))
+        P_samples[0:5] = 0.0
+        input_samples.set_probabilities(P_samples/np.sum(P_samples))
+        input_samples.set_volumes(np.random.random((500,)) + 0.5)
+        output_samples = sample.sample_set(1)
+        output_samples.set_values(np.random.random((500, 1)))
+        disc = sample.discretization(input_samples, output_samples)
+        for descending in [False, True]:
+            (num_samples, _, indices) = postTools.sample_prob(0.3,
+                    disc.copy(), sort=True, descending=descending)
+            (num_select, disc_out, select_indices) = postTools.\
+                    sample_prob_select(0.3, disc, descending=descending)
+            nptest.assert_equal(num_select, num_samples)
+            nptest.assert_array_equal(select_indices, indices)
+            nptest.assert_array_equal(disc_out._output_sample_set.\
+                    get_values(), output_samples.get_values()[indices])
+
+        # tied densities with unequal volumes are taken in the same order
+        input_samples = sample.sample_set(1)
+        input_samples.set_values(np.linspace(0.0, 1.0, 12))
+        lam_vol = np.array([1.0, 2.0, 1.0, 3.0]*3)
+        rho = np.array([2.0]*6 + [1.0]*6)
+        input_samples.set_probabilities(rho*lam_vol/np.sum(rho*lam_vol))
+        input_samples.set_volumes(lam_vol)
+        for descending in [False, True]:
+            for percentile in [0.2, 0.5, 0.7]:
+                (num_samples, _, indices) = postTools.sample_prob(\
+                        percentile, input_samples.copy(), sort=True,
+                        descending=descending)
+                (num_select, _, select_indices) = postTools.\
+                        sample_prob_select(percentile, input_samples,
+                                descending=descending)
+                nptest.assert_equal(num_select, num_samples)
+                nptest.assert_array_equal(select_indices, indices)
+
+        (num_select, select_set_out, _) = postTools.sample_prob_select(0.3,
+                input_samples, globalize=False)
+        self.assertIsNone(select_set_out.get_values())
+        nptest.assert_equal(comm.allreduce(select_set_out.\
+                get_values_local().shape[0], op=MPI.SUM), num_select)
+
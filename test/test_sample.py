@@ -42,18 +42,22 @@ class Test_sample_set(unittest.TestCase):
         self.sam_set.set_error_estimates(ee)
         jac = np.ones((self.num, 3, self.dim))
         self.sam_set.set_jacobians(jac)
+        hess = np.ones((self.num, 3, self.dim, self.dim))
+        self.sam_set.set_hessians(hess)
 
         self.sam_set.normalize_domain()
         nptest.assert_array_equal(self.sam_set._domain, self.domain)
         nptest.assert_array_almost_equal(self.sam_set._values, 0.4)
         nptest.assert_array_almost_equal(self.sam_set._error_estimates, 0.4)
         nptest.assert_array_almost_equal(self.sam_set._jacobians, 5.0)
+        nptest.assert_array_almost_equal(self.sam_set._hessians, 25.0)
 
         self.sam_set.undo_normalize_domain()
         nptest.assert_array_equal(self.sam_set._domain, domain)
         nptest.assert_array_almost_equal(self.sam_set._values, 1.0)
         nptest.assert_array_almost_equal(self.sam_set._error_estimates, 1.0)
         nptest.assert_array_almost_equal(self.sam_set._jacobians, 1.0)
+        nptest.assert_array_almost_equal(self.sam_set._hessians, 1.0)
     def test_clip(self):
         """
         Test clipping of sample set.
@@ -345,6 +349,18 @@ class Test_sample_set(unittest.TestCase):
         self.sam_set.check_num()
         nptest.assert_array_equal(jac, self.sam_set.get_jacobians())
 
+    def test_hessian_methods(self):
+        """
+        Check Hessian methods.
+        """
+        hess = np.ones((self.num, 3, self.dim, self.dim))
+        self.sam_set.set_hessians(hess)
+        self.sam_set.check_num()
+        nptest.assert_array_equal(hess, self.sam_set.get_hessians())
+        self.sam_set.global_to_local()
+        nptest.assert_array_equal(self.sam_set.get_hessians_local(),
+                hess[self.sam_set._local_index])
+
     def test_check_num(self):
         """
         Check check_num.
@@ -489,6 +505,11 @@ class Test_discretization_simple(unittest.TestCase):
         nptest.assert_array_equal(self.disc._output_sample_set._error_estimates[:,[0]],
                                    disc_new._output_sample_set._error_estimates)
         self.assertEqual(disc_new._input_sample_set._jacobians.shape, (self.num, 1, 2))
+        self.disc._input_sample_set.set_hessians(np.ones((self.num, self.dim2,
+            self.dim1, self.dim1)))
+        disc_new = self.disc.choose_inputs_outputs(inputs=[0,2], outputs=[0])
+        self.assertEqual(disc_new._input_sample_set._hessians.shape, (self.num,
+            1, 2, 2))
     def Test_set_io_ptr(self):
         """
         Test setting io ptr
@@ -1510,3 +1531,79 @@ class Test_cartesian_sample_set(unittest.TestCase):
         self.sam_set.exact_volume_lebesgue()
         volumes = self.sam_set.get_volumes()
         nptest.assert_array_almost_equal(volumes, [.25, 0.25, 0.25, 0.25, 0.0])
+
+class Test_regular_grid_sample_set(unittest.TestCase):
+    def setUp(self):
+        self.dim = 3
+        self.grid_shape = np.array([4, 3, 5])
+        self.domain = np.array([[0, 1], [-1, 2], [0, 0.5]], dtype=np.float)
+        self.sam_set = bsam.regular_sample_set(self.domain, self.grid_shape)
+        self.num = self.sam_set.check_num()
+
+    def test_values(self):
+        """
+        Check that the grid matches :meth:`numpy.meshgrid`.
+        """
+        coordinates = sample.regular_grid_coordinates(self.domain,
+                self.grid_shape)
+        grids = np.meshgrid(*coordinates, indexing='ij')
+        values = np.vstack([grid.flat[:] for grid in grids]).transpose()
+        assert isinstance(self.sam_set, sample.regular_grid_sample_set)
+        assert self.num == 60
+        nptest.assert_array_equal(self.sam_set.get_values(), values)
+        nptest.assert_array_equal(self.sam_set.get_values_local(),
+                np.array_split(values, comm.size)[comm.rank])
+        nptest.assert_array_equal(sample.regular_grid_values(self.domain,
+            self.grid_shape, 17, 29), values[17:29])
+        local_set = bsam.regular_sample_set(self.domain, self.grid_shape,
+                globalize=False)
+        assert local_set._values is None
+        nptest.assert_array_equal(local_set.get_values_local(),
+                self.sam_set.get_values_local())
+
+    def test_query(self):
+        """
+        Check that querying the grid matches querying a KDTree.
+        """
+        x = np.random.uniform(-0.5, 2.5, (100, self.dim))
+        for p_norm in [1, 2, np.inf]:
+            self.sam_set.set_p_norm(p_norm)
+            (d, ptr) = self.sam_set.query(x)
+            kdtree_set = sample.sample_set(self.dim)
+            kdtree_set.set_values(self.sam_set.get_values())
+            kdtree_set.set_p_norm(p_norm)
+            (d_kd, ptr_kd) = kdtree_set.query(x)
+            nptest.assert_array_almost_equal(d, d_kd)
+            if p_norm != np.inf:
+                # the nearest point is not unique for the inf norm
+                nptest.assert_array_equal(ptr, ptr_kd)
+        (d, ptr) = self.sam_set.query(x, k=2)
+        assert ptr.shape == (100, 2)
+
+    def test_copy(self):
+        """
+        Check copy and that resetting the values discards the grid.
+        """
+        copied_set = self.sam_set.copy()
+        nptest.assert_array_equal(copied_set.get_grid_shape(),
+                self.grid_shape)
+        copied_set.set_values(self.sam_set.get_values())
+        assert copied_set.get_grid_shape() is None
+        (d, ptr) = copied_set.query(self.sam_set.get_values()[:5])
+        nptest.assert_array_equal(ptr, np.arange(5))
+
+    def test_append(self):
+        """
+        Check that appending values discards the grid.
+        """
+        new_value = np.array([[0.9, 1.9, 0.45]])
+        copied_set = self.sam_set.copy()
+        copied_set.append_values(new_value)
+        assert copied_set.get_grid_shape() is None
+        (d, ptr) = copied_set.query(new_value)
+        nptest.assert_array_equal(ptr, [self.num])
+        nptest.assert_array_almost_equal(d, [0.0])
+        for mutator in ['append_values_local', 'set_values_local']:
+            copied_set = self.sam_set.copy()
+            getattr(copied_set, mutator)(new_value)
+            assert copied_set.get_grid_shape() is None
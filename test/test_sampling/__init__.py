@@ -4,4 +4,5 @@
 This subpackage contains the test modules for the sampling subpackage.
 """
 __all__ = ['test_adaptiveSampling','test_basicSampling',
-    'test_LpGeneralizedSamples']
+    'test_LpGeneralizedSamples', 'test_modelEvaluators',
+    'test_modelCache', 'test_externalModel', 'test_latinHypercube']
@@ -7,7 +7,7 @@
 This module contains unittests for :mod:`~bet.sampling.adaptiveSampling`
 """
 
-import unittest, os, glob
+import unittest, os, glob, time
 import numpy.testing as nptest
 import numpy as np
 import bet.sampling.adaptiveSampling as asam
@@ -324,6 +324,111 @@ class Test_adaptive_sampler(unittest.TestCase):
             assert asr > t_set.min_ratio
             assert asr < t_set.max_ratio
     
+    def test_run_members(self):
+        """
+        Run :meth:`bet.sampling.adaptiveSampling.sampler.run_gen` with a
+        shared initial batch and concurrent members and verify that the
+        members start from the same samples.
+        """
+        inputs = self.test_list[3]
+        _, QoI_range, sampler, input_domain, savefile = inputs
+
+        Q_ref = QoI_range*0.5
+        bin_size = 0.15*QoI_range
+        maximum = 1/np.product(bin_size)
+        def ifun(outputs):
+            """
+            Indicator function
+            """
+            inside = np.logical_and(np.all(np.greater_equal(outputs,
+                Q_ref-.5*bin_size), axis=1), np.all(np.less_equal(outputs,
+                    Q_ref+.5*bin_size), axis=1)) 
+            max_values = np.repeat(maximum, outputs.shape[0], 0)
+            return inside.astype('float64')*max_values
+
+        kern_list = [asam.rhoD_kernel(maximum, ifun), asam.maxima_kernel(
+            np.array([Q_ref]), ifun), asam.maxima_mean_kernel(
+                np.array([Q_ref]), ifun)]
+        t_set = asam.transition_set(.5, .5**5, 1.0) 
+
+        for num_workers in [None, 3]:
+            output = sampler.run_gen(kern_list, ifun, maximum, input_domain,
+                    t_set, savefile, shared_initial=True,
+                    num_workers=num_workers)
+            results, r_step_size, results_rD, sort_ind, mean_ss = output
+            assert len(results) == 3
+            initial = results[0]._input_sample_set.get_values_local()[:\
+                    sampler.num_chains_pproc]
+            for my_disc, step_sizes in zip(results, r_step_size):
+                assert my_disc._input_sample_set.get_values_local().shape == \
+                        (sampler.num_chains_pproc*sampler.chain_length,
+                                input_domain.shape[0])
+                nptest.assert_array_equal(my_disc._input_sample_set.\
+                        get_values_local()[:sampler.num_chains_pproc],
+                        initial)
+                assert step_sizes.shape == (sampler.num_chains,
+                        sampler.chain_length)
+            assert sampler.num_samples == sampler.num_chains*\
+                    sampler.chain_length
+        comm.barrier()
+        for f in glob.glob(savefile+"_member*"):
+            if comm.rank == 0:
+                os.remove(f)
+    
+    def test_asynchronous_chains(self):
+        """
+        Test :meth:`bet.sampling.adaptiveSampling.sampler.asynchronous_chains`
+        with a model whose run time varies.
+        """
+        t_set = asam.transition_set(.5, .5**5, 1.0) 
+        for model, QoI_range, sampler, input_domain, savefile in \
+                self.test_list[2:4]:
+            def slow_model(x):
+                time.sleep(0.005*np.random.random())
+                return model(x)
+            my_sampler = asam.sampler(sampler.num_samples,
+                    sampler.chain_length, slow_model)
+            Q_ref = QoI_range*0.5
+            kernel = asam.maxima_kernel(np.array([Q_ref]), lambda x:
+                    np.ones((x.shape[0],)))
+            (my_disc, all_step_ratios) = my_sampler.asynchronous_chains(
+                    input_domain, t_set, kernel, savefile, num_workers=4)
+            input_values = my_disc._input_sample_set.get_values_local()
+            output_values = my_disc._output_sample_set.get_values_local()
+            num_local = my_sampler.num_chains_pproc*my_sampler.chain_length
+            assert input_values.shape == (num_local, input_domain.shape[0])
+            assert output_values.shape[0] == num_local
+            nptest.assert_array_almost_equal(output_values.reshape(
+                (num_local, -1)), np.reshape(model(input_values),
+                    (num_local, -1)))
+            assert np.all(np.greater_equal(input_values, input_domain[:, 0]))
+            assert np.all(np.less_equal(input_values, input_domain[:, 1]))
+            assert all_step_ratios.shape == (my_sampler.num_chains,
+                    my_sampler.chain_length)
+            assert np.all(all_step_ratios <= t_set.max_ratio)
+            assert np.all(all_step_ratios >= t_set.min_ratio)
+
+    def test_asynchronous_chains_base_kernel(self):
+        """
+        Test :meth:`bet.sampling.adaptiveSampling.sampler.asynchronous_chains`
+        with the base kernel and with chains of length one.
+        """
+        t_set = asam.transition_set(.5, .5**5, 1.0) 
+        model, _, sampler, input_domain, savefile = self.test_list[2]
+        for chain_length in [1, sampler.chain_length]:
+            my_sampler = asam.sampler(sampler.num_chains*chain_length,
+                    chain_length, model)
+            (my_disc, all_step_ratios) = my_sampler.asynchronous_chains(
+                    input_domain, t_set, asam.kernel(), savefile,
+                    num_workers=2)
+            num_local = my_sampler.num_chains_pproc*chain_length
+            assert my_disc._input_sample_set.get_values_local().shape == \
+                    (num_local, input_domain.shape[0])
+            assert all_step_ratios.shape == (my_sampler.num_chains,
+                    chain_length)
+            nptest.assert_array_almost_equal(all_step_ratios,
+                    t_set.init_ratio)
+
     def test_run_tk(self):
         """
         Run :meth:`bet.sampling.adaptiveSampling.sampler.run_tk` and verify
@@ -440,6 +545,61 @@ class Test_adaptive_sampler(unittest.TestCase):
             assert asr > t_set.min_ratio
             assert asr < t_set.max_ratio
 
+    def test_generalized_chains_budget(self):
+        """
+        Test :meth:`bet.sampling.adaptiveSampling.sampler.generalized_chains`
+        with a :class:`bet.sampling.adaptiveSampling.chain_budget`.
+        """
+        t_set = asam.transition_set(.5, .5**5, 1.0) 
+        _, QoI_range, sampler, input_domain, savefile = self.test_list[3]
+        Q_ref = QoI_range*0.5
+        bin_size = 0.3*QoI_range
+        def ifun(outputs):
+            """
+            Indicator function
+            """
+            inside = np.logical_and(np.all(np.greater_equal(outputs,
+                Q_ref-.5*bin_size), axis=1), np.all(np.less_equal(outputs,
+                    Q_ref+.5*bin_size), axis=1)) 
+            return inside.astype('float64')
+        kernel_rD = asam.rhoD_kernel(1.0, ifun)
+
+        # no early stop
+        budget = asam.chain_budget(ifun, 1.0, patience=2)
+        (my_disc, all_step_ratios) = sampler.generalized_chains(input_domain,
+                t_set, kernel_rD, savefile, budget=budget)
+        assert all_step_ratios.shape == (sampler.num_chains,
+                sampler.chain_length)
+        assert my_disc._input_sample_set.get_values_local().shape[0] == \
+                sampler.num_chains_pproc*sampler.chain_length
+        num_hits = comm.allreduce(int(np.sum(ifun(my_disc._output_sample_set.\
+                get_values_local()[sampler.num_chains_pproc:]))))
+        assert budget.num_high_prob == num_hits
+
+        # early stop
+        budget = asam.chain_budget(ifun, 1.0, target=1, patience=2)
+        (my_disc, all_step_ratios) = sampler.generalized_chains(input_domain,
+                t_set, kernel_rD, savefile, budget=budget)
+        num_batches = all_step_ratios.shape[1]
+        assert num_batches < sampler.chain_length
+        assert my_disc._input_sample_set.get_values_local().shape[0] == \
+                sampler.num_chains_pproc*num_batches
+        assert budget.num_high_prob >= 1
+        if comm.size == 1:
+            mdat = sio.loadmat(savefile)
+            assert mdat['sample_batch_no'].size == sampler.num_chains*\
+                    num_batches
+
+        # respawn and early stop with the base kernel
+        budget = asam.chain_budget(ifun, 1.0, target=2*sampler.num_chains,
+                patience=1)
+        (my_disc, all_step_ratios) = sampler.generalized_chains(input_domain,
+                t_set, asam.kernel(), savefile, budget=budget)
+        assert budget.num_respawned > 0
+        assert my_disc._input_sample_set.get_values_local().shape[0] == \
+                sampler.num_chains_pproc*all_step_ratios.shape[1]
+        sampler.num_samples = sampler.num_chains*sampler.chain_length
+
     def test_generalized_chains(self):
         """
         Test :met:`bet.sampling.adaptiveSampling.sampler.generalized_chains`
@@ -751,6 +911,29 @@ class maxima_kernel(kernel):
         #nptest.assert_array_eqyal(kern_new, something)
         nptest.assert_array_equal(proposal, [0.5, 2.0, 1.0])
 
+    def test_weighted_distance(self):
+        """
+        Test the weighted_distance method of
+        :class:`bet.sampling.adaptiveSampling.maxima_kernel`
+        """
+        maxima = np.random.random((7, self.mdim))*10.0
+        kernel = asam.maxima_kernel(maxima, lambda x: np.random.random((7,))+1)
+        dist = np.array([np.min(np.linalg.norm(maxima-q, 2, 1)/kernel.rho_max)
+            for q in self.output])
+        nptest.assert_array_almost_equal(kernel.weighted_distance(
+            self.output), dist)
+        # small blocks
+        kernel.block_size = 15
+        nptest.assert_array_almost_equal(kernel.weighted_distance(
+            self.output), dist)
+        # KD-tree
+        kernel = asam.maxima_kernel(maxima, lambda x: 2*np.ones((7,)))
+        kernel.kdtree_threshold = 5
+        dist = np.array([np.min(np.linalg.norm(maxima-q, 2, 1)/2.0) for q in
+            self.output])
+        nptest.assert_array_almost_equal(kernel.weighted_distance(
+            self.output), dist)
+
 class test_maxima_kernel_1D(maxima_kernel, output_1D):
     """
     Test :class:`bet.sampling.adaptiveSampling.maxima_kernel` on a 1D output
@@ -867,6 +1050,47 @@ class test_maxima_mean_kernel_3D(maxima_mean_kernel, output_3D):
         super(test_maxima_mean_kernel_3D, self).setUp()
 
 
+class test_chain_budget(unittest.TestCase):
+    """
+    Tests :class:`bet.sampling.adaptiveSampling.chain_budget`
+    """
+    def setUp(self):
+        """
+        Set up
+        """
+        self.rho_D = lambda x: np.less(np.abs(x[:, 0]), 1.0).astype('float')
+        self.budget = asam.chain_budget(self.rho_D, 1.0, patience=2)
+        self.budget.reset(4)
+
+    def test_update(self):
+        """
+        Tests :meth:`bet.sampling.adaptiveSampling.chain_budget.update`
+        """
+        step_ratio = np.array([.5, .5, .5, .01])
+        output = np.array([[0.0], [5.0], [0.5], [5.0]])
+        (retired, sources, stop) = self.budget.update(output, step_ratio, .01)
+        assert len(retired) == 0
+        assert not stop
+        nptest.assert_array_equal(self.budget.hits, [1, 0, 1, 0])
+        (retired, sources, stop) = self.budget.update(output, step_ratio, .01)
+        nptest.assert_array_equal(retired, [1, 3])
+        assert np.all(np.in1d(sources, [0, 2]))
+        assert self.budget.num_high_prob == 4*comm.size
+        assert self.budget.num_respawned == 2
+        nptest.assert_array_equal(self.budget.misses_in_row, [0, 0, 0, 0])
+
+        # collapsed chains
+        self.budget.retire_collapsed = True
+        output = np.array([[0.0], [0.0], [0.5], [0.1]])
+        self.budget.update(output, step_ratio, .01)
+        (retired, sources, stop) = self.budget.update(output, step_ratio, .01)
+        nptest.assert_array_equal(retired, [3])
+
+        # stop early
+        self.budget.target = 4*comm.size
+        (retired, sources, stop) = self.budget.update(output, step_ratio, .01)
+        assert stop
+
 class transition_set(object):
     """
     Tests :class:`bet.sampling.adaptiveSamplinng.transition_set`
@@ -926,6 +1150,28 @@ class transition_set(object):
                 self.output_set.get_values_local()\
                 -0.5*step_size)
 
+    def test_step_buffers(self):
+        """
+        Tests that :meth:`bet.sampling.adaptiveSampling.transition_set.step`
+        reuses its buffers without overwriting the values of the previous
+        step and shares the attributes of the old samples.
+        """
+        local_num = self.output_set._values_local.shape[0] 
+        step_ratio = 0.5*np.ones(local_num,)
+        samples_1 = self.t_set.step(step_ratio, self.output_set)
+        values_1 = np.copy(samples_1.get_values_local())
+        samples_2 = self.t_set.step(step_ratio, samples_1)
+        nptest.assert_array_equal(samples_1.get_values_local(), values_1)
+        samples_3 = self.t_set.step(step_ratio, samples_2)
+        assert samples_3._values_local is samples_1._values_local
+        assert samples_3._domain is self.output_set._domain
+        assert samples_3._right_local is self.output_set._right_local
+        assert samples_3.get_kdtree() is None
+        assert np.all(samples_3.get_values_local() <=\
+                self.output_set._right_local)
+        assert np.all(samples_3.get_values_local() >=\
+                self.output_set._left_local)
+
 
 class test_transition_set_1D(transition_set, output_1D):
     """
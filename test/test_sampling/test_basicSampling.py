@@ -5,12 +5,13 @@
 This module contains unittests for :mod:`~bet.sampling.basicSampling:`
 """
 
-import unittest, os, pyDOE
+import unittest, os
 import numpy.testing as nptest
 import numpy as np
 import scipy.io as sio
 import bet
 import bet.sampling.basicSampling as bsam
+import bet.sampling.latinHypercube as lhc
 from bet.Comm import comm 
 import bet.sample
 from bet.sample import sample_set
@@ -199,8 +200,8 @@ def verify_create_random_discretization(model, sampler, sample_type, input_domai
     
     input_values = (input_right-input_left)
     if sample_type == "lhs":
-        input_values = input_values * pyDOE.lhs(input_sample_set.get_dim(),
-                num_samples, 'center') 
+        input_values = input_values * lhc.lhs_block(input_sample_set.get_dim(),
+                num_samples, 0, num_samples, 1, centered=True) 
     elif sample_type == "random" or "r":
         input_values = input_values * np.random.random(input_left.shape)
     input_values = input_values + input_left
@@ -287,8 +288,8 @@ def verify_create_random_discretization(model, sampler, sample_type, input_domai
 
     input_values = (input_right - input_left)
     if sample_type == "lhs":
-        input_values = input_values * pyDOE.lhs(input_sample_set.get_dim(),
-                                                num_samples, 'center')
+        input_values = input_values * lhc.lhs_block(input_sample_set.get_dim(),
+                num_samples, 0, num_samples, 1, centered=True)
     elif sample_type == "random" or "r":
         input_values = input_values * np.random.random(input_left.shape)
     input_values = input_values + input_left
@@ -331,8 +332,8 @@ def verify_random_sample_set_domain(sampler, sample_type, input_domain,
 
     input_values = (input_right - input_left)
     if sample_type == "lhs":
-        input_values = input_values * pyDOE.lhs(input_sample_set.get_dim(),
-                                                num_samples, 'center')
+        input_values = input_values * lhc.lhs_block(input_sample_set.get_dim(),
+                num_samples, 0, num_samples, 1, centered=True)
     elif sample_type == "random" or "r":
         input_values = input_values * np.random.random(input_left.shape)
     input_values = input_values + input_left
@@ -372,8 +373,8 @@ def verify_random_sample_set_dimension(sampler, sample_type, input_dim,
 
     input_values = (input_right - input_left)
     if sample_type == "lhs":
-        input_values = input_values * pyDOE.lhs(input_sample_set.get_dim(),
-                                                num_samples, 'center')
+        input_values = input_values * lhc.lhs_block(input_sample_set.get_dim(),
+                num_samples, 0, num_samples, 1, centered=True)
     elif sample_type == "random" or "r":
         input_values = input_values * np.random.random(input_left.shape)
     input_values = input_values + input_left
@@ -412,8 +413,8 @@ def verify_random_sample_set(sampler, sample_type, input_sample_set,
 
     input_values = (input_right - input_left)
     if sample_type == "lhs":
-        input_values = input_values * pyDOE.lhs(input_sample_set.get_dim(),
-                                                num_samples, 'center')
+        input_values = input_values * lhc.lhs_block(input_sample_set.get_dim(),
+                num_samples, 0, num_samples, 1, centered=True)
     elif sample_type == "random" or "r":
         input_values = input_values * np.random.random(input_left.shape)
     input_values = input_values + input_left
@@ -693,7 +694,7 @@ class Test_basic_sampler(unittest.TestCase):
         test_list = zip(self.samplers, input_sample_set_list)
 
         for sampler, input_sample_set in test_list:
-            for sample_type in ["random", "r", "lhs"]:
+            for sample_type in ["random", "r", "lhs", "sobol", "halton"]:
                 for num_samples in [None, 25]:
                     verify_random_sample_set(sampler, sample_type,
                             input_sample_set, num_samples)
@@ -709,7 +710,7 @@ class Test_basic_sampler(unittest.TestCase):
         test_list = zip(self.samplers, input_domain_list)
 
         for sampler, input_domain in test_list:
-            for sample_type in ["random", "r", "lhs"]:
+            for sample_type in ["random", "r", "lhs", "sobol", "halton"]:
                 for num_samples in [None, 25]:
                     verify_random_sample_set_domain(sampler, sample_type,
                             input_domain, num_samples)
@@ -724,7 +725,7 @@ class Test_basic_sampler(unittest.TestCase):
         test_list = zip(self.samplers, input_dim_list)
 
         for sampler, input_dim in test_list:
-            for sample_type in ["random", "r", "lhs"]:
+            for sample_type in ["random", "r", "lhs", "sobol", "halton"]:
                 for num_samples in [None, 25]:
                     verify_random_sample_set_dimension(sampler, sample_type,
                             input_dim, num_samples)
@@ -785,7 +786,7 @@ class Test_basic_sampler(unittest.TestCase):
                         self.savefiles)
 
         for model, sampler, input_domain, savefile in test_list:
-            for sample_type in ["random", "r", "lhs"]:
+            for sample_type in ["random", "r", "lhs", "sobol", "halton"]:
                 for num_samples in [None, 25]:
                         verify_create_random_discretization(model, sampler,
                                 sample_type, input_domain, num_samples,
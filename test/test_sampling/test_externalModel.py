@@ -0,0 +1,160 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains unittests for :mod:`~bet.sampling.externalModel`
+"""
+
+import unittest, os, sys, StringIO
+import numpy as np
+import numpy.testing as nptest
+import bet.sampling.externalModel as em
+import bet.sampling.basicSampling as bsam
+from bet.Comm import comm
+from bet.sample import sample_set
+
+local_path = os.path.join(".")
+
+def map_4t2(x):
+    """
+    4 to 2 linear map.
+    """
+    print "this should not corrupt the message stream"
+    return sum(np.split(x, 2, 1))
+
+def map_4t2_ee(x):
+    """
+    4 to 2 linear map with error estimates.
+    """
+    values = sum(np.split(x, 2, 1))
+    return (values, 0.1*values)
+
+def map_fail(x):
+    """
+    Model that raises an error.
+    """
+    raise RuntimeError("bad model")
+
+def map_crash_once(x):
+    """
+    4 to 2 linear map that kills its process the first time it is called.
+    """
+    marker = os.path.join(local_path, "crash_marker_{}".format(comm.rank))
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return sum(np.split(x, 2, 1))
+
+def test_framing():
+    """
+    Tests :meth:`bet.sampling.externalModel.write_arrays` and
+    :meth:`bet.sampling.externalModel.read_arrays`.
+    """
+    arrays = [np.random.random((5, 3)), np.arange(4), np.ones((2, 3, 4),
+        dtype=np.float32), np.array(3.0)]
+    stream = StringIO.StringIO()
+    em.write_arrays(stream, arrays)
+    em.write_error(stream, "error")
+    stream.seek(0)
+    loaded = em.read_arrays(stream)
+    assert len(loaded) == 4
+    for array, loaded_array in zip(arrays, loaded):
+        assert array.dtype == loaded_array.dtype
+        nptest.assert_array_equal(array, loaded_array)
+    nptest.assert_raises(em.model_error, em.read_arrays, stream)
+    assert em.read_arrays(stream) is None
+
+def test_serve():
+    """
+    Tests :meth:`bet.sampling.externalModel.serve` in process.
+    """
+    values = np.random.random((6, 4))
+    stdin = StringIO.StringIO()
+    em.write_arrays(stdin, [values])
+    em.write_arrays(stdin, [values[:2]])
+    stdin.seek(0)
+    stdout = StringIO.StringIO()
+    em.serve(map_4t2_ee, stdin, stdout)
+    stdout.seek(0)
+    (out, ee) = em.read_arrays(stdout)
+    nptest.assert_array_almost_equal(out, map_4t2(values))
+    nptest.assert_array_almost_equal(ee, 0.1*out)
+    assert em.read_arrays(stdout)[0].shape == (2, 2)
+
+def model_command(function_name):
+    """
+    Command that serves a model function from this module.
+    """
+    return em.worker_command("test.test_sampling.test_externalModel:"+\
+            function_name)
+
+class Test_external_model(unittest.TestCase):
+    """
+    Test :class:`bet.sampling.externalModel.external_model`.
+    """
+    def setUp(self):
+        np.random.seed(1)
+        self.values = np.random.random((11, 4))
+        self.model = em.external_model(model_command("map_4t2"),
+                num_workers=3)
+
+    def tearDown(self):
+        self.model.close()
+        marker = os.path.join(local_path, "crash_marker_{}".format(comm.rank))
+        if os.path.exists(marker):
+            os.remove(marker)
+
+    def test_call(self):
+        """
+        Test that the workers persist between calls.
+        """
+        nptest.assert_array_almost_equal(self.model(self.values),
+                map_4t2(self.values))
+        pids = [w.pid for w in self.model._workers]
+        nptest.assert_array_almost_equal(self.model(self.values[:2]),
+                map_4t2(self.values[:2]))
+        assert pids[:2] == [w.pid for w in self.model._workers[:2]]
+
+    def test_tuple_output(self):
+        """
+        Test a model that returns error estimates.
+        """
+        model = em.external_model(model_command("map_4t2_ee"), num_workers=2)
+        (values, ee) = model(self.values)
+        model.close()
+        nptest.assert_array_almost_equal(values, map_4t2(self.values))
+        nptest.assert_array_almost_equal(ee, 0.1*values)
+
+    def test_model_error(self):
+        """
+        Test that errors raised by the model are propagated.
+        """
+        model = em.external_model(model_command("map_fail"), num_workers=2)
+        nptest.assert_raises(em.model_error, model, self.values)
+        nptest.assert_raises(em.model_error, model, self.values)
+        model.close()
+
+    def test_crash(self):
+        """
+        Test that a crashed worker is restarted and the batch is retried.
+        """
+        model = em.external_model(model_command("map_crash_once"),
+                max_retries=1)
+        nptest.assert_array_almost_equal(model(self.values),
+                map_4t2(self.values))
+        model.close()
+        model = em.external_model(model_command("map_fail"), max_retries=0)
+        model.command = [sys.executable, '-c', 'import sys; sys.exit(1)']
+        nptest.assert_raises(em.worker_crashed, model, self.values)
+        model.close()
+
+    def test_sampler(self):
+        """
+        Test a :class:`bet.sampling.basicSampling.sampler` with an external
+        model.
+        """
+        sampler = bsam.sampler(self.model)
+        input_set = sample_set(4)
+        input_set.set_values(self.values)
+        my_disc = sampler.compute_QoI_and_create_discretization(input_set)
+        nptest.assert_array_almost_equal(my_disc._output_sample_set.\
+                get_values(), map_4t2(self.values))
@@ -0,0 +1,99 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains unittests for :mod:`~bet.sampling.latinHypercube`
+"""
+
+import numpy as np
+import numpy.testing as nptest
+import bet.sampling.latinHypercube as lhc
+from bet.Comm import comm
+
+def test_permute():
+    """
+    Tests that :meth:`bet.sampling.latinHypercube.permute` is a permutation.
+    """
+    for num in [1, 2, 3, 17, 100, 1025]:
+        perm = lhc.permute(np.arange(num), num, 7)
+        nptest.assert_array_equal(np.sort(perm), np.arange(num))
+    perm = lhc.permute(np.arange(100), 100, 8)
+    assert np.any(perm != lhc.permute(np.arange(100), 100, 7))
+
+def test_uniform():
+    """
+    Tests :meth:`bet.sampling.latinHypercube.uniform`.
+    """
+    values = lhc.uniform(3, np.arange(1000))
+    assert np.all(values >= 0.0) and np.all(values < 1.0)
+    nptest.assert_array_equal(values[10:20], lhc.uniform(3,
+        np.arange(10, 20)))
+    assert abs(np.mean(values) - 0.5) < 0.05
+
+def verify_latin(design):
+    """
+    Verifies that each column of ``design`` has exactly one point in each
+    stratum of the unit interval.
+    """
+    num = design.shape[0]
+    assert np.all(design >= 0.0) and np.all(design <= 1.0)
+    for j in xrange(design.shape[1]):
+        strata = np.floor(design[:, j]*num).astype(int)
+        nptest.assert_array_equal(np.sort(strata), np.arange(num))
+
+def test_lhs_block():
+    """
+    Tests :meth:`bet.sampling.latinHypercube.lhs_block`.
+    """
+    design = lhc.lhs_block(3, 50, 0, 50, 11)
+    verify_latin(design)
+    nptest.assert_array_equal(design[20:35], lhc.lhs_block(3, 50, 20, 35,
+        11))
+    centered = lhc.lhs_block(3, 50, 0, 50, 11, centered=True)
+    verify_latin(centered)
+    nptest.assert_array_almost_equal(np.sort(centered[:, 0]),
+            (np.arange(50)+0.5)/50.0)
+
+def test_local_range():
+    """
+    Tests :meth:`bet.sampling.latinHypercube.local_range`.
+    """
+    for num in [0, 1, 7, 100]:
+        (start, stop) = lhc.local_range(num)
+        index = np.array_split(np.arange(num), comm.size)[comm.rank]
+        assert stop - start == index.shape[0]
+        if index.shape[0] > 0:
+            assert start == index[0]
+
+def verify_lhs_local(dim, num_samples, criterion):
+    """
+    Verifies that the local samples from
+    :meth:`bet.sampling.latinHypercube.lhs_local` form a Latin hypercube
+    when gathered and that the design is determined by the seed.
+    """
+    local = lhc.lhs_local(dim, num_samples, criterion, seed=5,
+            batch_size=20)
+    design = np.vstack(comm.allgather(local))
+    assert design.shape == (num_samples, dim)
+    verify_latin(design)
+    nptest.assert_array_equal(local, lhc.lhs_local(dim, num_samples,
+        criterion, seed=5, batch_size=20))
+
+def test_lhs_local():
+    """
+    Tests :meth:`bet.sampling.latinHypercube.lhs_local`.
+    """
+    for criterion in [None, 'center', 'maximin', 'cm', 'correlation']:
+        for dim in [1, 3]:
+            yield verify_lhs_local, dim, 47, criterion
+    nptest.assert_raises(ValueError, lhc.lhs_local, 2, 10, 'bad')
+
+def test_maximin():
+    """
+    Tests that the ``maximin`` criterion does not choose a worse design than
+    the default design.
+    """
+    default = lhc.lhs_block(2, 40, 0, 40, lhc.stream_key(3, 0))
+    design = np.vstack(comm.allgather(lhc.lhs_local(2, 40, 'maximin',
+        seed=3)))
+    assert np.min(lhc.spatial.distance.pdist(design)) >= \
+            np.min(lhc.spatial.distance.pdist(default))
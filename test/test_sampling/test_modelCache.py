@@ -0,0 +1,133 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains unittests for :mod:`~bet.sampling.modelCache`
+"""
+
+import unittest, os, shutil
+import numpy as np
+import numpy.testing as nptest
+import bet.sampling.modelCache as mc
+import bet.sampling.basicSampling as bsam
+from bet.Comm import comm
+from bet.sample import sample_set
+
+local_path = os.path.join(".")
+
+class counted_model(object):
+    """
+    3 to 2 linear map that counts the number of samples it evaluates.
+    """
+    def __init__(self, ee_jac=False):
+        self.num_evaluated = 0
+        self.ee_jac = ee_jac
+
+    def __call__(self, x):
+        self.num_evaluated += x.shape[0]
+        values = np.vstack(([x[:, 0]+x[:, 1], x[:, 2]])).transpose()
+        if self.ee_jac:
+            ee = 0.1*values
+            jac = np.tile(np.array([[1., 1., 0.], [0., 0., 1.]]),
+                    (x.shape[0], 1, 1))
+            return (values, ee, jac)
+        return values
+
+class Test_model_cache(unittest.TestCase):
+    """
+    Test :class:`bet.sampling.modelCache.model_cache`.
+    """
+    def setUp(self):
+        np.random.seed(1)
+        self.cache_dir = os.path.join(local_path,
+                "test_model_cache_{}".format(comm.rank))
+        self.values = np.random.random((10, 3))
+        self.model = counted_model()
+        self.cache = mc.model_cache(self.model, self.cache_dir,
+                model_id="map_3t2")
+
+    def tearDown(self):
+        if os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+
+    def test_row_keys(self):
+        """
+        Test :meth:`bet.sampling.modelCache.row_keys`.
+        """
+        keys = mc.row_keys(self.values, "a")
+        assert len(keys) == 10
+        assert len(set(keys)) == 10
+        assert keys == mc.row_keys(np.copy(self.values), "a")
+        assert keys[0] != mc.row_keys(self.values, "b")[0]
+
+    def test_hits_and_misses(self):
+        """
+        Test that cached samples are not re-evaluated.
+        """
+        output = self.cache(self.values)
+        nptest.assert_array_equal(output, self.model(self.values))
+        self.model.num_evaluated = 0
+        assert self.cache.misses == 10
+        assert self.cache.hits == 0
+
+        # overlapping sample set with a duplicated row
+        new_values = np.vstack((self.values[5:], np.random.random((3, 3)),
+            self.values[:1]))
+        output = self.cache(new_values)
+        nptest.assert_array_almost_equal(output, counted_model()(new_values))
+        assert self.model.num_evaluated == 3
+        assert self.cache.hits == 6
+        assert self.cache.misses == 13
+
+        # a new cache object pointing to the same directory
+        new_cache = mc.model_cache(self.model, self.cache_dir,
+                model_id="map_3t2")
+        self.model.num_evaluated = 0
+        nptest.assert_array_almost_equal(new_cache(new_values), output)
+        assert self.model.num_evaluated == 0
+        stats = new_cache.get_stats()
+        assert stats['hits'] == 9*comm.size
+        assert stats['hit_rate'] == 1.0
+
+    def test_tuple_output(self):
+        """
+        Test caching of models that return error estimates and Jacobians.
+        """
+        model = counted_model(ee_jac=True)
+        cache = mc.model_cache(model, self.cache_dir, model_id="ee_jac")
+        (values, ee, jac) = cache(self.values)
+        (values2, ee2, jac2) = cache(self.values)
+        assert model.num_evaluated == 10
+        nptest.assert_array_equal(values, values2)
+        nptest.assert_array_equal(ee, ee2)
+        nptest.assert_array_equal(jac, jac2)
+        assert jac2.shape == (10, 2, 3)
+
+    def test_evict(self):
+        """
+        Test :meth:`bet.sampling.modelCache.model_cache.evict`.
+        """
+        self.cache(self.values)
+        entry_size = os.path.getsize(self.cache.entry_path(
+            mc.row_keys(self.values[:1], "map_3t2")[0]))
+        self.cache.max_size = 4*entry_size
+        self.cache.evict()
+        total = sum([os.path.getsize(os.path.join(self.cache_dir, f)) for f
+            in os.listdir(self.cache_dir)])
+        assert total <= self.cache.max_size
+        self.model.num_evaluated = 0
+        nptest.assert_array_almost_equal(self.cache(self.values),
+                counted_model()(self.values))
+        assert self.model.num_evaluated >= 6
+
+    def test_sampler(self):
+        """
+        Test a :class:`bet.sampling.basicSampling.sampler` with a cached model.
+        """
+        sampler = bsam.sampler(self.cache)
+        input_set = sample_set(3)
+        input_set.set_values(self.values)
+        disc1 = sampler.compute_QoI_and_create_discretization(input_set)
+        disc2 = sampler.compute_QoI_and_create_discretization(input_set)
+        nptest.assert_array_equal(disc1._output_sample_set.get_values(),
+                disc2._output_sample_set.get_values())
+        assert self.cache.hits == self.cache.misses
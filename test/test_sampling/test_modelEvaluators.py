@@ -0,0 +1,119 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains unittests for :mod:`~bet.sampling.modelEvaluators`
+"""
+
+import unittest
+import numpy as np
+import numpy.testing as nptest
+import bet.sampling.modelEvaluators as mev
+import bet.sampling.basicSampling as bsam
+from bet.sample import sample_set
+
+def map_3t2(x):
+    """
+    3 to 2 linear map.
+    """
+    return np.vstack(([x[:, 0]+x[:, 1], x[:, 2]])).transpose()
+
+def map_3t1_ee_jac(x):
+    """
+    3 to 1 map that also returns error estimates and Jacobians.
+    """
+    values = np.sum(x, 1)
+    ee = 0.1*np.ones((x.shape[0], 1))
+    jac = np.ones((x.shape[0], 1, 3))
+    return (values, ee, jac)
+
+def test_gather_outputs():
+    """
+    Tests :meth:`bet.sampling.modelEvaluators.gather_outputs`.
+    """
+    outputs = [np.ones((2, 2)), 2*np.ones((3, 2))]
+    gathered = mev.gather_outputs(outputs)
+    nptest.assert_array_equal(gathered, np.concatenate(outputs))
+    outputs = [(np.ones((2,)), np.zeros((2, 1))), (np.ones((1,)),
+        np.zeros((1, 1)))]
+    gathered = mev.gather_outputs(outputs)
+    assert isinstance(gathered, tuple)
+    nptest.assert_array_equal(gathered[0], np.ones((3,)))
+    nptest.assert_array_equal(gathered[1], np.zeros((3, 1)))
+    nptest.assert_raises(mev.bad_output, mev.gather_outputs, [np.ones((1,)),
+        (np.ones((1,)),)])
+
+class Test_evaluator(unittest.TestCase):
+    """
+    Test :class:`bet.sampling.modelEvaluators.evaluator`.
+    """
+    def setUp(self):
+        np.random.seed(1)
+        self.values = np.random.random((23, 3))
+        self.evaluator = mev.evaluator(batch_size=5)
+
+    def tearDown(self):
+        self.evaluator.close()
+
+    def test_split(self):
+        """
+        Test :meth:`bet.sampling.modelEvaluators.evaluator.split`.
+        """
+        batches = self.evaluator.split(self.values)
+        assert len(batches) == 5
+        nptest.assert_array_equal(np.concatenate(batches), self.values)
+        assert len(mev.evaluator().split(self.values)) == 1
+
+    def test_evaluate(self):
+        """
+        Test :meth:`bet.sampling.modelEvaluators.evaluator.evaluate`.
+        """
+        nptest.assert_array_almost_equal(self.evaluator.evaluate(map_3t2,
+            self.values), map_3t2(self.values))
+        assert len(self.evaluator.batch_stats) == 5
+        assert sum([s[0] for s in self.evaluator.batch_stats]) == 23
+        (values, ee, jac) = self.evaluator.evaluate(map_3t1_ee_jac,
+                self.values)
+        nptest.assert_array_almost_equal(values, np.sum(self.values, 1))
+        assert ee.shape == (23, 1)
+        assert jac.shape == (23, 1, 3)
+
+    def test_bad_batch_size(self):
+        """
+        Test that a non-positive batch size raises an error.
+        """
+        nptest.assert_raises(ValueError, mev.evaluator, 0)
+
+class Test_thread_evaluator(Test_evaluator):
+    """
+    Test :class:`bet.sampling.modelEvaluators.thread_evaluator`.
+    """
+    def setUp(self):
+        np.random.seed(1)
+        self.values = np.random.random((23, 3))
+        self.evaluator = mev.thread_evaluator(num_workers=2, batch_size=5)
+
+class Test_process_evaluator(Test_evaluator):
+    """
+    Test :class:`bet.sampling.modelEvaluators.process_evaluator`.
+    """
+    def setUp(self):
+        np.random.seed(1)
+        self.values = np.random.random((23, 3))
+        self.evaluator = mev.process_evaluator(num_workers=2, batch_size=5)
+
+def test_sampler_evaluator():
+    """
+    Tests that :class:`bet.sampling.basicSampling.sampler` uses its evaluator.
+    """
+    np.random.seed(1)
+    input_set = sample_set(3)
+    input_set.set_values(np.random.random((17, 3)))
+    my_evaluator = mev.thread_evaluator(num_workers=2, batch_size=4)
+    sampler = bsam.sampler(map_3t1_ee_jac, error_estimates=True,
+            jacobians=True, evaluator=my_evaluator)
+    my_disc = sampler.compute_QoI_and_create_discretization(input_set)
+    my_evaluator.close()
+    nptest.assert_array_almost_equal(my_disc._output_sample_set.get_values(),
+            np.expand_dims(np.sum(input_set.get_values(), 1), 1))
+    assert my_disc._input_sample_set.get_jacobians_local().shape == (17, 1, 3)
+    assert len(my_evaluator.batch_stats) == 5
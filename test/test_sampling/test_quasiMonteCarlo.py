@@ -0,0 +1,95 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains unittests for :mod:`~bet.sampling.quasiMonteCarlo`
+"""
+
+import numpy as np
+import numpy.testing as nptest
+import bet.sampling.quasiMonteCarlo as qmc
+import bet.sample as sample
+from bet.Comm import comm
+
+def verify_net(points, bits):
+    """
+    Verifies that each dimension of ``points`` has exactly one point in each
+    of the ``2**bits`` dyadic intervals of the unit interval.
+    """
+    assert np.all(points > 0.0) and np.all(points < 1.0)
+    for j in xrange(points.shape[1]):
+        strata = np.floor(points[:, j]*2**bits).astype(int)
+        nptest.assert_array_equal(np.sort(strata), np.arange(2**bits))
+
+def test_sobol_block():
+    """
+    Tests :meth:`bet.sampling.quasiMonteCarlo.sobol_block`.
+    """
+    points = qmc.sobol_block(2, 0, 4, 0, scramble=False)
+    nptest.assert_array_almost_equal(points, [[0.0, 0.0], [0.5, 0.5],
+        [0.75, 0.25], [0.25, 0.75]])
+    for scramble in [False, True]:
+        points = qmc.sobol_block(qmc.SOBOL_MAX_DIM, 0, 512, 3, scramble)
+        verify_net(points, 9)
+        nptest.assert_array_equal(points[100:200], qmc.sobol_block(
+            qmc.SOBOL_MAX_DIM, 100, 200, 3, scramble))
+    assert np.any(qmc.sobol_block(2, 0, 10, 3) != qmc.sobol_block(2, 0, 10,
+        4))
+    nptest.assert_raises(ValueError, qmc.sobol_block, qmc.SOBOL_MAX_DIM+1,
+            0, 10, 3)
+
+def test_halton_block():
+    """
+    Tests :meth:`bet.sampling.quasiMonteCarlo.halton_block`.
+    """
+    points = qmc.halton_block(2, 0, 4, 0, scramble=False)
+    nptest.assert_array_almost_equal(points, [[0.0, 0.0], [0.5, 1.0/3],
+        [0.25, 2.0/3], [0.75, 1.0/9]])
+    points = qmc.halton_block(3, 0, 729, 5)
+    assert np.all(points >= 0.0) and np.all(points < 1.0)
+    # each base**k consecutive points have one point in each interval
+    for (j, base) in enumerate([2, 3, 5]):
+        num = base**(6-2*j)
+        strata = np.floor(points[:num, j]*num).astype(int)
+        nptest.assert_array_equal(np.sort(strata), np.arange(num))
+    nptest.assert_array_equal(points[100:200], qmc.halton_block(3, 100, 200,
+        5))
+
+def test_uniform_local():
+    """
+    Tests :meth:`bet.sampling.quasiMonteCarlo.uniform_local`.
+    """
+    for (sample_type, block) in [('sobol', qmc.sobol_block), ('halton',
+        qmc.halton_block)]:
+        local = qmc.uniform_local(3, 47, sample_type, seed=2)
+        points = np.vstack(comm.allgather(local))
+        nptest.assert_array_equal(points, block(3, 0, 47, 2))
+        blocks = np.vstack(list(qmc.uniform_local_blocks(3, 47, 10,
+            sample_type, seed=2)))
+        nptest.assert_array_equal(blocks, local)
+    np.random.seed(1)
+    local = qmc.uniform_local(2, 20)
+    np.random.seed(1)
+    nptest.assert_array_equal(local, np.random.random(local.shape))
+    nptest.assert_raises(ValueError, qmc.uniform_local, 2, 10, 'bad')
+
+def test_integration():
+    """
+    Tests that the scrambled points integrate a smooth function accurately.
+    The error of random points is about 5e-3.
+    """
+    function = lambda x: np.prod(1.0 + 0.5*(x - 0.5), axis=1)
+    for block in [qmc.sobol_block, qmc.halton_block]:
+        error = abs(np.mean(function(block(4, 0, 2**12, 7))) - 1.0)
+        assert error < 1e-3
+
+def test_estimate_volume():
+    """
+    Tests :meth:`bet.sample.sample_set.estimate_volume` with scrambled Sobol
+    points.
+    """
+    s_set = sample.sample_set(2)
+    s_set.set_domain(np.array([[0.0, 1.0], [0.0, 1.0]]))
+    s_set.set_values(np.array([[0.25, 0.25], [0.75, 0.25], [0.25, 0.75],
+        [0.75, 0.75]]))
+    s_set.estimate_volume(n_mc_points=1024, sample_type='sobol', seed=1)
+    nptest.assert_array_almost_equal(s_set.get_volumes(), 0.25*np.ones(4))
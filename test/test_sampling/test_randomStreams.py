@@ -0,0 +1,98 @@
+# Copyright (C) 2014-2016 The BET Development Team
+
+"""
+This module contains unittests for :mod:`~bet.sampling.randomStreams`
+"""
+
+import numpy as np
+import numpy.testing as nptest
+import bet.sampling.randomStreams as rs
+import bet.sampling.basicSampling as bsam
+import bet.calculateP.simpleFunP as sFun
+from bet.Comm import comm
+
+def test_stream_key():
+    """
+    Tests that :meth:`bet.sampling.randomStreams.stream_key` spawns distinct
+    streams.
+    """
+    keys = [rs.stream_key(3, i, j) for i in xrange(10) for j in xrange(10)]
+    assert len(set(keys)) == 100
+    assert rs.stream_key(3, 1) == rs.stream_key(3, 1)
+    assert rs.stream_key(rs.stream_key(3, 1), 2) == rs.stream_key(3, 1, 2)
+
+def test_uniform_block():
+    """
+    Tests :meth:`bet.sampling.randomStreams.uniform_block`.
+    """
+    values = rs.uniform_block(3, 0, 1000, 7)
+    assert values.shape == (1000, 3)
+    assert np.all(values > 0.0) and np.all(values < 1.0)
+    nptest.assert_array_equal(values[100:250], rs.uniform_block(3, 100, 250,
+        7))
+    assert abs(np.mean(values) - 0.5) < 0.05
+    assert np.all(values != rs.uniform_block(3, 0, 1000, 8))
+
+def test_normal_block():
+    """
+    Tests :meth:`bet.sampling.randomStreams.normal_block`.
+    """
+    values = rs.normal_block(2, 0, 10000, 7)
+    assert np.all(np.isfinite(values))
+    assert np.all(np.abs(np.mean(values, 0)) < 0.05)
+    assert np.all(np.abs(np.std(values, 0) - 1.0) < 0.05)
+
+def test_shared_seed():
+    """
+    Tests that :meth:`bet.sampling.randomStreams.shared_seed` is the same on
+    all processors.
+    """
+    assert rs.shared_seed(5) == 5
+    seeds = comm.allgather(rs.shared_seed())
+    assert len(set(seeds)) == 1
+
+def test_random_sample_set():
+    """
+    Tests that seeded :meth:`bet.sampling.basicSampling.random_sample_set`
+    samples are the global rows of the stream.
+    """
+    domain = np.array([[0.0, 2.0], [-1.0, 1.0]])
+    for sample_type in ["random", "lhs", "sobol"]:
+        s_set = bsam.random_sample_set(sample_type, domain, 23, seed=4)
+        nptest.assert_array_equal(s_set.get_values(),
+                bsam.random_sample_set(sample_type, domain, 23,
+                    seed=4).get_values())
+    s_set = bsam.random_sample_set("random", domain, 23, seed=4)
+    nptest.assert_array_almost_equal(s_set.get_values(), domain[:, 0] + \
+            2.0*rs.uniform_block(2, 0, 23, rs.stream_key(4, 0)))
+
+def test_random_sample_set_nearby_seeds():
+    """
+    Tests that seeded :meth:`bet.sampling.basicSampling.random_sample_set`
+    samples of nearby seeds are unrelated and not permutations of the same
+    numbers.
+    """
+    domain = np.array([[0.0, 1.0], [0.0, 1.0]])
+    values = [bsam.random_sample_set("random", domain, 6,
+        seed=seed).get_values() for seed in [4, 5, 6]]
+    for i in xrange(3):
+        for j in xrange(i+1, 3):
+            assert len(np.intersect1d(values[i], values[j])) == 0
+
+def test_simpleFunP_bins():
+    """
+    Tests that seeded simple function approximations regenerate the bins
+    from the bin stream.
+    """
+    data = np.random.random((10, 2))
+    Q_ref = np.array([0.5, 0.5])
+    (bin_seed, emulate_seed) = sFun.stream_seeds(3)
+    assert bin_seed != emulate_seed
+    s_set = sFun.uniform_partition_uniform_distribution_rectangle_size(data,
+            Q_ref, 0.2, 10, 1E3, seed=3)
+    nptest.assert_array_almost_equal(s_set.get_values(), 1.5*0.2*\
+            (rs.uniform_block(2, 0, 10, bin_seed) - 0.5) + Q_ref)
+    s_set = sFun.normal_partition_normal_distribution(data, Q_ref,
+            np.array([0.1, 0.2]), 10, 1E3, seed=3)
+    nptest.assert_array_almost_equal(s_set.get_values(), Q_ref + \
+            np.array([0.1, 0.2])*rs.normal_block(2, 0, 10, bin_seed))
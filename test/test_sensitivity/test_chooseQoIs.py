@@ -56,6 +56,53 @@ class ChooseQoIsMethods:
         with self.assertRaises(ValueError):
             cQoIs.calculate_avg_measure(self.input_set_centers)
 
+    def test_calculate_avg_sets(self):
+        """
+        Test :meth:`bet.sensitivity.chooseQoIs.calculate_avg_measure_sets` and
+        :meth:`bet.sensitivity.chooseQoIs.calculate_avg_skewness_sets`.
+        """
+        qoi_combs = np.array(list(combinations(range(self.output_dim),
+            self.input_dim)))[:7]
+        G = self.input_set_centers._jacobians[:, qoi_combs, :]
+        G = G.transpose(1, 0, 2, 3)
+        (measures, singvals) = cQoIs.calculate_avg_measure_sets(G)
+        (skewness, skewgi) = cQoIs.calculate_avg_skewness_sets(G)
+        for i, qoi_set in enumerate(qoi_combs):
+            (measure, singval) = cQoIs.calculate_avg_measure(\
+                self.input_set_centers, qoi_set)
+            self.assertEqual(measures[i], measure)
+            nptest.assert_array_equal(singvals[i], singval)
+            (skew, skewg) = cQoIs.calculate_avg_skewness(\
+                self.input_set_centers, qoi_set)
+            self.assertEqual(skewness[i], skew)
+            nptest.assert_array_equal(skewgi[i], skewg)
+
+    def test_calculate_avg_extended(self):
+        """
+        Test :meth:`bet.sensitivity.chooseQoIs.calculate_avg_measure_extended`
+        and :meth:`bet.sensitivity.chooseQoIs.calculate_avg_skewness_extended`.
+        """
+        # Only consider QoIs with nonzero gradients, otherwise the singular
+        # values are only zero up to machine precision
+        G = self.input_set_centers._jacobians
+        nonzero = np.all(np.linalg.norm(G, axis=2) > 0, axis=0)
+        qoi_set = range(self.output_dim - self.input_dim + 1, self.output_dim)
+        new_qois = [qoi for qoi in range(self.output_dim - self.input_dim +
+            1) if nonzero[qoi]]
+        (inv_factor, pivots) = cQoIs.gram_factor(G[:, qoi_set, :])
+        (new_rows, new_pivots) = cQoIs.extend_gram_factor(inv_factor,
+            G[:, qoi_set, :], G[:, new_qois, :])
+        measures = cQoIs.calculate_avg_measure_extended(pivots, new_pivots)
+        skewness = cQoIs.calculate_avg_skewness_extended(G[:, qoi_set, :],
+            G[:, new_qois, :], inv_factor, pivots, new_rows, new_pivots)
+        for i, qoi in enumerate(new_qois):
+            (measure, _) = cQoIs.calculate_avg_measure(self.input_set_centers,
+                qoi_set + [qoi])
+            (skew, _) = cQoIs.calculate_avg_skewness(self.input_set_centers,
+                qoi_set + [qoi])
+            nptest.assert_allclose(measures[i], measure, rtol=1e-8)
+            nptest.assert_allclose(skewness[i], skew, rtol=1e-8)
+
     def test_calculate_avg_condnum(self):
         """
         Test :meth:`bet.sensitivity.chooseQoIs.calculate_avg_condnum`.
@@ -169,6 +216,21 @@ class ChooseQoIsMethods:
         self.assertEqual(self.optsingvals.shape, ((self.num_centers,
             self.output_dim_return, self.num_optsets_return)))
 
+    def test_chooseOptQoIs_verbose_blocks(self):
+        """
+        Test that :meth:`bet.sensitivity.chooseQoIs.chooseOptQoIs_verbose`
+        does not depend on ``block_size``.
+        """
+        self.qoiIndices = range(0, self.output_dim)
+        (best_sets, optsingvals) = cQoIs.chooseOptQoIs_verbose(\
+            self.input_set_centers, self.qoiIndices, self.output_dim_return,
+            self.num_optsets_return)
+        (best_sets_small, optsingvals_small) = cQoIs.chooseOptQoIs_verbose(\
+            self.input_set_centers, self.qoiIndices, self.output_dim_return,
+            self.num_optsets_return, block_size=3)
+        nptest.assert_array_equal(best_sets, best_sets_small)
+        nptest.assert_array_equal(optsingvals, optsingvals_small)
+
     def test_find_unique_vecs(self):
         """
         Test :meth:`bet.sensitivity.chooseQoIs.find_unique_vecs`.
@@ -186,6 +248,11 @@ class ChooseQoIsMethods:
                 curr_set[1], :]) / self.input_set_centers._jacobians.shape[0]
             nptest.assert_array_less(curr_inner_prod, self.inner_prod_tol)
 
+        # Test that the result does not depend on block_size
+        nptest.assert_array_equal(unique_indices, cQoIs.find_unique_vecs(\
+            self.input_set_centers, self.inner_prod_tol, self.qoiIndices,
+            block_size=2))
+
     def test_chooseOptQoIs_large(self):
         """
         Test :meth:`bet.sensitivity.chooseQoIs.chooseOptQoIs_large`.
@@ -222,6 +289,40 @@ class ChooseQoIsMethods:
                 i + 2, self.num_optsets_return))
 
 
+def test_unrank_combinations():
+    """
+    Test :meth:`bet.sensitivity.chooseQoIs.unrank_combinations`.
+    """
+    for (num_items, num_choose) in [(1, 1), (6, 1), (7, 3), (10, 10), (12,
+        4)]:
+        combs = np.array(list(combinations(range(num_items), num_choose)))
+        num_combs = cQoIs.num_combinations(num_items, num_choose)
+        assert num_combs == combs.shape[0]
+        nptest.assert_array_equal(cQoIs.unrank_combinations(num_items,
+            num_choose, 0, num_combs), combs)
+        nptest.assert_array_equal(cQoIs.unrank_combinations(num_items,
+            num_choose, num_combs/3, num_combs/2), combs[num_combs/3:\
+                num_combs/2])
+    assert cQoIs.num_combinations(3, 4) == 0
+    assert cQoIs.num_combinations(200, 4) == 64684950
+
+def test_chooseOptQoIs_verbose_inf():
+    """
+    Test that :meth:`bet.sensitivity.chooseQoIs.chooseOptQoIs_verbose` does
+    not store sets of QoIs with an infinite measure.
+    """
+    # the gradients only span two of the three input directions
+    input_set = sample.sample_set(3)
+    input_set.set_values(np.zeros((2, 3)))
+    jacobians = np.zeros((2, 4, 3))
+    jacobians[:, :, :2] = [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [1.0, -1.0]]
+    input_set._jacobians = jacobians
+    (best_sets, optsingvals) = cQoIs.chooseOptQoIs_verbose(input_set,
+        num_qois_return=3, num_optsets_return=2, measure=True)
+    nptest.assert_array_equal(best_sets, [[np.inf, 0, 0, 0], [np.inf, 0, 0,
+        0]])
+    nptest.assert_array_equal(optsingvals, np.zeros((2, 3, 2)))
+
 class test_2to20_choose2(ChooseQoIsMethods, unittest.TestCase):
         def setUp(self):
             self.input_dim = 2
@@ -133,7 +133,32 @@ class GradientsMethods:
         self.assertEqual(self.cluster_set._values.shape, ((2*self.input_dim + 1) \
             * self.num_centers, self.cluster_set._dim))
 
-    # Test RBF methods
+    def test_pick_hessian_points(self):
+        """
+        Test :meth:`bet.sensitivity.gradients.pick_hessian_points`.
+        """
+        self.cluster_set = grad.pick_hessian_points(self.input_set_centers,
+            self.rvec)
+
+        if not isinstance(self.rvec, np.ndarray):
+            self.rvec = np.ones(self.input_dim) * self.rvec
+
+        # Test the method returns the correct dimension
+        num_close = self.input_dim * (self.input_dim + 1)
+        self.assertEqual(self.cluster_set._values.shape, ((num_close + 1) \
+            * self.num_centers, self.cluster_set._dim))
+
+        # Check the CFD points of each stencil
+        clusters = np.reshape(self.cluster_set._values[self.num_centers:],
+                (self.num_centers, num_close, self.input_dim))
+        translate = clusters - self.centers[:, np.newaxis, :]
+        nptest.assert_array_almost_equal(translate[:, :self.input_dim],
+                np.tile(np.diag(self.rvec), (self.num_centers, 1, 1)))
+        nptest.assert_array_almost_equal(translate[:,
+            self.input_dim:2*self.input_dim],
+            -np.tile(np.diag(self.rvec), (self.num_centers, 1, 1)))
+
+        # Test RBF methods
     def test_radial_basis_function(self):
         """
         Test :meth:`bet.sensitivity.gradients.radial_basis_function`.
@@ -248,6 +273,30 @@ class GradientsMethods:
             axis=2), np.ones((self.jacobians.shape[0],
                 self.jacobians.shape[1])))
 
+    def test_calculate_hessians_cfd(self):
+        """
+        Test :meth:`bet.sensitivity.gradients.calculate_hessians_cfd`.
+        """
+        self.output_set = sample.sample_set(self.output_dim)
+        self.cluster_set = grad.pick_hessian_points(self.input_set_centers,
+            self.rvec)
+        self.output_set.set_values(self.cluster_set._values.dot(self.coeffs))
+        self.cluster_disc = sample.discretization(self.cluster_set,
+                self.output_set)
+
+        self.center_disc = grad.calculate_hessians_cfd(self.cluster_disc)
+        self.jacobians = self.center_disc._input_sample_set._jacobians
+        self.hessians = self.center_disc._input_sample_set._hessians
+
+        # Test the method returns the correct size tensors
+        self.assertEqual(self.hessians.shape, (self.num_centers,
+            self.output_dim, self.input_dim, self.input_dim))
+
+        # Test the approximations are exact for linear maps
+        nptest.assert_array_almost_equal(self.jacobians,
+                np.tile(self.coeffs.transpose(), (self.num_centers, 1, 1)))
+        nptest.assert_allclose(self.hessians, 0, atol=1e-4)
+
 # Test the accuracy of the gradient approximation methods
 class GradientsAccuracy:
     """
@@ -580,3 +629,51 @@ class test_2to2_100centers_unitbox(GradientsAccuracy, unittest.TestCase):
             self.input_dim])
         self.G_exact[:, 0, 0] = 2 * self.centers[:, 0]
         self.G_exact[:, 1, 1] = 2 * self.centers[:, 1]
+
+class test_3to2_100centers_hessians(unittest.TestCase):
+    """
+    Test the accuracy of
+    :meth:`bet.sensitivity.gradients.calculate_hessians_cfd` for a quadratic
+    map.
+    """
+    def setUp(self):
+        self.input_dim = 3
+        self.output_dim = 2
+        self.num_centers = 100
+        np.random.seed(0)
+        self.centers = np.random.random((self.num_centers, self.input_dim))
+        self.input_set_centers = sample.sample_set(self.input_dim)
+        self.input_set_centers.set_domain(np.repeat([[0.0, 1.0]],
+            self.input_dim, axis=0))
+        self.input_set_centers.set_values(self.centers)
+        self.rvec = np.array([0.01, 0.02, 0.03])
+
+        # Define a vector valued function with constant Hessians
+        self.H_exact = np.array([[[2.0, 1.0, 0.0], [1.0, 0.0, -1.0], [0.0,
+            -1.0, 4.0]], [[0.0, 3.0, 0.5], [3.0, -2.0, 0.0], [0.5, 0.0,
+                1.0]]])
+        self.g = np.array([[1.0, -1.0, 0.5], [0.0, 2.0, 1.0]])
+
+    def f(self, x):
+        return x.dot(self.g.transpose()) + 0.5 * np.einsum('ik,jkl,il->ij', x,
+                self.H_exact, x)
+
+    def test_calculate_hessians_cfd_accuracy(self):
+        """
+        Test :meth:`bet.sensitivity.gradients.calculate_hessians_cfd`.
+        """
+        cluster_set = grad.pick_hessian_points(self.input_set_centers,
+            self.rvec)
+        output_set = sample.sample_set(self.output_dim)
+        output_set.set_values(self.f(cluster_set.get_values()))
+        center_disc = grad.calculate_hessians_cfd(sample.discretization(
+            cluster_set, output_set))
+
+        hessians = center_disc._input_sample_set.get_hessians()
+        jacobians = center_disc._input_sample_set.get_jacobians()
+        nptest.assert_allclose(hessians, np.tile(self.H_exact,
+            (self.num_centers, 1, 1, 1)), atol=1e-6)
+        nptest.assert_allclose(jacobians, self.g + np.einsum('jkl,il->ijk',
+            self.H_exact, self.centers), atol=1e-8)
+        nptest.assert_array_almost_equal(center_disc._output_sample_set.\
+                get_values(), self.f(self.centers))
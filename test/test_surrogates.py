@@ -10,6 +10,7 @@ import bet.util as util
 import bet.surrogates as surrogates
 import bet.sampling.basicSampling as bsam
 import bet.calculateP.simpleFunP as simpleFunP
+import bet.calculateP.calculateError as calculateError
 from bet.Comm import comm, MPI
 
 def linear_model1(parameter_samples):
@@ -92,6 +93,8 @@ class Test_piecewise_polynomial_surrogate_3_to_2(unittest.TestCase):
         sur_disc = self.sur.generate_for_input_set(iss, order=1)
         sur_disc.check_nums()
         self.assertEqual(sur_disc._output_sample_set._dim, 2)
+        nptest.assert_array_almost_equal(sur_disc._output_sample_set.\
+                _values_local, linear_model1(iss._values_local))
         nptest.assert_array_equal(sur_disc._input_sample_set._domain,
                                   self.sur.input_disc._input_sample_set._domain)
         sur_disc._input_sample_set._values_local[0,:]
@@ -105,6 +108,113 @@ class Test_piecewise_polynomial_surrogate_3_to_2(unittest.TestCase):
                                                       regions=[0],
                                                       update_input=True)
 
+    def Test_chunks(self):
+        """
+        Test that repeated generation for chunks of an input sample set
+        matches generation for the whole set and does not copy the input
+        discretization.
+        """
+        iss = bsam.random_sample_set('r',
+                                     self.sur.input_disc._input_sample_set._domain,
+                                     num_samples = 30,
+                                     globalize=False)
+        kdtree = None
+        for order in [0, 1]:
+            sur_disc = self.sur.generate_for_input_set(iss, order=order)
+            values = sur_disc._output_sample_set._values_local
+            (_, ptr) = self.sur.input_disc._input_sample_set.query(
+                    iss._values_local)
+            nptest.assert_array_equal(self.sur.emulated_ii_ptr_local, ptr)
+            if kdtree is None:
+                kdtree = self.sur.input_disc._input_sample_set._kdtree
+            for chunk in np.array_split(np.arange(ptr.shape[0]), 3):
+                chunk_set = sample.sample_set(3)
+                chunk_set.set_values_local(iss._values_local[chunk])
+                chunk_disc = self.sur.generate_for_input_set(chunk_set,
+                        order=order)
+                nptest.assert_array_almost_equal(chunk_disc.\
+                        _output_sample_set._values_local, values[chunk])
+                nptest.assert_array_equal(self.sur.emulated_ii_ptr_local,
+                        ptr[chunk])
+            assert self.sur.input_disc._input_sample_set._kdtree is kdtree
+
+def quadratic_model1(parameter_samples):
+    QoI_samples = linear_model1(parameter_samples)
+    QoI_samples[:, 0] += parameter_samples[:, 0]*parameter_samples[:, 1]
+    QoI_samples[:, 1] += parameter_samples[:, 2]**2
+    return QoI_samples
+
+class Test_piecewise_polynomial_surrogate_3_to_2_quadratic(unittest.TestCase):
+    """
+    Testing :meth:`bet.surrogates.piecewise_polynomial_surrogate` of order 2
+    on a quadratic 3 to 2 map.
+
+    """
+    def setUp(self):
+        """
+        Setup map.
+        """
+        sampler = bsam.sampler(quadratic_model1)
+        input_samples = sample.sample_set(3)
+        input_samples.set_domain(np.repeat([[0.0, 1.0]], 3, axis=0))
+        input_samples = sampler.random_sample_set('random', input_samples,
+                num_samples=50)
+        disc = sampler.compute_QoI_and_create_discretization(input_samples, 
+                                                             globalize=True)
+        num = disc.check_nums()
+        disc._output_sample_set.set_error_estimates(0.01 * np.ones((num, 2)))
+        self.sur = surrogates.piecewise_polynomial_surrogate(disc)
+        self.iss = bsam.random_sample_set('r',
+                self.sur.input_disc._input_sample_set._domain,
+                num_samples=30, globalize=False)
+
+    def Test_quadratics(self):
+        """
+        Test for piecewise quadratics using given Hessians.
+        """
+        self.assertRaises(calculateError.wrong_argument_type,
+                self.sur.generate_for_input_set, self.iss, order=2)
+        input_set = self.sur.input_disc._input_sample_set
+        num = input_set.check_num()
+        values = input_set._values
+        jac = np.zeros((num, 2, 3))
+        jac[:, :, :] = np.array([[0.506, 0.463],[0.253, 0.918],
+            [0.085, 0.496]]).transpose()
+        jac[:, 0, 0] += values[:, 1]
+        jac[:, 0, 1] += values[:, 0]
+        jac[:, 1, 2] += 2.0*values[:, 2]
+        hess = np.zeros((num, 2, 3, 3))
+        hess[:, 0, 0, 1] = hess[:, 0, 1, 0] = 1.0
+        hess[:, 1, 2, 2] = 2.0
+        input_set.set_jacobians(jac)
+        input_set.set_hessians(hess)
+
+        sur_disc = self.sur.generate_for_input_set(self.iss, order=2)
+        sur_disc.check_nums()
+        nptest.assert_array_almost_equal(sur_disc._output_sample_set.\
+                _values_local, quadratic_model1(self.iss._values_local))
+        nptest.assert_array_equal(sur_disc._output_sample_set.\
+                _error_estimates_local, 0.01 * np.ones((self.iss.\
+                    check_num_local(), 2)))
+
+        # blocks of samples give the same values
+        sur_disc_blocks = self.sur.generate_for_input_set(self.iss, order=2,
+                block_size=7)
+        nptest.assert_array_almost_equal(sur_disc_blocks._output_sample_set.\
+                _values_local, sur_disc._output_sample_set._values_local)
+
+    def Test_hessians_cfd(self):
+        """
+        Test for piecewise quadratics using finite difference Hessians.
+        """
+        self.sur.compute_hessians_cfd(quadratic_model1, 0.01*np.ones((3,)))
+        input_set = self.sur.input_disc._input_sample_set
+        self.assertEqual(input_set._hessians.shape, (input_set.check_num(), 2,
+            3, 3))
+        sur_disc = self.sur.generate_for_input_set(self.iss, order=2)
+        nptest.assert_array_almost_equal(sur_disc._output_sample_set.\
+                _values_local, quadratic_model1(self.iss._values_local))
+
 class Test_piecewise_polynomial_surrogate_3_to_1(unittest.TestCase):
     """
     Testing :meth:`bet.surrogates.piecewise_polynomial_surrogate` on a 